@@ -0,0 +1,317 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any
+
+from langchain_core.embeddings import Embeddings
+
+from metrics import EMBEDDING_CACHE_REQUESTS
+
+CACHE_DB_PATH = os.path.join("data", "cache.db")
+_PLURAL = {"hit": "hits", "miss": "misses"}
+
+
+def text_hash(*parts: str) -> str:
+    """Stable SHA-256 over one or more strings (NUL separated)."""
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class LLMResultCache:
+    """
+    Persistent cache of chunker LLM results (propositions and titles).
+    Entries are keyed by kind, model name, prompt version and a hash of the
+    input, so changing the model or a prompt never serves stale results.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_results (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(
+        self, kind: str, model: str, prompt_version: str, text: str
+    ) -> Any | None:
+        """Returns the cached value, or None on a miss."""
+        key = text_hash(kind, model, prompt_version, text)
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT value FROM llm_results WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+    def put(
+        self, kind: str, model: str, prompt_version: str, text: str, value: Any
+    ) -> None:
+        """Stores a JSON-serializable value, replacing any previous entry."""
+        key = text_hash(kind, model, prompt_version, text)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_results "
+                "(key, kind, model, prompt_version, value, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    kind,
+                    model,
+                    prompt_version,
+                    json.dumps(value),
+                    datetime.now().isoformat(),
+                ),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with two cache tiers keyed by model name and text hash:
+    an in-memory LRU for queries (repeated FAQ questions) and a persistent
+    SQLite table for document chunks (re-ingests). Vectors are stored as float32.
+    The persistent tier keeps the document_cache_size most recently used
+    vectors (0 for no limit).
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        db_path: str = CACHE_DB_PATH,
+        query_cache_size: int = 1024,
+        document_cache_size: int = 100_000,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.db_path = db_path
+        self.query_cache_size = query_cache_size
+        self.document_cache_size = document_cache_size
+        self._queries: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "query_hits": 0,
+            "query_misses": 0,
+            "document_hits": 0,
+            "document_misses": 0,
+        }
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL
+            );
+            """)
+            columns = {
+                row[1] for row in conn.execute("PRAGMA table_info(embeddings)")
+            }
+            if "last_used" not in columns:
+                conn.execute(
+                    "ALTER TABLE embeddings "
+                    "ADD COLUMN last_used REAL NOT NULL DEFAULT 0"
+                )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _key(self, text: str) -> str:
+        return text_hash(self.model_name, text)
+
+    def stats(self) -> dict[str, int]:
+        """Returns a snapshot of the hit/miss counters."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, tier: str, result: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[f"{tier}_{_PLURAL[result]}"] += amount
+        EMBEDDING_CACHE_REQUESTS.labels(tier, result).inc(amount)
+
+    # --- Documents: persistent tier ---
+
+    def _load_vectors(self, keys: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        conn = self._connect()
+        try:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                rows = conn.execute(
+                    "SELECT key, vector FROM embeddings "
+                    f"WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(time.time(), key) for key in found],
+                )
+                conn.commit()
+        finally:
+            conn.close()
+        return found
+
+    def _store_vectors(self, entries: dict[str, list[float]]) -> None:
+        conn = self._connect()
+        try:
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (key, self.model_name, array("f", vector).tobytes(), now)
+                    for key, vector in entries.items()
+                ],
+            )
+            if self.document_cache_size > 0:
+                # Evict the least recently used vectors beyond the cap.
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings "
+                    "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.document_cache_size,),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self._load_vectors(list(set(keys)))
+
+        missing: dict[str, str] = {}
+        for key, text in zip(keys, texts, strict=True):
+            if key not in cached:
+                missing.setdefault(key, text)
+        self._count("document", "hit", len(texts) - len(missing))
+        self._count("document", "miss", len(missing))
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors, strict=True))
+            self._store_vectors(computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
+
+    # --- Queries: in-memory LRU tier ---
+
+    def _lookup_query(self, key: str) -> list[float] | None:
+        with self._lock:
+            vector = self._queries.get(key)
+            if vector is not None:
+                self._queries.move_to_end(key)
+        self._count("query", "miss" if vector is None else "hit")
+        return vector
+
+    def _remember_query(self, key: str, vector: list[float]) -> None:
+        with self._lock:
+            self._queries[key] = vector
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vector = self._lookup_query(key)
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self._remember_query(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vector = self._lookup_query(key)
+        if vector is None:
+            vector = await self.underlying.aembed_query(text)
+            self._remember_query(key, vector)
+        return vector
+
+
+class AnswerCache:
+    """
+    In-memory LRU of final answers for history-free questions. Keys include the
+    corpus version, so any upload or delete makes earlier entries unreachable
+    and they age out of the LRU.
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._answers: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Lowercases, collapses whitespace and drops trailing punctuation."""
+        return " ".join(question.lower().split()).rstrip("?!. ")
+
+    @classmethod
+    def make_key(cls, question: str, k: int, model: str, corpus_version: int) -> str:
+        return text_hash(
+            cls.normalize_question(question), str(k), model, str(corpus_version)
+        )
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            answer = self._answers.get(key)
+            if answer is None:
+                self._stats["misses"] += 1
+                return None
+            self._answers.move_to_end(key)
+            self._stats["hits"] += 1
+            return answer
+
+    def put(self, key: str, answer: str) -> None:
+        with self._lock:
+            self._answers[key] = answer
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.max_size:
+                self._answers.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        """Returns a snapshot of the hit/miss counters."""
+        with self._lock:
+            return dict(self._stats)
+
+
+def replay_chunks(answer: str) -> list[str]:
+    """Splits a cached answer into word-sized pieces for streaming replay."""
+    return re.findall(r"\s*\S+\s*", answer) or [answer]
@@ -1,16 +1,64 @@
-import sqlite3
+import base64
+import json
 import os
-from typing import List, Dict, Any
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any
 
 DB_PATH = os.path.join("data", "metadata.db")
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+# Applied to every new connection. WAL lets readers run alongside a writer;
+# NORMAL sync is durable across application crashes in WAL mode.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+)
+
+_local = threading.local()
+
+
+class PooledConnection:
+    """
+    A thread's long-lived connection. close() only hands it back: any open
+    transaction is rolled back and the connection is kept for the next call.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+
+def get_db_connection() -> PooledConnection:
+    """Returns this thread's connection to DB_PATH, opening it on first use."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(DB_PATH)
+    if conn is None:
+        raw = sqlite3.connect(DB_PATH, timeout=5)
+        raw.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            raw.execute(pragma)
+        conn = connections[DB_PATH] = PooledConnection(raw)
     return conn
 
+def _ensure_column(cursor: sqlite3.Cursor, table: str, column: str, declaration: str):
+    """Adds a column to an existing table created by an older version of the schema."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row["name"] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
 def initialize_db():
     """Initializes the database and creates the file_metadata table if it doesn't exist."""
     conn = get_db_connection()
@@ -23,30 +71,160 @@ def initialize_db():
         upload_date TEXT NOT NULL
     );
     """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_jobs (
+        job_id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        status TEXT NOT NULL,
+        stage TEXT,
+        progress TEXT NOT NULL DEFAULT '{}',
+        file_id TEXT,
+        error TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS corpus_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    );
+    """)
+    cursor.execute("INSERT OR IGNORE INTO corpus_state (id, version) VALUES (1, 0)")
+    _ensure_column(cursor, "file_metadata", "content_hash", "TEXT")
+    _ensure_column(cursor, "ingest_jobs", "content_hash", "TEXT")
+    _ensure_column(cursor, "ingest_jobs", "operation", "TEXT NOT NULL DEFAULT 'create'")
+    _ensure_column(cursor, "ingest_jobs", "chunking", "TEXT")
+    _ensure_column(cursor, "ingest_jobs", "owner", "TEXT")
+    _ensure_column(cursor, "ingest_jobs", "lease_until", "REAL")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_file_metadata_content_hash "
+        "ON file_metadata (content_hash)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ingest_jobs_content_hash "
+        "ON ingest_jobs (content_hash)"
+    )
+    # Serves the newest-first listing and its keyset pagination.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_file_metadata_upload_date "
+        "ON file_metadata (upload_date, file_id)"
+    )
     conn.commit()
     conn.close()
 
-def add_file_metadata(file_id: str, filename: str, upload_date: str):
+def add_file_metadata(
+    file_id: str, filename: str, upload_date: str, content_hash: str | None = None
+):
     """Adds a new file record to the database."""
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
         cursor.execute(
-            "INSERT INTO file_metadata (file_id, filename, upload_date) VALUES (?, ?, ?)",
-            (file_id, filename, upload_date)
+            "INSERT INTO file_metadata (file_id, filename, upload_date, content_hash) "
+            "VALUES (?, ?, ?, ?)",
+            (file_id, filename, upload_date, content_hash)
         )
         conn.commit()
     finally:
         conn.close()
 
-def get_all_files_metadata() -> List[Dict[str, Any]]:
-    """Retrieves all file records from the database."""
+def _encode_cursor(upload_date: str, file_id: str) -> str:
+    encoded = json.dumps([upload_date, file_id]).encode()
+    return base64.urlsafe_b64encode(encoded).decode()
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        upload_date, file_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(upload_date), str(file_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def list_files_metadata(
+    limit: int = 100,
+    cursor: str | None = None,
+    filename_prefix: str | None = None
+) -> tuple[list[dict[str, Any]], str | None]:
+    """
+    Returns one page of file records, newest first, and the cursor of the next
+    page (None on the last page). Pages are keyed on (upload_date, file_id), so
+    they stay stable while files are added or deleted.
+    """
+    conditions = []
+    params: list[Any] = []
+    if cursor:
+        conditions.append("(upload_date, file_id) < (?, ?)")
+        params.extend(_decode_cursor(cursor))
+    if filename_prefix:
+        escaped = (
+            filename_prefix.replace("\\", "\\\\")
+            .replace("%", "\\%")
+            .replace("_", "\\_")
+        )
+        conditions.append("filename LIKE ? ESCAPE '\\'")
+        params.append(escaped + "%")
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+
+    conn = get_db_connection()
+    cursor_ = conn.cursor()
+    try:
+        cursor_.execute(
+            "SELECT file_id, filename, upload_date FROM file_metadata "
+            f"{where}ORDER BY upload_date DESC, file_id DESC LIMIT ?",
+            (*params, limit + 1)
+        )
+        files = [dict(row) for row in cursor_.fetchall()]
+    finally:
+        conn.close()
+    if len(files) <= limit:
+        return files, None
+    files = files[:limit]
+    return files, _encode_cursor(files[-1]["upload_date"], files[-1]["file_id"])
+
+def get_file_metadata(file_id: str) -> dict[str, Any] | None:
+    """Retrieves a file record by its file_id, or None if it doesn't exist."""
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT file_id, filename, upload_date FROM file_metadata ORDER BY upload_date DESC")
-        files = [dict(row) for row in cursor.fetchall()]
-        return files
+        cursor.execute(
+            "SELECT file_id, filename, upload_date, content_hash FROM file_metadata "
+            "WHERE file_id = ?",
+            (file_id,)
+        )
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def update_file_metadata(
+    file_id: str, filename: str, upload_date: str, content_hash: str | None = None
+):
+    """Updates an existing file record after its content has been replaced."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE file_metadata SET filename = ?, upload_date = ?, content_hash = ? "
+            "WHERE file_id = ?",
+            (filename, upload_date, content_hash, file_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_file_metadata_by_hash(content_hash: str) -> dict[str, Any] | None:
+    """Retrieves the oldest file record with the given content hash, if any."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT file_id, filename, upload_date FROM file_metadata "
+            "WHERE content_hash = ? ORDER BY upload_date LIMIT 1",
+            (content_hash,)
+        )
+        row = cursor.fetchone()
+        return dict(row) if row else None
     finally:
         conn.close()
 
@@ -59,3 +237,204 @@ def delete_file_metadata(file_id: str):
         conn.commit()
     finally:
         conn.close()
+
+def get_corpus_version() -> int:
+    """Returns the corpus version, which changes whenever indexed content changes."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT version FROM corpus_state WHERE id = 1")
+        row = cursor.fetchone()
+        return int(row["version"]) if row else 0
+    finally:
+        conn.close()
+
+def bump_corpus_version() -> int:
+    """Increments and returns the corpus version."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE corpus_state SET version = version + 1 WHERE id = 1")
+        conn.commit()
+        cursor.execute("SELECT version FROM corpus_state WHERE id = 1")
+        return int(cursor.fetchone()["version"])
+    finally:
+        conn.close()
+
+
+JOB_UPDATABLE_FIELDS = ("status", "stage", "progress", "file_id", "error")
+
+
+def _job_from_row(row: sqlite3.Row) -> dict[str, Any]:
+    job = dict(row)
+    job["progress"] = json.loads(job["progress"] or "{}")
+    return job
+
+
+def add_job(
+    job_id: str,
+    filename: str,
+    file_path: str,
+    content_hash: str | None = None,
+    operation: str = "create",
+    file_id: str | None = None,
+    chunking: str | None = None,
+    owner: str | None = None,
+    lease_until: float | None = None,
+) -> dict[str, Any]:
+    """
+    Adds a new queued ingestion job and returns it.
+    'create' jobs index a new file; 'update' jobs replace the chunks of file_id.
+    'chunking' is the requested chunking strategy (None for the configured one).
+    'owner' and 'lease_until' (a Unix timestamp) claim the job for a worker.
+    """
+    now = datetime.now().isoformat()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO ingest_jobs (job_id, filename, file_path, status, "
+            "content_hash, operation, file_id, chunking, owner, lease_until, "
+            "created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job_id, filename, file_path, content_hash, operation, file_id,
+                chunking, owner, lease_until, now, now,
+            )
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return {
+        "job_id": job_id,
+        "filename": filename,
+        "file_path": file_path,
+        "status": "queued",
+        "stage": None,
+        "progress": {},
+        "file_id": file_id,
+        "error": None,
+        "content_hash": content_hash,
+        "operation": operation,
+        "chunking": chunking,
+        "owner": owner,
+        "lease_until": lease_until,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def update_job(job_id: str, **fields: Any):
+    """Updates the given columns of a job. 'progress' is stored as JSON."""
+    unknown = set(fields) - set(JOB_UPDATABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot update job fields: {sorted(unknown)}")
+    if "progress" in fields:
+        fields["progress"] = json.dumps(fields["progress"])
+    fields["updated_at"] = datetime.now().isoformat()
+
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"UPDATE ingest_jobs SET {assignments} WHERE job_id = ?",
+            (*fields.values(), job_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def claim_job(job_id: str, owner: str, lease_until: float, now: float) -> bool:
+    """
+    Marks an unfinished job as running for 'owner' until 'lease_until', unless
+    another worker holds an unexpired lease on it. Returns whether it was claimed.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE ingest_jobs SET status = 'running', owner = ?, lease_until = ?, "
+            "updated_at = ? WHERE job_id = ? AND status IN ('queued', 'running') "
+            "AND (owner = ? OR lease_until IS NULL OR lease_until < ?)",
+            (owner, lease_until, datetime.now().isoformat(), job_id, owner, now)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def renew_job_leases(owner: str, lease_until: float) -> int:
+    """Extends the lease of every unfinished job held by 'owner'."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE ingest_jobs SET lease_until = ? "
+            "WHERE owner = ? AND status IN ('queued', 'running')",
+            (lease_until, owner)
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def release_queued_jobs(owner: str) -> int:
+    """Lets any worker take the jobs of 'owner' that have not started yet."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE ingest_jobs SET lease_until = NULL "
+            "WHERE owner = ? AND status = 'queued'",
+            (owner,)
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def get_job(job_id: str) -> dict[str, Any] | None:
+    """Retrieves a job by its job_id, or None if it doesn't exist."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT * FROM ingest_jobs WHERE job_id = ?", (job_id,))
+        row = cursor.fetchone()
+        return _job_from_row(row) if row else None
+    finally:
+        conn.close()
+
+
+def get_unfinished_job_by_hash(content_hash: str) -> dict[str, Any] | None:
+    """Retrieves a queued or running job for the same content, if any."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT * FROM ingest_jobs WHERE content_hash = ? "
+            "AND status IN ('queued', 'running') ORDER BY created_at LIMIT 1",
+            (content_hash,)
+        )
+        row = cursor.fetchone()
+        return _job_from_row(row) if row else None
+    finally:
+        conn.close()
+
+
+def get_unfinished_jobs() -> list[dict[str, Any]]:
+    """Retrieves queued or running jobs, oldest first, e.g. to resume them."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT * FROM ingest_jobs WHERE status IN ('queued', 'running') "
+            "ORDER BY created_at"
+        )
+        return [_job_from_row(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
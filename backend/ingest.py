@@ -1,41 +1,236 @@
+import hashlib
 import logging
 import os
+import re
+import threading
 import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, TypeVar
 
 from dotenv import load_dotenv
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_qdrant import QdrantVectorStore
+from langchain_core.vectorstores import VectorStore
+from langchain_ollama import ChatOllama
+from langchain_qdrant import QdrantVectorStore, RetrievalMode
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from markitdown import MarkItDown
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 
+from cache import CachedEmbeddings, LLMResultCache
+from llm_scheduler import Priority
+from metrics import INGEST_STAGE_SECONDS, LLM_CACHE_HITS
+from numpy_store import NumpyVectorStore
+from ollama_clients import EMBEDDING_MODEL, get_chat_model, get_embeddings
+from sparse import BM25SparseEmbeddings
+
+T = TypeVar("T")
+R = TypeVar("R")
+
 load_dotenv()
 logger = logging.getLogger("hr_policy_rag")
 
+# "qdrant" (server at QDRANT_URL), "qdrant-local" (embedded Qdrant stored at
+# QDRANT_PATH, or ":memory:") or "numpy" (in-process brute-force store at
+# NUMPY_STORE_PATH, dense retrieval only).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
-CHAT_MODEL = os.getenv("CHAT_MODEL", "llama3")
+QDRANT_PATH = os.getenv("QDRANT_PATH", os.path.join("data", "qdrant"))
+NUMPY_STORE_PATH = os.getenv("NUMPY_STORE_PATH", os.path.join("data", "vectors"))
 COLLECTION_NAME = "hr_docs"
+# Max LLM calls the chunker keeps in flight (pair with OLLAMA_NUM_PARALLEL).
+CHUNKER_MAX_CONCURRENCY = int(os.getenv("CHUNKER_MAX_CONCURRENCY", "4"))
+# "agentic" (LLM propositions and titles) or "structure" (split on Markdown
+# headings, no LLM calls; documents without headings fall back to agentic).
+# CHUNKING_BY_EXTENSION overrides it per file type, e.g. ".docx:structure", and
+# an upload can override both.
+CHUNKING_STRATEGIES = ("agentic", "structure")
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "agentic").lower()
+CHUNKING_BY_EXTENSION = os.getenv("CHUNKING_BY_EXTENSION", "")
+# Reuse proposition/title results for unchanged text across (re-)ingests.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+# Reuse chunk vectors across ingests and query vectors for repeated questions.
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+DOCUMENT_EMBEDDING_CACHE_SIZE = int(
+    os.getenv("DOCUMENT_EMBEDDING_CACHE_SIZE", "100000")
+)
+# "dense", or "hybrid" to also store local BM25 sparse vectors and fuse both
+# result lists (RRF) at query time.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").lower()
+BM25_AVG_DOC_LEN = float(os.getenv("BM25_AVG_DOC_LEN", "256"))
+DENSE_VECTOR_NAME = ""  # unnamed default vector, as in existing collections
+SPARSE_VECTOR_NAME = "bm25"
+# Payload layout shared by our upserts and the LangChain retriever.
+CONTENT_PAYLOAD_KEY = "page_content"
+METADATA_PAYLOAD_KEY = "metadata"
+# Payload fields used in filters (file deletes, file-scoped searches).
+PAYLOAD_INDEX_FIELDS = ("metadata.file_id", "metadata.filename")
+# Dense vector size; 0 detects it from EMBEDDING_MODEL with a probe embedding.
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))
+# HNSW graph settings used at collection creation, and the search-time beam width.
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_SEARCH_EF = int(os.getenv("QDRANT_SEARCH_EF", "128"))
+# Opt-in vector compression: "none", "scalar" (int8) or "binary". Quantized
+# vectors stay in RAM while the float32 originals move to disk; searches rescore
+# QDRANT_OVERSAMPLING x k quantized candidates with the originals.
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+# Rebuild an existing collection whose vector layout no longer matches the
+# config (size, distance, sparse vectors) by re-embedding the stored chunk text.
+QDRANT_AUTO_MIGRATE = os.getenv("QDRANT_AUTO_MIGRATE", "false").lower() == "true"
+REBUILD_COLLECTION_NAME = f"{COLLECTION_NAME}__rebuild"
+
+if VECTOR_BACKEND not in ("qdrant", "qdrant-local", "numpy"):
+    raise ValueError(f"Unknown VECTOR_BACKEND '{VECTOR_BACKEND}'")
+
+
+def _parse_chunking_by_extension(value: str) -> dict[str, str]:
+    strategies = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        extension, _, strategy = entry.partition(":")
+        extension = "." + extension.strip().lower().lstrip(".")
+        strategies[extension] = strategy.strip().lower()
+    return strategies
+
+
+_chunking_by_extension = _parse_chunking_by_extension(CHUNKING_BY_EXTENSION)
+for _strategy in (CHUNKING_STRATEGY, *_chunking_by_extension.values()):
+    if _strategy not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy '{_strategy}'")
+
+
+def _make_client() -> QdrantClient:
+    """Qdrant client for VECTOR_BACKEND. The numpy backend never calls it."""
+    if VECTOR_BACKEND == "qdrant-local":
+        if QDRANT_PATH == ":memory:":
+            return QdrantClient(location=":memory:")
+        return QdrantClient(path=QDRANT_PATH)
+    return QdrantClient(url=QDRANT_URL, check_compatibility=VECTOR_BACKEND == "qdrant")
+
+
+def _make_embeddings() -> Embeddings:
+    embeddings: Embeddings = get_embeddings()
+    if EMBEDDING_CACHE_ENABLED:
+        embeddings = CachedEmbeddings(
+            embeddings,
+            model_name=EMBEDDING_MODEL,
+            query_cache_size=QUERY_EMBEDDING_CACHE_SIZE,
+            document_cache_size=DOCUMENT_EMBEDDING_CACHE_SIZE,
+        )
+    return embeddings
+
+
+def _make_llm_cache() -> LLMResultCache | None:
+    # Opens (and creates) data/cache.db, so only on the first agentic chunking.
+    return LLMResultCache() if LLM_CACHE_ENABLED else None
+
+
+def _import_markitdown() -> type:
+    # MarkItDown loads every converter (pandas, pdfminer, ...); workers that
+    # only serve chat never pay for it.
+    from markitdown import MarkItDown
+
+    return MarkItDown
+
+
+# Heavy module attributes, created on first access so importing this module
+# (and main) stays fast. Tests may replace them with monkeypatch as before.
+_LAZY_ATTRIBUTES: dict[str, Callable[[], Any]] = {
+    "client": _make_client,
+    "embeddings": _make_embeddings,
+    "llm_cache": _make_llm_cache,
+    "MarkItDown": _import_markitdown,
+}
+_lazy_lock = threading.Lock()
+
+
+def __getattr__(name: str) -> Any:
+    factory = _LAZY_ATTRIBUTES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    namespace = globals()
+    if name not in namespace:
+        with _lazy_lock:
+            if name not in namespace:
+                namespace[name] = factory()
+    return namespace[name]
+
+
+def get_qdrant_client() -> QdrantClient:
+    return __getattr__("client")
+
 
-# Initialize Qdrant Client
-client = QdrantClient(url=QDRANT_URL)
-embeddings = OllamaEmbeddings(base_url=OLLAMA_BASE_URL, model=EMBEDDING_MODEL)
-llm = ChatOllama(base_url=OLLAMA_BASE_URL, model=CHAT_MODEL, temperature=0)
+def get_embedding_model() -> Embeddings:
+    return __getattr__("embeddings")
+
+
+def vector_store_ready() -> bool:
+    """Whether the vector store answers; the numpy store is always ready."""
+    if VECTOR_BACKEND == "numpy":
+        return True
+    try:
+        get_qdrant_client().get_collections()
+    except Exception as e:
+        logger.warning(f"Qdrant is not reachable: {e}")
+        return False
+    return True
+
+
+sparse_embeddings = BM25SparseEmbeddings(avg_doc_len=BM25_AVG_DOC_LEN)
+
+
+EMBED_BATCH_SIZE = 64
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2a4e-8d3b-4f5a-9c7e-2b1d0e9f8a63")
+
+
+class IngestProgress:
+    """
+    Receives per-stage progress from the ingestion pipeline.
+    Stages are: parse, propositions, titles, embed, upsert.
+    The base class is a no-op; job tracking subclasses it.
+    """
+
+    def start(self, stage: str, total: int) -> None:
+        pass
+
+    def advance(self, stage: str, count: int = 1) -> None:
+        pass
+
+    def finish(self, stage: str) -> None:
+        pass
 
 
 class AgenticChunker:
     """
     Decomposes text into standalone propositions using an LLM
     and then groups them into semantically coherent chunks with identified titles.
+    LLM results can be served from an LLMResultCache; bump the prompt versions
+    whenever the corresponding prompt changes.
     """
 
-    def __init__(self, llm: ChatOllama):
+    PROPOSITIONS_PROMPT_VERSION = "1"
+    TITLE_PROMPT_VERSION = "1"
+    # Propositions are extracted per slice of lines. Slice boundaries are
+    # picked by line content rather than offset, see _slices.
+    SLICE_MAX_CHARS = 4000
+    SLICE_MIN_CHARS = 1000
+    SLICE_BOUNDARY_CHARS = 1000
+
+    def __init__(
+        self,
+        llm: ChatOllama,
+        max_concurrency: int = CHUNKER_MAX_CONCURRENCY,
+        cache: LLMResultCache | None = None,
+    ):
         self.llm = llm
+        self.max_concurrency = max(1, max_concurrency)
+        self.cache = cache
+        self.model_name = str(getattr(llm, "model", type(llm).__name__))
         self.extraction_prompt = ChatPromptTemplate.from_messages(
             [
                 (
@@ -61,43 +256,146 @@ class AgenticChunker:
             ]
         )
 
+    def _slices(self, text: str) -> list[str]:
+        """
+        Packs the lines of 'text' into slices of at most SLICE_MAX_CHARS. Past
+        SLICE_MIN_CHARS, a slice ends after any line whose hash picks it as a
+        boundary, about once every SLICE_BOUNDARY_CHARS. Boundaries depend on
+        the lines rather than their offsets, so an edit only changes the slice
+        it falls in and the other slices stay cache hits.
+        """
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.SLICE_MAX_CHARS, chunk_overlap=0
+        )
+        lines: list[str] = []
+        for line in text.splitlines():
+            line = line.rstrip()
+            if len(line) > self.SLICE_MAX_CHARS:
+                lines.extend(splitter.split_text(line))
+            else:
+                lines.append(line)
+
+        slices: list[str] = []
+        current: list[str] = []
+        size = 0
+
+        def flush() -> None:
+            nonlocal size
+            content = "\n".join(current).strip()
+            if content:
+                slices.append(content)
+            current.clear()
+            size = 0
+
+        for line in lines:
+            if current and size + 1 + len(line) > self.SLICE_MAX_CHARS:
+                flush()
+            size += len(line) + (1 if current else 0)
+            current.append(line)
+            digest = hashlib.sha256(line.encode("utf-8")).digest()
+            pick = int.from_bytes(digest[:4], "big") % self.SLICE_BOUNDARY_CHARS
+            if size >= self.SLICE_MIN_CHARS and pick < len(line):
+                flush()
+        flush()
+        return slices
+
     def _get_propositions(self, text: str) -> list[str]:
+        if self.cache is not None:
+            cached = self.cache.get(
+                "propositions", self.model_name, self.PROPOSITIONS_PROMPT_VERSION, text
+            )
+            if cached is not None:
+                LLM_CACHE_HITS.labels("propositions").inc()
+                return list(cached)
+
         chain = self.extraction_prompt | self.llm
         try:
-            response = chain.invoke({"input": text})
+            with INGEST_STAGE_SECONDS.labels("propositions").time():
+                response = chain.invoke({"input": text})
             content = str(response.content)
             lines = content.split("\n")
-            return [line.strip("- *").strip() for line in lines if line.strip()]
+            propositions = [line.strip("- *").strip() for line in lines if line.strip()]
+            if self.cache is not None:
+                self.cache.put(
+                    "propositions",
+                    self.model_name,
+                    self.PROPOSITIONS_PROMPT_VERSION,
+                    text,
+                    propositions,
+                )
+            return propositions
         except Exception as e:
             logger.error(f"Error extracting propositions: {e}", exc_info=True)
             return [text]
 
     def _get_title(self, propositions: list[str]) -> str:
+        props_text = "\n".join(propositions[:10])
+        if self.cache is not None:
+            cached = self.cache.get(
+                "title", self.model_name, self.TITLE_PROMPT_VERSION, props_text
+            )
+            if cached is not None:
+                LLM_CACHE_HITS.labels("titles").inc()
+                return str(cached)
+
         chain = self.titling_prompt | self.llm
         try:
-            props_text = "\n".join(propositions[:10])
-            response = chain.invoke({"propositions": props_text})
+            with INGEST_STAGE_SECONDS.labels("titles").time():
+                response = chain.invoke({"propositions": props_text})
             content = str(response.content)
             title = content.split("\n")[0].strip("\"' ")
-            return title if title else "Untitled Section"
+            if not title:
+                return "Untitled Section"
+            if self.cache is not None:
+                self.cache.put(
+                    "title",
+                    self.model_name,
+                    self.TITLE_PROMPT_VERSION,
+                    props_text,
+                    title,
+                )
+            return title
         except Exception as e:
             logger.error(f"Error generating title: {e}", exc_info=True)
             return "Untitled Section"
 
-    def split_documents(self, documents: list[Document]) -> list[Document]:
+    def _map_concurrently(self, func: Callable[[T], R], items: list[T]) -> list[R]:
+        """
+        Applies func to every item with at most max_concurrency calls in flight.
+        Results keep the input order.
+        """
+        if self.max_concurrency == 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        workers = min(self.max_concurrency, len(items))
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="chunker"
+        ) as pool:
+            return list(pool.map(func, items))
+
+    def split_documents(
+        self, documents: list[Document], progress: IngestProgress | None = None
+    ) -> list[Document]:
         logger.info(f"Starting agentic chunking for {len(documents)} document(s).")
+        progress = progress or IngestProgress()
         final_chunks = []
 
         for i, doc in enumerate(documents):
             logger.debug(f"Processing document {i+1}/{len(documents)}...")
-            initial_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=4000, chunk_overlap=400
-            )
-            initial_docs = initial_splitter.split_documents([doc])
+            slices = self._slices(doc.page_content)
+
+            progress.start("propositions", len(slices))
 
+            def extract(text: str) -> list[str]:
+                propositions = self._get_propositions(text)
+                progress.advance("propositions")
+                return propositions
+
+            # Slices are independent, so extraction runs concurrently; each call
+            # keeps its own fallback and results are merged in slice order.
             all_propositions = []
-            for idoc in initial_docs:
-                all_propositions.extend(self._get_propositions(idoc.page_content))
+            for propositions in self._map_concurrently(extract, slices):
+                all_propositions.extend(propositions)
+            progress.finish("propositions")
             logger.debug(f"Extracted {len(all_propositions)} propositions.")
 
             unique_propositions = []
@@ -109,7 +407,8 @@ class AgenticChunker:
                     seen_props.add(clean_prop)
             logger.debug(f"Reduced to {len(unique_propositions)} unique propositions.")
 
-            current_group = []
+            groups: list[list[str]] = []
+            current_group: list[str] = []
             current_len = 0
 
             for prop in unique_propositions:
@@ -118,70 +417,564 @@ class AgenticChunker:
                     current_len += len(prop)
                 else:
                     if current_group:
-                        section_title = self._get_title(current_group)
-                        new_metadata = doc.metadata.copy()
-                        new_metadata["section_title"] = section_title
-                        content = f"Section: {section_title}\n" + " ".join(current_group)
-                        final_chunks.append(
-                            Document(page_content=content, metadata=new_metadata)
-                        )
+                        groups.append(current_group)
                     current_group = [prop]
                     current_len = len(prop)
 
             if current_group:
-                section_title = self._get_title(current_group)
+                groups.append(current_group)
+
+            # Titles only depend on their own group, so they are generated after
+            # grouping, concurrently; _get_title falls back to "Untitled Section".
+            progress.start("titles", len(groups))
+
+            def title(group: list[str]) -> str:
+                section_title = self._get_title(group)
+                progress.advance("titles")
+                return section_title
+
+            section_titles = self._map_concurrently(title, groups)
+            progress.finish("titles")
+
+            for group, section_title in zip(groups, section_titles, strict=True):
                 new_metadata = doc.metadata.copy()
                 new_metadata["section_title"] = section_title
-                content = f"Section: {section_title}\n" + " ".join(current_group)
+                content = f"Section: {section_title}\n" + " ".join(group)
                 final_chunks.append(
                     Document(page_content=content, metadata=new_metadata)
                 )
-        
+
         logger.info(f"Agentic chunking complete. Produced {len(final_chunks)} final chunks.")
         return final_chunks
 
 
-def get_vector_store() -> QdrantVectorStore:
+class StructureChunker:
+    """
+    Splits Markdown on its heading hierarchy without any LLM call. Every chunk
+    is titled with its heading path ("Leave > Annual Leave"), and sections
+    longer than max_chars are split further on paragraphs and lines, so
+    numbered clauses and table rows stay whole. Chunks have the same shape as
+    those of AgenticChunker.
+    """
+
+    HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+    FENCE = re.compile(r"^\s*(```|~~~)")
+
+    def __init__(self, max_chars: int = 1800, min_headings: int = 2):
+        self.max_chars = max_chars
+        self.min_headings = min_headings
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=max_chars, chunk_overlap=0
+        )
+
+    def sections(self, text: str) -> list[tuple[list[str], str]]:
+        """(heading path, body) pairs in document order; fenced code is body."""
+        sections: list[tuple[list[str], str]] = []
+        path: list[tuple[int, str]] = []
+        body: list[str] = []
+        in_fence = False
+
+        def flush() -> None:
+            content = "\n".join(body).strip()
+            if content:
+                sections.append(([title for _, title in path], content))
+            body.clear()
+
+        for line in text.splitlines():
+            if self.FENCE.match(line):
+                in_fence = not in_fence
+            heading = None if in_fence else self.HEADING.match(line)
+            if heading is None:
+                body.append(line)
+                continue
+            flush()
+            level = len(heading.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, heading.group(2).strip("*_ ")))
+        flush()
+        return sections
+
+    def has_structure(self, text: str) -> bool:
+        headings = sum(1 for path, _ in self.sections(text) if path)
+        return headings >= self.min_headings
+
+    def split_documents(self, documents: list[Document]) -> list[Document]:
+        chunks = []
+        for doc in documents:
+            fallback_title = os.path.splitext(str(doc.metadata.get("source", "")))[0]
+            for path, body in self.sections(doc.page_content):
+                section_title = " > ".join(path) or fallback_title or "Untitled Section"
+                for part in self.splitter.split_text(body):
+                    metadata = doc.metadata.copy()
+                    metadata["section_title"] = section_title
+                    content = f"Section: {section_title}\n" + part
+                    chunks.append(Document(page_content=content, metadata=metadata))
+        logger.info(f"Structure chunking complete. Produced {len(chunks)} chunks.")
+        return chunks
+
+
+def chunking_strategy(filename: str, requested: str | None = None) -> str:
+    """The strategy for a file: the requested one, its extension's, or the default."""
+    if requested:
+        requested = requested.lower()
+        if requested not in CHUNKING_STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy '{requested}'")
+        return requested
+    extension = os.path.splitext(filename)[1].lower()
+    return _chunking_by_extension.get(extension, CHUNKING_STRATEGY)
+
+
+# Process-wide memo of the collection state. Only this process creates or drops
+# the collection, so a positive existence check stays valid until
+# drop_collection() (or invalidate_collection_cache()) clears it.
+_collection_lock = threading.Lock()
+_collection_ready = False
+_hybrid_ready = False
+_vector_store: VectorStore | None = None
+_embedding_dim: int | None = None
+
+
+# Called whenever the collection state is forgotten, e.g. by rag to drop the
+# chains that hold the old vector store. Registered by the consumers, since
+# ingest cannot import them.
+_invalidation_callbacks: list[Callable[[], None]] = []
+
+
+def on_collection_invalidated(callback: Callable[[], None]) -> None:
+    """Registers a callback run by every invalidate_collection_cache()."""
+    _invalidation_callbacks.append(callback)
+
+
+def invalidate_collection_cache() -> None:
+    """
+    Forgets the memoized collection state, the cached vector store and the
+    detected embedding dimension, and runs the registered callbacks.
+    """
+    global _collection_ready, _hybrid_ready, _vector_store, _embedding_dim
+    with _collection_lock:
+        _collection_ready = False
+        _hybrid_ready = False
+        _vector_store = None
+        _embedding_dim = None
+    for callback in _invalidation_callbacks:
+        callback()
+
+
+def hybrid_enabled() -> bool:
+    """True when hybrid retrieval is configured and the collection supports it."""
     ensure_collection_exists()
-    return QdrantVectorStore(
-        client=client,
-        collection_name=COLLECTION_NAME,
-        embedding=embeddings,
+    return _hybrid_ready
+
+
+def get_vector_store() -> VectorStore:
+    """Returns the shared vector store, creating the collection on first use."""
+    global _vector_store
+    hybrid = hybrid_enabled()
+    with _collection_lock:
+        if _vector_store is None and VECTOR_BACKEND == "numpy":
+            _vector_store = NumpyVectorStore(NUMPY_STORE_PATH, get_embedding_model())
+        elif _vector_store is None:
+            _vector_store = QdrantVectorStore(
+                client=get_qdrant_client(),
+                collection_name=COLLECTION_NAME,
+                embedding=get_embedding_model(),
+                content_payload_key=CONTENT_PAYLOAD_KEY,
+                metadata_payload_key=METADATA_PAYLOAD_KEY,
+                vector_name=DENSE_VECTOR_NAME,
+                retrieval_mode=(
+                    RetrievalMode.HYBRID if hybrid else RetrievalMode.DENSE
+                ),
+                sparse_embedding=sparse_embeddings if hybrid else None,
+                sparse_vector_name=SPARSE_VECTOR_NAME,
+            )
+        return _vector_store
+
+
+def embedding_dimension() -> int:
+    """Returns the dense vector size: EMBEDDING_DIM, or probed once from the model."""
+    global _embedding_dim
+    if _embedding_dim is None:
+        _embedding_dim = EMBEDDING_DIM or len(
+            get_embedding_model().embed_query("dimension probe")
+        )
+    return _embedding_dim
+
+
+def quantization_config(
+    mode: str | None = None,
+) -> models.ScalarQuantization | models.BinaryQuantization | None:
+    """Quantization for 'mode' (default QDRANT_QUANTIZATION); None for "none"."""
+    mode = mode or QDRANT_QUANTIZATION
+    if mode == "none":
+        return None
+    if mode == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    raise ValueError(f"Unknown QDRANT_QUANTIZATION '{mode}'")
+
+
+def search_params(quantization: str | None = None) -> models.SearchParams:
+    """Query-time search parameters matching the collection config."""
+    if quantization_config(quantization) is None:
+        return models.SearchParams(hnsw_ef=QDRANT_SEARCH_EF)
+    return models.SearchParams(
+        hnsw_ef=QDRANT_SEARCH_EF,
+        quantization=models.QuantizationSearchParams(
+            rescore=True, oversampling=QDRANT_OVERSAMPLING
+        ),
     )
 
 
-def ensure_collection_exists() -> None:
-    if not client.collection_exists(collection_name=COLLECTION_NAME):
-        # nomic-embed-text uses 768 dimensions
-        client.create_collection(
+def _quantization_mode(config: object) -> str:
+    if isinstance(config, models.ScalarQuantization):
+        return "scalar"
+    if isinstance(config, models.BinaryQuantization):
+        return "binary"
+    return "none"
+
+
+def _create_collection(collection_name: str, hybrid: bool) -> None:
+    client = get_qdrant_client()
+    quantization = quantization_config()
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(
+            size=embedding_dimension(),
+            distance=models.Distance.COSINE,
+            on_disk=quantization is not None,
+        ),
+        # Qdrant applies the IDF part of BM25 from collection statistics.
+        sparse_vectors_config=(
+            {
+                SPARSE_VECTOR_NAME: models.SparseVectorParams(
+                    modifier=models.Modifier.IDF
+                )
+            }
+            if hybrid
+            else None
+        ),
+        hnsw_config=models.HnswConfigDiff(
+            m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT
+        ),
+        quantization_config=quantization,
+    )
+    _ensure_payload_indexes(collection_name, {})
+
+
+def _ensure_payload_indexes(
+    collection_name: str, payload_schema: dict[str, models.PayloadIndexInfo]
+) -> None:
+    """Creates the keyword indexes in PAYLOAD_INDEX_FIELDS that are missing."""
+    client = get_qdrant_client()
+    if VECTOR_BACKEND == "qdrant-local":
+        return  # embedded Qdrant scans payloads and has no payload indexes
+    for field in PAYLOAD_INDEX_FIELDS:
+        index = payload_schema.get(field)
+        if index is None or index.data_type != models.PayloadSchemaType.KEYWORD:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+                wait=True,
+            )
+
+
+def _expected_dimension() -> int | None:
+    """
+    The vector size the config asks for: EMBEDDING_DIM, or the model's own size
+    when QDRANT_AUTO_MIGRATE may rebuild the collection for it. Otherwise None:
+    an existing collection's size is trusted, so no probe embedding is needed.
+    """
+    if EMBEDDING_DIM or QDRANT_AUTO_MIGRATE:
+        return embedding_dimension()
+    return None
+
+
+def _layout_mismatches(info: models.CollectionInfo, hybrid: bool) -> list[str]:
+    """Differences from the configured layout that require re-embedding points."""
+    mismatches = []
+    vectors = info.config.params.vectors
+    if not isinstance(vectors, models.VectorParams):
+        mismatches.append("named dense vectors instead of the default vector")
+    else:
+        expected = _expected_dimension()
+        if expected is not None and vectors.size != expected:
+            mismatches.append(
+                f"vector size {vectors.size} != {expected} ({EMBEDDING_MODEL})"
+            )
+        if vectors.distance != models.Distance.COSINE:
+            mismatches.append(f"distance {vectors.distance} != Cosine")
+    if hybrid and SPARSE_VECTOR_NAME not in (info.config.params.sparse_vectors or {}):
+        mismatches.append(f"no '{SPARSE_VECTOR_NAME}' sparse vectors")
+    return mismatches
+
+
+def _migrate_in_place(info: models.CollectionInfo) -> None:
+    """Applies the settings Qdrant can change without touching the points."""
+    client = get_qdrant_client()
+    hnsw = info.config.hnsw_config
+    if hnsw.m != QDRANT_HNSW_M or hnsw.ef_construct != QDRANT_HNSW_EF_CONSTRUCT:
+        logger.info(
+            f"Updating HNSW config of {COLLECTION_NAME}: m={QDRANT_HNSW_M}, "
+            f"ef_construct={QDRANT_HNSW_EF_CONSTRUCT}"
+        )
+        client.update_collection(
             collection_name=COLLECTION_NAME,
-            vectors_config=models.VectorParams(
-                size=768, distance=models.Distance.COSINE
+            hnsw_config=models.HnswConfigDiff(
+                m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT
             ),
         )
+    current = _quantization_mode(info.config.quantization_config)
+    if current != QDRANT_QUANTIZATION:
+        logger.info(
+            f"Changing quantization of {COLLECTION_NAME}: {current} -> "
+            f"{QDRANT_QUANTIZATION}"
+        )
+        quantization = quantization_config()
+        client.update_collection(
+            collection_name=COLLECTION_NAME,
+            vectors_config={
+                DENSE_VECTOR_NAME: models.VectorParamsDiff(
+                    on_disk=quantization is not None
+                )
+            },
+            quantization_config=quantization or models.Disabled.DISABLED,
+        )
+    _ensure_payload_indexes(COLLECTION_NAME, info.payload_schema)
 
 
-def process_and_index_file(file_path: str, filename: str) -> str:
+def _copy_points(source: str, target: str, hybrid: bool, reembed: bool) -> int:
+    """
+    Copies every point from 'source' to 'target', keeping ids and payloads.
+    With reembed=True vectors are recomputed from the stored chunk text.
     """
-    Parses a file using MarkItDown, chunks it using Agentic Chunking, and indexes it into Qdrant.
+    client = get_qdrant_client()
+    copied = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=source,
+            limit=EMBED_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=not reembed,
+        )
+        if records:
+            if reembed:
+                vectors = _embed_texts(
+                    [str(r.payload.get(CONTENT_PAYLOAD_KEY, "")) for r in records],
+                    hybrid,
+                )
+            else:
+                vectors = [r.vector for r in records]
+            client.upsert(
+                collection_name=target,
+                points=[
+                    models.PointStruct(id=r.id, vector=vector, payload=r.payload)
+                    for r, vector in zip(records, vectors, strict=True)
+                ],
+            )
+            copied += len(records)
+        if offset is None:
+            return copied
+
+
+def _rebuild_collection(hybrid: bool) -> None:
+    """
+    Recreates the collection with the configured layout. Points are re-embedded
+    into REBUILD_COLLECTION_NAME first, so the original is only dropped once a
+    full copy exists; an interrupted rebuild is finished by _resume_rebuild().
+    """
+    client = get_qdrant_client()
+    if client.collection_exists(collection_name=REBUILD_COLLECTION_NAME):
+        client.delete_collection(collection_name=REBUILD_COLLECTION_NAME)
+    _create_collection(REBUILD_COLLECTION_NAME, hybrid)
+    count = _copy_points(COLLECTION_NAME, REBUILD_COLLECTION_NAME, hybrid, reembed=True)
+    client.delete_collection(collection_name=COLLECTION_NAME)
+    _create_collection(COLLECTION_NAME, hybrid)
+    _copy_points(REBUILD_COLLECTION_NAME, COLLECTION_NAME, hybrid, reembed=False)
+    client.delete_collection(collection_name=REBUILD_COLLECTION_NAME)
+    logger.info(f"Rebuilt collection {COLLECTION_NAME} with {count} points.")
+
+
+def _resume_rebuild(hybrid: bool) -> None:
+    """
+    Handles a REBUILD_COLLECTION_NAME left by an interrupted rebuild. Once the
+    original has been dropped (or already has the new layout) the copy is
+    complete and is moved back; otherwise it is partial and discarded.
+    """
+    client = get_qdrant_client()
+    if not client.collection_exists(collection_name=COLLECTION_NAME):
+        _create_collection(COLLECTION_NAME, hybrid)
+    else:
+        info = client.get_collection(collection_name=COLLECTION_NAME)
+        if _layout_mismatches(info, hybrid):
+            client.delete_collection(collection_name=REBUILD_COLLECTION_NAME)
+            return
+    logger.warning(f"Resuming interrupted rebuild of collection {COLLECTION_NAME}.")
+    _copy_points(REBUILD_COLLECTION_NAME, COLLECTION_NAME, hybrid, reembed=False)
+    client.delete_collection(collection_name=REBUILD_COLLECTION_NAME)
+
+
+def ensure_collection_exists() -> None:
+    """
+    Creates the collection from the config on first use, or validates an
+    existing one: HNSW, quantization and payload indexes are updated in place, and a
+    different vector layout is rebuilt when QDRANT_AUTO_MIGRATE is enabled.
+    """
+    global _collection_ready, _hybrid_ready, _embedding_dim
+    if _collection_ready:
+        return
+    with _collection_lock:
+        if _collection_ready:
+            return
+        want_hybrid = RETRIEVAL_MODE == "hybrid"
+        if VECTOR_BACKEND == "numpy":
+            if want_hybrid:
+                logger.warning(
+                    "The numpy vector backend has no sparse vectors; using dense "
+                    "retrieval."
+                )
+            _hybrid_ready = False
+            _collection_ready = True
+            return
+        client = get_qdrant_client()
+        if QDRANT_AUTO_MIGRATE and client.collection_exists(
+            collection_name=REBUILD_COLLECTION_NAME
+        ):
+            _resume_rebuild(want_hybrid)
+        if not client.collection_exists(collection_name=COLLECTION_NAME):
+            _create_collection(COLLECTION_NAME, want_hybrid)
+            _hybrid_ready = want_hybrid
+            _collection_ready = True
+            return
+
+        info = client.get_collection(collection_name=COLLECTION_NAME)
+        mismatches = _layout_mismatches(info, want_hybrid)
+        if mismatches and QDRANT_AUTO_MIGRATE:
+            logger.warning(
+                f"Collection {COLLECTION_NAME} differs from the config "
+                f"({'; '.join(mismatches)}); rebuilding it."
+            )
+            _rebuild_collection(want_hybrid)
+            mismatches = []
+        elif mismatches == [f"no '{SPARSE_VECTOR_NAME}' sparse vectors"]:
+            logger.warning(
+                f"Collection {COLLECTION_NAME} has no '{SPARSE_VECTOR_NAME}' "
+                "sparse vectors; falling back to dense retrieval. Set "
+                "QDRANT_AUTO_MIGRATE=true to rebuild it for hybrid search."
+            )
+        elif mismatches:
+            raise RuntimeError(
+                f"Collection {COLLECTION_NAME} does not match the config "
+                f"({'; '.join(mismatches)}). Set QDRANT_AUTO_MIGRATE=true to "
+                "rebuild it, or drop it and re-ingest."
+            )
+        else:
+            _migrate_in_place(info)
+        vectors = info.config.params.vectors
+        if _embedding_dim is None and isinstance(vectors, models.VectorParams):
+            _embedding_dim = vectors.size
+        _hybrid_ready = want_hybrid and not mismatches
+        _collection_ready = True
+
+
+def drop_collection() -> None:
+    """Deletes the whole collection and invalidates the memoized state."""
+    try:
+        if VECTOR_BACKEND == "numpy":
+            _numpy_store().drop()
+        else:
+            get_qdrant_client().delete_collection(collection_name=COLLECTION_NAME)
+    finally:
+        invalidate_collection_cache()
+
+
+def process_and_index_file(
+    file_path: str,
+    filename: str,
+    file_id: str | None = None,
+    progress: IngestProgress | None = None,
+    replace: bool = False,
+    chunking: str | None = None,
+) -> str:
+    """
+    Parses a file using MarkItDown, chunks it using Agentic Chunking (or the
+    'chunking' strategy, see chunking_strategy), and indexes it into Qdrant.
+    With replace=True, existing points of file_id are removed right before the new
+    chunks are upserted, so the old version stays searchable while chunking runs.
     Returns the file_id.
     """
+    progress = progress or IngestProgress()
+
+    # 1. Parse using MarkItDown
+    progress.start("parse", 1)
+    markdown_content = parse_to_markdown(file_path)
+    progress.advance("parse")
+    progress.finish("parse")
+
+    return index_markdown(
+        markdown_content,
+        filename,
+        file_id=file_id,
+        progress=progress,
+        replace=replace,
+        chunking=chunking,
+    )
+
+
+def parse_to_markdown(file_path: str) -> str:
+    """Converts a document to Markdown with MarkItDown."""
+    with INGEST_STAGE_SECONDS.labels("parse").time():
+        md = __getattr__("MarkItDown")()
+        result = md.convert(file_path)
+    return str(result.text_content)
+
+
+def index_markdown(
+    markdown_content: str,
+    filename: str,
+    file_id: str | None = None,
+    progress: IngestProgress | None = None,
+    replace: bool = False,
+    max_concurrency: int = CHUNKER_MAX_CONCURRENCY,
+    chunking: str | None = None,
+) -> str:
+    """
+    Chunks already parsed Markdown and indexes it (steps 2-4 of
+    process_and_index_file). Returns the file_id.
+    """
+    strategy = chunking_strategy(filename, chunking)
     ensure_collection_exists()
+    progress = progress or IngestProgress()
 
-    file_id = str(uuid.uuid4())
+    file_id = file_id or str(uuid.uuid4())
     upload_date = datetime.now().isoformat()
 
-    # 1. Parse using MarkItDown
-    md = MarkItDown()
-    result = md.convert(file_path)
-    markdown_content = str(result.text_content)
-
     # Create a LangChain Document from the markdown content
     docs = [Document(page_content=markdown_content, metadata={"source": filename})]
 
-    # 2. Agentic Chunking
-    chunker = AgenticChunker(llm)
-    chunks = chunker.split_documents(docs)
+    # 2. Chunking. Headed documents can skip the LLM entirely; the agentic
+    # chunker's calls yield to chat requests in the shared LLM scheduler.
+    structure = StructureChunker()
+    if strategy == "structure" and structure.has_structure(markdown_content):
+        chunks = structure.split_documents(docs)
+    else:
+        if strategy == "structure":
+            logger.info(f"{filename} has no heading structure; using agentic chunking.")
+        llm = get_chat_model(Priority.INGEST)
+        chunker = AgenticChunker(
+            llm, max_concurrency=max_concurrency, cache=__getattr__("llm_cache")
+        )
+        chunks = chunker.split_documents(docs, progress=progress)
 
     # 3. Add Metadata
     for chunk in chunks:
@@ -190,17 +983,108 @@ def process_and_index_file(file_path: str, filename: str) -> str:
         chunk.metadata["upload_date"] = upload_date
 
     # 4. Index
-    vector_store = get_vector_store()
-    vector_store.add_documents(chunks)
+    if replace:
+        delete_file_from_index(file_id)
+    index_chunks(chunks, progress=progress)
 
     return file_id
 
 
+def point_id(file_id: str, position: int) -> str:
+    """Deterministic id of a file's n-th chunk, so re-indexing overwrites points."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{file_id}:{position}"))
+
+
+def index_chunks(
+    chunks: list[Document], progress: IngestProgress | None = None
+) -> None:
+    """
+    Embeds the chunks and upserts them into Qdrant in batches. Points use the
+    payload layout of QdrantVectorStore, so the retriever reads them unchanged.
+    Chunks with a file_id get deterministic point ids, so retries are idempotent.
+    """
+    progress = progress or IngestProgress()
+    texts = [chunk.page_content for chunk in chunks]
+    hybrid = hybrid_enabled()
+
+    progress.start("embed", len(texts))
+    vectors: list[models.VectorStruct] = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[start : start + EMBED_BATCH_SIZE]
+        with INGEST_STAGE_SECONDS.labels("embed").time():
+            vectors.extend(_embed_texts(batch, hybrid))
+        progress.advance("embed", len(batch))
+    progress.finish("embed")
+
+    points = [
+        models.PointStruct(
+            id=(
+                point_id(chunk.metadata["file_id"], position)
+                if "file_id" in chunk.metadata
+                else str(uuid.uuid4())
+            ),
+            vector=vector,
+            payload={
+                CONTENT_PAYLOAD_KEY: chunk.page_content,
+                METADATA_PAYLOAD_KEY: chunk.metadata,
+            },
+        )
+        for position, (chunk, vector) in enumerate(zip(chunks, vectors, strict=True))
+    ]
+
+    progress.start("upsert", len(points))
+    for start in range(0, len(points), EMBED_BATCH_SIZE):
+        batch_points = points[start : start + EMBED_BATCH_SIZE]
+        with INGEST_STAGE_SECONDS.labels("upsert").time():
+            _upsert_points(batch_points)
+        progress.advance("upsert", len(batch_points))
+    progress.finish("upsert")
+
+
+def _numpy_store() -> NumpyVectorStore:
+    store = get_vector_store()
+    assert isinstance(store, NumpyVectorStore)
+    return store
+
+
+def _upsert_points(points: list[models.PointStruct]) -> None:
+    if VECTOR_BACKEND != "numpy":
+        get_qdrant_client().upsert(collection_name=COLLECTION_NAME, points=points)
+        return
+    _numpy_store().upsert(
+        [str(point.id) for point in points],
+        [point.vector for point in points],
+        [point.payload[CONTENT_PAYLOAD_KEY] for point in points],
+        [point.payload[METADATA_PAYLOAD_KEY] for point in points],
+    )
+
+
+def _embed_texts(texts: list[str], hybrid: bool) -> list[models.VectorStruct]:
+    """Point vectors for 'texts': dense only, or dense plus BM25 when hybrid."""
+    dense_vectors = get_embedding_model().embed_documents(texts)
+    if not hybrid:
+        return list(dense_vectors)
+    return [
+        {
+            DENSE_VECTOR_NAME: dense,
+            SPARSE_VECTOR_NAME: models.SparseVector(
+                indices=sparse.indices, values=sparse.values
+            ),
+        }
+        for dense, sparse in zip(
+            dense_vectors, sparse_embeddings.embed_documents(texts), strict=True
+        )
+    ]
+
+
 def delete_file_from_index(file_id: str) -> None:
     """
     Deletes all vectors associated with a specific file_id.
     """
-    client.delete(
+    if VECTOR_BACKEND == "numpy":
+        _numpy_store().delete_by_metadata("file_id", file_id)
+        return
+    get_qdrant_client().delete(
         collection_name=COLLECTION_NAME,
         points_selector=models.FilterSelector(
             filter=models.Filter(
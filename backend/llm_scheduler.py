@@ -0,0 +1,277 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from enum import Enum
+from typing import Any
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_ollama import ChatOllama
+
+from metrics import (
+    LLM_QUEUE_DEPTH,
+    LLM_QUEUE_WAIT_SECONDS,
+    LLM_REJECTED,
+    LLM_SLOTS_IN_USE,
+)
+
+load_dotenv()
+
+# Chat calls in flight against Ollama across the process (pair with
+# OLLAMA_NUM_PARALLEL). Slots are always handed to interactive callers first,
+# and ingestion never holds the last LLM_INTERACTIVE_RESERVED of them.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", "1"))
+# Waiting calls allowed per class before new ones are rejected (0 = unbounded).
+# Interactive rejections become 429 responses; ingestion waits by default.
+LLM_QUEUE_LIMIT_INTERACTIVE = int(os.getenv("LLM_QUEUE_LIMIT_INTERACTIVE", "32"))
+LLM_QUEUE_LIMIT_INGEST = int(os.getenv("LLM_QUEUE_LIMIT_INGEST", "0"))
+
+
+class Priority(str, Enum):
+    """Scheduling classes, highest priority first."""
+
+    INTERACTIVE = "interactive"
+    INGEST = "ingest"
+
+
+class SchedulerSaturated(Exception):
+    """Raised when a class's queue is full. retry_after is in seconds."""
+
+    def __init__(self, priority: Priority, retry_after: int):
+        super().__init__(f"LLM queue for {priority.value} requests is full")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued caller: a thread blocked on an event, or a coroutine's future."""
+
+    def __init__(self, priority: Priority, loop: asyncio.AbstractEventLoop | None):
+        self.priority = priority
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        elif self.loop is not None and self.future is not None:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if self.future is not None and not self.future.done():
+            self.future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM calls. Holds at most max_concurrency
+    slots; freed slots go to the oldest waiter of the highest priority class
+    that may run. Threads (ingestion) and coroutines (chat) share the same
+    queues. Retry-After estimates come from a moving average of slot hold times.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        interactive_reserved: int = LLM_INTERACTIVE_RESERVED,
+        queue_limits: dict[Priority, int] | None = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError(
+                f"LLM_MAX_CONCURRENCY must be at least 1, not {max_concurrency}"
+            )
+        if not 0 <= interactive_reserved < max_concurrency:
+            # Ingestion would get no slot at all, and its jobs would wait forever.
+            raise ValueError(
+                "LLM_INTERACTIVE_RESERVED must be between 0 and "
+                f"LLM_MAX_CONCURRENCY - 1 ({max_concurrency - 1}), "
+                f"not {interactive_reserved}"
+            )
+        self.max_concurrency = max_concurrency
+        self.ingest_limit = max_concurrency - interactive_reserved
+        self.queue_limits = queue_limits or {
+            Priority.INTERACTIVE: LLM_QUEUE_LIMIT_INTERACTIVE,
+            Priority.INGEST: LLM_QUEUE_LIMIT_INGEST,
+        }
+        self._lock = threading.Lock()
+        self._queues: dict[Priority, deque[_Waiter]] = {p: deque() for p in Priority}
+        self._in_use: dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self._avg_hold = 1.0
+
+    def _may_run(self, priority: Priority) -> bool:
+        if sum(self._in_use.values()) >= self.max_concurrency:
+            return False
+        return priority is Priority.INTERACTIVE or (
+            self._in_use[Priority.INGEST] < self.ingest_limit
+        )
+
+    def _grant(self, priority: Priority) -> None:
+        self._in_use[priority] += 1
+        LLM_SLOTS_IN_USE.labels(priority.value).set(self._in_use[priority])
+
+    def _dispatch(self) -> list[_Waiter]:
+        """Grants free slots to waiters in priority order; caller holds the lock."""
+        woken = []
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue and self._may_run(priority):
+                waiter = queue.popleft()
+                waiter.granted = True
+                self._grant(priority)
+                woken.append(waiter)
+            LLM_QUEUE_DEPTH.labels(priority.value).set(len(queue))
+        return woken
+
+    def retry_after(self, priority: Priority = Priority.INTERACTIVE) -> int:
+        """Seconds until a slot is likely free for a new caller of 'priority'."""
+        classes = list(Priority)
+        ahead = classes[: classes.index(priority) + 1]
+        queued = sum(len(self._queues[p]) for p in ahead)
+        return max(1, math.ceil(self._avg_hold * (queued + 1) / self.max_concurrency))
+
+    def _enqueue(
+        self, priority: Priority, loop: asyncio.AbstractEventLoop | None
+    ) -> _Waiter | None:
+        """Takes a free slot (returns None) or queues a waiter."""
+        with self._lock:
+            if not self._queues[priority] and self._may_run(priority):
+                self._grant(priority)
+                return None
+            self._reject_if_full(priority)
+            waiter = _Waiter(priority, loop)
+            self._queues[priority].append(waiter)
+            LLM_QUEUE_DEPTH.labels(priority.value).set(len(self._queues[priority]))
+            return waiter
+
+    def _reject_if_full(self, priority: Priority) -> None:
+        limit = self.queue_limits.get(priority, 0)
+        if limit and len(self._queues[priority]) >= limit:
+            LLM_REJECTED.labels(priority.value).inc()
+            raise SchedulerSaturated(priority, self.retry_after(priority))
+
+    def check(self, priority: Priority) -> None:
+        """Raises SchedulerSaturated if a call of 'priority' would be rejected now."""
+        with self._lock:
+            self._reject_if_full(priority)
+
+    def release(self, priority: Priority, held: float | None = None) -> None:
+        with self._lock:
+            self._in_use[priority] -= 1
+            LLM_SLOTS_IN_USE.labels(priority.value).set(self._in_use[priority])
+            if held is not None:
+                self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+            woken = self._dispatch()
+        for waiter in woken:
+            waiter.wake()
+
+    def acquire(self, priority: Priority) -> None:
+        start = time.perf_counter()
+        waiter = self._enqueue(priority, None)
+        if waiter is not None and waiter.event is not None:
+            waiter.event.wait()
+        LLM_QUEUE_WAIT_SECONDS.labels(priority.value).observe(
+            time.perf_counter() - start
+        )
+
+    async def aacquire(self, priority: Priority) -> None:
+        start = time.perf_counter()
+        waiter = self._enqueue(priority, asyncio.get_running_loop())
+        if waiter is not None and waiter.future is not None:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.granted
+                    if not granted:
+                        self._queues[priority].remove(waiter)
+                        LLM_QUEUE_DEPTH.labels(priority.value).set(
+                            len(self._queues[priority])
+                        )
+                if granted:
+                    self.release(priority)
+                raise
+        LLM_QUEUE_WAIT_SECONDS.labels(priority.value).observe(
+            time.perf_counter() - start
+        )
+
+    @contextmanager
+    def slot(self, priority: Priority) -> Iterator[None]:
+        self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(priority, time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def aslot(self, priority: Priority) -> AsyncIterator[None]:
+        await self.aacquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(priority, time.perf_counter() - start)
+
+
+scheduler = LLMScheduler()
+
+
+class ScheduledChatOllama(ChatOllama):
+    """ChatOllama whose calls wait for a scheduler slot of their priority."""
+
+    priority: Priority = Priority.INTERACTIVE
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        with scheduler.slot(self.priority):
+            return super()._generate(messages, stop, run_manager, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        async with scheduler.aslot(self.priority):
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # The slot is held until the last token, or until the consumer stops.
+        with scheduler.slot(self.priority):
+            yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async with scheduler.aslot(self.priority):
+            async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                yield chunk
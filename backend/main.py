@@ -1,25 +1,77 @@
-import os
+import asyncio
 import logging
-from dotenv import load_dotenv
-from typing import Annotated
+import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any, Literal
 
-from fastapi import Depends, FastAPI, File, HTTPException, Security, UploadFile, status
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Security, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
-from database import get_all_files_metadata, initialize_db
+from database import initialize_db, list_files_metadata
+from ingest import vector_store_ready
+from llm_scheduler import SchedulerSaturated
 from logger_config import setup_logging
+from metrics import MetricsMiddleware, render_metrics
+from ollama_clients import (
+    OLLAMA_KEEP_WARM_SECONDS,
+    OLLAMA_WARMUP,
+    keep_models_warm,
+    ollama_status,
+)
 from services.chat_service import handle_blocking_chat, handle_streaming_chat
-from services.file_service import handle_delete_file, handle_upload_file
+from services.file_service import (
+    UPLOAD_FIELD,
+    StagedUpload,
+    UploadError,
+    UploadTooLargeError,
+    handle_delete_file,
+    handle_update_file,
+    handle_upload_file,
+    stage_upload,
+)
+from services.job_service import (
+    get_job_status,
+    ingest_executor,
+    keep_job_leases,
+    release_jobs,
+    resume_pending_jobs,
+)
+from tokens import get_token_counter
 
 # --- Setup ---
 setup_logging()
 logger = logging.getLogger("hr_policy_rag")
 load_dotenv()
 
-app = FastAPI(title="HR Policy RAG")
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Pick up ingestion jobs interrupted by the previous shutdown, then keep
+    # this worker's leases alive and adopt jobs of workers that have gone.
+    await run_in_threadpool(resume_pending_jobs)
+    job_leases = asyncio.create_task(keep_job_leases())
+    # Load the tokenizer now, so that falling back to estimates is logged at startup.
+    await run_in_threadpool(get_token_counter)
+    keep_warm = None
+    if OLLAMA_WARMUP:
+        # Models load in the background while the app already serves /healthz;
+        # /readyz reports not ready until they are warm.
+        keep_warm = asyncio.create_task(keep_models_warm(OLLAMA_KEEP_WARM_SECONDS))
+    yield
+    if keep_warm is not None:
+        keep_warm.cancel()
+    job_leases.cancel()
+    # Running jobs stay 'running' in the database and are resumed once their
+    # lease runs out; jobs that never started can be resumed right away.
+    ingest_executor.shutdown(wait=False, cancel_futures=True)
+    release_jobs()
+
+app = FastAPI(title="HR Policy RAG", lifespan=lifespan)
 
 # --- CORS ---
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -30,6 +82,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # --- Database ---
 DATA_DIR = "data"
@@ -49,7 +102,7 @@ api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 async def get_api_key(api_key: str = Security(api_key_header)):
     if not api_key or api_key != API_KEY:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
+            status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials"
         )
     return api_key
@@ -68,28 +121,130 @@ class FileRecord(BaseModel):
     filename: str
     upload_date: str
 
+class FilePage(BaseModel):
+    items: list[FileRecord]
+    next_cursor: str | None = None
+
+class JobRecord(BaseModel):
+    job_id: str
+    filename: str
+    status: str
+    stage: str | None = None
+    progress: dict[str, Any] = {}
+    file_id: str | None = None
+    error: str | None = None
+    chunking: str | None = None
+    created_at: str
+    updated_at: str
+
+# Per-upload override of the configured chunking strategy (see ingest.py).
+ChunkingQuery = Query(
+    None, description="'structure' splits on headings without LLM calls"
+)
+
+# Uploads are parsed from the raw request stream (see stage_upload), so the
+# multipart body is documented here instead of through an UploadFile parameter.
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": [UPLOAD_FIELD],
+                    "properties": {
+                        UPLOAD_FIELD: {"type": "string", "format": "binary"}
+                    },
+                }
+            }
+        },
+    }
+}
+
+async def _stage_or_reject(request: Request) -> StagedUpload:
+    """Stages the request's upload, mapping unusable uploads to 4xx errors."""
+    try:
+        return await stage_upload(request)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
 # --- API Endpoints ---
-@app.post("/upload", response_model=FileRecord, dependencies=[Depends(get_api_key)])
-async def upload_file(file: Annotated[UploadFile, File()]):
-    logger.info(f"Received file upload request for: {file.filename}")
+@app.post(
+    "/upload",
+    response_model=JobRecord,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(get_api_key)],
+    openapi_extra=UPLOAD_OPENAPI,
+)
+async def upload_file(
+    request: Request,
+    chunking: Literal["agentic", "structure"] | None = ChunkingQuery,
+):
+    upload = await _stage_or_reject(request)
+    logger.info(f"Received file upload request for: {upload.filename}")
     try:
-        record = handle_upload_file(file)
+        job = await run_in_threadpool(handle_upload_file, upload, chunking)
         logger.info(
-            f"Successfully processed and indexed file: {file.filename} "
-            f"with file_id: {record['file_id']}"
+            f"Queued ingestion of file: {upload.filename} "
+            f"with job_id: {job['job_id']}"
         )
-        return record
+        return job
     except Exception as e:
         logger.exception(
-            f"Error processing upload for file: {file.filename}", 
+            f"Error processing upload for file: {upload.filename}",
             exc_info=e
         )
         raise HTTPException(status_code=500, detail=str(e)) from e
 
-@app.get("/files", response_model=list[FileRecord], dependencies=[Depends(get_api_key)])
-async def list_files():
+@app.put(
+    "/files/{file_id}",
+    response_model=JobRecord,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(get_api_key)],
+    openapi_extra=UPLOAD_OPENAPI,
+)
+async def update_file(
+    file_id: str,
+    request: Request,
+    chunking: Literal["agentic", "structure"] | None = ChunkingQuery,
+):
+    logger.info(f"Received request to update file: {file_id}")
+    upload = await _stage_or_reject(request)
+    try:
+        job = await run_in_threadpool(handle_update_file, file_id, upload, chunking)
+    except Exception as e:
+        logger.exception(f"Error processing update for file: {file_id}", exc_info=e)
+        raise HTTPException(status_code=500, detail=str(e)) from e
+    if job is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    logger.info(f"Queued update of file: {file_id} with job_id: {job['job_id']}")
+    return job
+
+@app.get(
+    "/jobs/{job_id}", response_model=JobRecord, dependencies=[Depends(get_api_key)]
+)
+async def get_job(job_id: str):
+    job = get_job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/files", response_model=FilePage, dependencies=[Depends(get_api_key)])
+async def list_files(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    filename_prefix: str | None = None,
+):
     logger.info("Received request to list files.")
-    return get_all_files_metadata()
+    try:
+        items, next_cursor = await run_in_threadpool(
+            list_files_metadata, limit, cursor, filename_prefix
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return FilePage(items=items, next_cursor=next_cursor)
 
 @app.delete("/files/{file_id}", dependencies=[Depends(get_api_key)])
 async def delete_file(file_id: str):
@@ -102,16 +257,26 @@ async def delete_file(file_id: str):
         logger.exception(f"Error deleting file: {file_id}", exc_info=e)
         raise HTTPException(status_code=500, detail=str(e)) from e
 
+def _llm_busy(e: SchedulerSaturated) -> HTTPException:
+    logger.warning("Rejected chat request: LLM queue is full.")
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="The assistant is busy, please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
 @app.post("/chat", dependencies=[Depends(get_api_key)])
 async def chat(request: ChatRequest) -> StreamingResponse:
     logger.info("Received request for streaming chat.")
     try:
         history_tuples = [(msg.role, msg.content) for msg in request.history]
         return StreamingResponse(
-            handle_streaming_chat(request.question, history_tuples),
+            await handle_streaming_chat(request.question, history_tuples),
             media_type="text/plain",
             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
+    except SchedulerSaturated as e:
+        raise _llm_busy(e) from e
     except Exception as e:
         logger.exception("Error during streaming chat.", exc_info=e)
         raise HTTPException(status_code=500, detail=str(e)) from e
@@ -121,12 +286,42 @@ async def chat_blocking(request: ChatRequest) -> dict[str, str]:
     logger.info("Received request for blocking chat.")
     try:
         history_tuples = [(msg.role, msg.content) for msg in request.history]
-        answer = handle_blocking_chat(request.question, history_tuples)
+        answer = await handle_blocking_chat(request.question, history_tuples)
         return {"answer": answer}
+    except SchedulerSaturated as e:
+        raise _llm_busy(e) from e
     except Exception as e:
         logger.exception("Error during blocking chat.", exc_info=e)
         raise HTTPException(status_code=500, detail=str(e)) from e
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    # Unauthenticated so Prometheus can scrape it; it exposes timings only.
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz() -> dict[str, str]:
+    # Liveness only: the process is up and serving requests.
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz() -> JSONResponse:
+    """
+    Readiness: Qdrant and Ollama answer and, when warm-up is enabled, both
+    models are loaded. Returns 503 with the failing checks otherwise.
+    """
+    checks = {
+        "qdrant": await run_in_threadpool(vector_store_ready),
+        **await run_in_threadpool(ollama_status),
+    }
+    required = [name for name in checks if name != "models_warm" or OLLAMA_WARMUP]
+    ready = all(checks[name] for name in required)
+    return JSONResponse(
+        {"status": "ready" if ready else "not ready", "checks": checks},
+        status_code=200 if ready else 503,
+    )
+
 if __name__ == "__main__":
     logger.info("Starting HR Policy RAG backend server.")
     import uvicorn
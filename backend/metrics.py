@@ -0,0 +1,147 @@
+"""
+Process-wide Prometheus metrics, exposed in text format by GET /metrics.
+
+Every metric lives in the default prometheus_client registry, so observing a
+value is a lock-protected increment and the cost per request stays in the
+microseconds. Stage labels are fixed strings, never user input.
+"""
+
+import time
+from typing import Any
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# LLM-bound stages take seconds; vector search and SQLite take milliseconds.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)  # fmt: skip
+TOKENS_PER_SECOND_BUCKETS = (1, 2.5, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+
+RAG_STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Time spent in each stage of a chat request: rewrite (query rewriting LLM "
+    "call), retrieval, ttft (request start to first answer token) and "
+    "generation (first to last answer token).",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+RAG_REQUEST_SECONDS = Histogram(
+    "rag_request_seconds",
+    "End-to-end time of answering a chat request, by how it ended "
+    "(ok, error, or cancelled by the client).",
+    ["mode", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+RAG_TOKENS_PER_SECOND = Histogram(
+    "rag_generation_tokens_per_second",
+    "Streamed answer chunks (one token each with Ollama) per second of generation.",
+    buckets=TOKENS_PER_SECOND_BUCKETS,
+)
+INGEST_STAGE_SECONDS = Histogram(
+    "ingest_stage_seconds",
+    "Time per unit of ingestion work: parse (one file), propositions (one "
+    "slice), titles (one section), embed and upsert (one batch).",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+INGEST_JOBS_IN_PROGRESS = Gauge(
+    "ingest_jobs_in_progress", "Ingestion jobs currently running."
+)
+LLM_CACHE_HITS = Counter(
+    "ingest_llm_cache_hits_total",
+    "Chunker LLM calls served from the result cache.",
+    ["stage"],
+)
+EMBEDDING_CACHE_REQUESTS = Counter(
+    "embedding_cache_requests_total",
+    "Texts looked up in the embedding cache, by tier (query or document) and "
+    "result (hit or miss).",
+    ["tier", "result"],
+)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_queue_wait_seconds",
+    "Time an LLM call waited for a scheduler slot, per priority class.",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth", "LLM calls waiting for a scheduler slot.", ["priority"]
+)
+LLM_SLOTS_IN_USE = Gauge(
+    "llm_slots_in_use", "LLM calls currently holding a scheduler slot.", ["priority"]
+)
+LLM_REJECTED = Counter(
+    "llm_rejected_total",
+    "LLM calls rejected because their class's queue was full.",
+    ["priority"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests being handled, including responses still streaming.",
+    ["method", "route"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Returns the exposition body and its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def _route_template(scope: Scope) -> str:
+    """The matched route's path template, so ids do not become label values."""
+    for route in getattr(scope.get("app"), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return str(getattr(route, "path", "unmatched"))
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Tracks in-flight requests and their duration per route. Written as plain
+    ASGI so a streaming response counts as in flight until its last chunk.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = _route_template(scope)
+        status: dict[str, Any] = {"code": 500}
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status["code"])).observe(
+                time.perf_counter() - start
+            )
@@ -0,0 +1,314 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from collections.abc import Iterable
+from typing import Any
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process brute-force vector store for single-node installs and tests.
+
+    Vectors are L2-normalized float32 rows appended to a memory-mapped file, so
+    cosine similarity is one matrix-vector product over the mapped rows. Point
+    ids, chunk text and metadata live in a SQLite table next to it, keyed by the
+    row number. Deleting or replacing a point only drops its SQLite row; the
+    vector file is compacted once more than half of its rows are dead. Only a
+    compaction renumbers rows, and it starts a new generation of the file.
+    """
+
+    def __init__(self, path: str, embedding: Embeddings):
+        self.path = path
+        self.embedding = embedding
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(path, "points.db"), check_same_thread=False
+        )
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS points (
+            row INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            page_content TEXT NOT NULL,
+            metadata TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_points_file_id
+            ON points (json_extract(metadata, '$.file_id'));
+        CREATE TABLE IF NOT EXISTS store_info (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            dim INTEGER NOT NULL,
+            generation INTEGER NOT NULL
+        );
+        """)
+        self._conn.commit()
+        self._dim: int | None = None
+        self._generation = 0
+        row = self._conn.execute(
+            "SELECT dim, generation FROM store_info WHERE id = 1"
+        ).fetchone()
+        if row:
+            self._dim, self._generation = row
+        self._vectors = np.empty((0, self._dim or 0), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def _vectors_file(self, generation: int) -> str:
+        return os.path.join(self.path, f"vectors.{generation}.f32")
+
+    def _map(self, rows: int) -> np.ndarray:
+        """Maps the first 'rows' rows of the current vector file."""
+        if not rows:
+            return np.empty((0, self._dim), dtype=np.float32)
+        return np.memmap(
+            self._vectors_file(self._generation),
+            dtype=np.float32,
+            mode="r",
+            shape=(rows, self._dim),
+        )
+
+    def _load(self) -> None:
+        """Maps the vector file and marks the rows that still have a point."""
+        if self._dim is None:
+            return
+        path = self._vectors_file(self._generation)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        rows = size // (4 * self._dim)
+        self._vectors = self._map(rows)
+        self._alive = np.zeros(rows, dtype=bool)
+        live_rows = [r for (r,) in self._conn.execute("SELECT row FROM points")]
+        # Rows appended to the file without a committed point are dead.
+        self._alive[[r for r in live_rows if r < rows]] = True
+
+    def _set_alive(self, alive: np.ndarray) -> None:
+        # Searches keep using the arrays they took, so they are replaced rather
+        # than changed in place.
+        self._vectors = self._map(len(alive))
+        self._alive = alive
+        if len(alive) - alive.sum() > len(alive) / 2:
+            self._compact()
+
+    def count(self) -> int:
+        """Number of stored points."""
+        with self._lock:
+            return int(self._alive.sum())
+
+    def upsert(
+        self,
+        ids: list[str],
+        vectors: list[list[float]],
+        texts: list[str],
+        metadatas: list[dict[str, Any]],
+    ) -> None:
+        """Adds points, replacing any existing point with the same id."""
+        if not ids:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        with self._lock:
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                self._conn.execute(
+                    "INSERT INTO store_info (id, dim, generation) VALUES (1, ?, ?)",
+                    (self._dim, self._generation),
+                )
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Vector size {matrix.shape[1]} does not match the store's "
+                    f"{self._dim}"
+                )
+            replaced = self._rows_of(ids)
+            first_row = len(self._alive)
+            with open(self._vectors_file(self._generation), "ab") as f:
+                f.write(matrix.tobytes())
+            # INSERT OR REPLACE drops the previous row of a re-used id.
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO points (row, id, page_content, metadata) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (first_row + i, point_id, text, json.dumps(metadata))
+                    for i, (point_id, text, metadata) in enumerate(
+                        zip(ids, texts, metadatas, strict=True)
+                    )
+                ],
+            )
+            self._conn.commit()
+            alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            alive[replaced] = False
+            # Of an id repeated within the batch, only the last row is kept.
+            last = {point_id: i for i, point_id in enumerate(ids)}
+            alive[[first_row + i for i, p in enumerate(ids) if last[p] != i]] = False
+            self._set_alive(alive)
+
+    def _rows_of(self, ids: list[str]) -> list[int]:
+        placeholders = ", ".join("?" for _ in ids)
+        return [
+            r
+            for (r,) in self._conn.execute(
+                f"SELECT row FROM points WHERE id IN ({placeholders})", ids
+            )
+        ]
+
+    def _delete_where(self, condition: str, params: list[Any]) -> int:
+        with self._lock:
+            rows = [
+                r
+                for (r,) in self._conn.execute(
+                    f"DELETE FROM points WHERE {condition} RETURNING row", params
+                ).fetchall()
+            ]
+            self._conn.commit()
+            alive = self._alive.copy()
+            alive[[r for r in rows if r < len(alive)]] = False
+            self._set_alive(alive)
+            return len(rows)
+
+    def delete_by_metadata(self, key: str, value: Any) -> int:
+        """Deletes every point whose metadata[key] equals value."""
+        if not key.isidentifier():
+            raise ValueError(f"Invalid metadata key: {key!r}")
+        # The JSON path is written out, not bound, so that SQLite can use the
+        # index on json_extract(metadata, '$.file_id').
+        return self._delete_where(f"json_extract(metadata, '$.{key}') = ?", [value])
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> bool | None:
+        if not ids:
+            return False
+        placeholders = ", ".join("?" for _ in ids)
+        self._delete_where(f"id IN ({placeholders})", list(ids))
+        return True
+
+    def _compact(self) -> None:
+        """
+        Rewrites the live rows into the next generation's file. The SQLite
+        renumbering and the generation switch commit together, so a crash leaves
+        either the old or the new layout.
+        """
+        live_rows = [
+            r for (r,) in self._conn.execute("SELECT row FROM points ORDER BY row")
+        ]
+        generation = self._generation + 1
+        with open(self._vectors_file(generation), "wb") as f:
+            f.write(np.ascontiguousarray(self._vectors[live_rows]).tobytes())
+        # Ascending order never moves a row onto a slot that is still in use.
+        self._conn.executemany(
+            "UPDATE points SET row = ? WHERE row = ?",
+            [(new, old) for new, old in enumerate(live_rows) if new != old],
+        )
+        self._conn.execute(
+            "UPDATE store_info SET generation = ? WHERE id = 1", (generation,)
+        )
+        self._conn.commit()
+        old_file = self._vectors_file(self._generation)
+        self._generation = generation
+        self._load()
+        os.remove(old_file)
+
+    def drop(self) -> None:
+        """Deletes all points and the store's files."""
+        with self._lock:
+            self._conn.close()
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    @staticmethod
+    def _top(
+        vectors: np.ndarray, alive: np.ndarray, query: np.ndarray, k: int
+    ) -> list[tuple[int, float]]:
+        """The k live rows most similar to query, best first, with their scores."""
+        live = int(alive.sum())
+        if not live:
+            return []
+        scores = np.where(alive, vectors @ query, -np.inf)
+        k = min(k, live)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(r), float(scores[r])) for r in top]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        """Top-k points by cosine similarity. Qdrant-specific kwargs are ignored."""
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        # Scoring runs outside the lock, on the arrays of one generation.
+        with self._lock:
+            generation, vectors, alive = self._generation, self._vectors, self._alive
+        top = self._top(vectors, alive, query, k)
+        if not top:
+            return []
+
+        with self._lock:
+            if self._generation != generation:
+                # A compaction renumbered the rows meanwhile; score them again.
+                top = self._top(self._vectors, self._alive, query, k)
+            rows = [row for row, _ in top]
+            placeholders = ", ".join("?" for _ in rows)
+            found = {
+                row: (content, metadata)
+                for row, content, metadata in self._conn.execute(
+                    "SELECT row, page_content, metadata FROM points "
+                    f"WHERE row IN ({placeholders})",
+                    rows,
+                )
+            }
+        return [
+            (
+                Document(
+                    page_content=found[row][0], metadata=json.loads(found[row][1])
+                ),
+                score,
+            )
+            for row, score in top
+            if row in found
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k=k, **kwargs
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: list[dict] | None = None,
+        ids: list[str] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        self.upsert(ids, self.embedding.embed_documents(texts), texts, metadatas)
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        *,
+        path: str = os.path.join("data", "vectors"),
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
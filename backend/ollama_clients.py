@@ -0,0 +1,217 @@
+"""
+Shared Ollama clients for chat and embeddings.
+
+All model objects use one ollama.Client and one ollama.AsyncClient, so their
+requests reuse a single pool of keep-alive HTTP connections. Every request
+carries OLLAMA_KEEP_ALIVE, and chat requests carry OLLAMA_NUM_CTX. The same
+values are used for warm-up, because Ollama reloads a model whose num_ctx
+changes. warm_up_models() loads both models, and keep_models_warm() repeats it
+in the background, so an idle server does not unload them. Warm-up and the
+readiness probe use their own clients with bounded timeouts, so a wedged Ollama
+cannot hang them.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+import httpx
+from dotenv import load_dotenv
+from langchain_ollama import OllamaEmbeddings
+from ollama import AsyncClient, Client
+
+from llm_scheduler import Priority, ScheduledChatOllama
+
+load_dotenv()
+logger = logging.getLogger("hr_policy_rag")
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+CHAT_MODEL = os.getenv("CHAT_MODEL", "llama3")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+# How long Ollama keeps a model loaded after a request: a duration such as
+# "30m", or seconds ("-1" keeps it loaded).
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Context window of the chat model. Ollama's default is smaller than the token
+# budget of rag.py, which would silently truncate prompts.
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+# Load both models at startup, and re-ping them every OLLAMA_KEEP_WARM_SECONDS
+# (0 disables the ping).
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() == "true"
+OLLAMA_KEEP_WARM_SECONDS = float(os.getenv("OLLAMA_KEEP_WARM_SECONDS", "300"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+# Seconds to connect to Ollama, to load a model during warm-up, and to answer
+# the readiness probe. Chat and embedding reads stay unbounded, since a long
+# answer can legitimately take minutes.
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_WARMUP_TIMEOUT = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300"))
+OLLAMA_PROBE_TIMEOUT = float(os.getenv("OLLAMA_PROBE_TIMEOUT", "5"))
+
+
+def _keep_alive(value: str) -> str | int:
+    """Ollama takes a duration string or a number of seconds."""
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+KEEP_ALIVE = _keep_alive(OLLAMA_KEEP_ALIVE)
+
+_lock = threading.Lock()
+_client: Client | None = None
+_async_client: AsyncClient | None = None
+_chat_models: dict[Priority, ScheduledChatOllama] = {}
+_embeddings: "PooledOllamaEmbeddings | None" = None
+_probe_clients: dict[float, Client] = {}
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+        keepalive_expiry=60,
+    )
+
+
+def _timeout(read: float | None) -> httpx.Timeout:
+    return httpx.Timeout(read, connect=OLLAMA_CONNECT_TIMEOUT)
+
+
+def get_client() -> Client:
+    global _client
+    with _lock:
+        if _client is None:
+            _client = Client(
+                host=OLLAMA_BASE_URL, limits=_limits(), timeout=_timeout(None)
+            )
+        return _client
+
+
+def get_async_client() -> AsyncClient:
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = AsyncClient(
+                host=OLLAMA_BASE_URL, limits=_limits(), timeout=_timeout(None)
+            )
+        return _async_client
+
+
+def _probe_client(read_timeout: float) -> Client:
+    """A client whose requests give up after read_timeout seconds."""
+    with _lock:
+        client = _probe_clients.get(read_timeout)
+        if client is None:
+            client = Client(host=OLLAMA_BASE_URL, timeout=_timeout(read_timeout))
+            _probe_clients[read_timeout] = client
+        return client
+
+
+class PooledOllamaEmbeddings(OllamaEmbeddings):
+    """OllamaEmbeddings that sends keep_alive, which the base class omits."""
+
+    keep_alive: str | int | None = None
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        response = self._client.embed(self.model, texts, keep_alive=self.keep_alive)
+        return response["embeddings"]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        response = await self._async_client.embed(
+            self.model, texts, keep_alive=self.keep_alive
+        )
+        return response["embeddings"]
+
+
+def _share_clients(model: Any) -> Any:
+    # Replace the clients each model builds for itself with the shared ones. The
+    # pydantic v1 models keep them as plain instance attributes.
+    object.__setattr__(model, "_client", get_client())
+    object.__setattr__(model, "_async_client", get_async_client())
+    return model
+
+
+def get_chat_model(priority: Priority) -> ScheduledChatOllama:
+    """The chat model used by callers of 'priority', built on first use."""
+    model = _chat_models.get(priority)
+    if model is None:
+        model = _share_clients(
+            ScheduledChatOllama(
+                base_url=OLLAMA_BASE_URL,
+                model=CHAT_MODEL,
+                temperature=0,
+                keep_alive=KEEP_ALIVE,
+                num_ctx=OLLAMA_NUM_CTX or None,
+                priority=priority,
+            )
+        )
+        _chat_models[priority] = model
+    return model
+
+
+def get_embeddings() -> PooledOllamaEmbeddings:
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = _share_clients(
+            PooledOllamaEmbeddings(
+                base_url=OLLAMA_BASE_URL, model=EMBEDDING_MODEL, keep_alive=KEEP_ALIVE
+            )
+        )
+    return _embeddings
+
+
+def warm_up_models() -> dict[str, float | None]:
+    """
+    Loads the chat and embedding models into Ollama's memory. Returns the
+    seconds each took, or None for a model that could not be loaded.
+    """
+    client = _probe_client(OLLAMA_WARMUP_TIMEOUT)
+    options = {"num_ctx": OLLAMA_NUM_CTX} if OLLAMA_NUM_CTX else None
+    loaders = {
+        # An empty prompt only loads the model.
+        CHAT_MODEL: lambda: client.generate(
+            model=CHAT_MODEL, prompt="", keep_alive=KEEP_ALIVE, options=options
+        ),
+        EMBEDDING_MODEL: lambda: client.embed(
+            model=EMBEDDING_MODEL, input="warm-up", keep_alive=KEEP_ALIVE
+        ),
+    }
+    timings: dict[str, float | None] = {}
+    for model, load in loaders.items():
+        start = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            logger.warning(f"Could not warm up Ollama model '{model}': {e}")
+            timings[model] = None
+            continue
+        timings[model] = round(time.perf_counter() - start, 3)
+    logger.info(f"Ollama warm-up finished: {timings}")
+    return timings
+
+
+def _tagged(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
+
+
+def ollama_status() -> dict[str, bool]:
+    """Whether Ollama answers, and whether both models are loaded in memory."""
+    try:
+        models = _probe_client(OLLAMA_PROBE_TIMEOUT).ps().models
+        loaded = {_tagged(m.model or "") for m in models}
+    except Exception as e:
+        logger.warning(f"Ollama is not reachable: {e}")
+        return {"ollama": False, "models_warm": False}
+    warm = {_tagged(CHAT_MODEL), _tagged(EMBEDDING_MODEL)} <= loaded
+    return {"ollama": True, "models_warm": warm}
+
+
+async def keep_models_warm(interval: float = OLLAMA_KEEP_WARM_SECONDS) -> None:
+    """
+    Warms both models up right away, then re-pings them every 'interval'
+    seconds (never, if it is 0) until cancelled.
+    """
+    await asyncio.to_thread(warm_up_models)
+    while interval > 0:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(warm_up_models)
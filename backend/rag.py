@@ -1,31 +1,210 @@
+import asyncio
 import os
 import re
-from typing import Any, Generator, List
+import threading
+import time
+from collections.abc import AsyncGenerator, Generator, Iterator
+from contextlib import contextmanager
+from typing import Any
 
 from dotenv import load_dotenv
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from langchain.chains import create_history_aware_retriever
 from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.prompt_values import PromptValue
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import Runnable
-from langchain_ollama import ChatOllama
-
-from ingest import get_vector_store
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import (
+    Runnable,
+    RunnableConfig,
+    RunnableLambda,
+    RunnablePassthrough,
+)
+from langchain_core.vectorstores import VectorStore
+from qdrant_client.http import models
+
+from ingest import (
+    COLLECTION_NAME,
+    get_vector_store,
+    hybrid_enabled,
+    on_collection_invalidated,
+    search_params,
+)
+from llm_scheduler import Priority
+from metrics import RAG_REQUEST_SECONDS, RAG_STAGE_SECONDS, RAG_TOKENS_PER_SECOND
+from ollama_clients import CHAT_MODEL, get_chat_model
+from tokens import get_token_counter
 
 load_dotenv()
 
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-CHAT_MODEL = os.getenv("CHAT_MODEL", "llama3")
-
-llm = ChatOllama(base_url=OLLAMA_BASE_URL, model=CHAT_MODEL, temperature=0)
-
-
-def _estimate_tokens(text: str) -> int:
-    """A very rough approximation of token count."""
-    return len(text) // 4
-
+# Context window is ~8k tokens for llama3 (OLLAMA_NUM_CTX). Reserve ~4k for the
+# prompts and the answer; history and retrieved chunks share the rest.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+# Candidates fetched per query; the packer keeps as many as fit the budget.
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "8"))
+# Minimum cosine similarity for a chunk to be used. Only applied in dense mode,
+# since hybrid scores are rank-fusion scores.
+RETRIEVAL_SCORE_FLOOR = float(os.getenv("RETRIEVAL_SCORE_FLOOR", "0.3"))
+
+
+def __getattr__(name: str) -> Any:
+    # The chat model is built on first use, so importing this module stays
+    # fast. Tests may replace rag.llm with monkeypatch.
+    if name != "llm":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    namespace = globals()
+    if "llm" not in namespace:
+        namespace["llm"] = get_chat_model(Priority.INTERACTIVE)
+    return namespace["llm"]
+
+
+def get_llm() -> Runnable:
+    return __getattr__("llm")
+
+# Compiled chains keyed by (k, chat model, collection). Chains are stateless, so a
+# single instance per key is shared by every request in the process.
+_rag_chains: dict[tuple[int, str, str], Runnable] = {}
+_rag_chains_lock = threading.Lock()
+
+
+class ScoredRetriever(BaseRetriever):
+    """Vector store retriever that keeps the similarity score in metadata['score']."""
+
+    vector_store: VectorStore
+    k: int = RETRIEVAL_CANDIDATES
+    search_params: models.SearchParams | None = None
+
+    @staticmethod
+    def _with_scores(results: list[tuple[Document, float]]) -> list[Document]:
+        return [
+            Document(
+                page_content=doc.page_content, metadata={**doc.metadata, "score": score}
+            )
+            for doc, score in results
+        ]
 
-def sanitize_chat_history(history: List[BaseMessage]) -> List[BaseMessage]:
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        with RAG_STAGE_SECONDS.labels("retrieval").time():
+            results = self.vector_store.similarity_search_with_score(
+                query, k=self.k, search_params=self.search_params
+            )
+        return self._with_scores(results)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        with RAG_STAGE_SECONDS.labels("retrieval").time():
+            results = await self.vector_store.asimilarity_search_with_score(
+                query, k=self.k, search_params=self.search_params
+            )
+        return self._with_scores(results)
+
+
+class _StreamTimer:
+    """Records time-to-first-token, generation time and tokens/s of one answer."""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.first_token: float | None = None
+        self.tokens = 0
+
+    def token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            RAG_STAGE_SECONDS.labels("ttft").observe(self.first_token - self.start)
+        self.tokens += 1
+
+    def finish(self) -> None:
+        end = time.perf_counter()
+        if self.first_token is None:
+            return
+        generation = end - self.first_token
+        RAG_STAGE_SECONDS.labels("generation").observe(generation)
+        if generation > 0:
+            RAG_TOKENS_PER_SECOND.observe(self.tokens / generation)
+
+
+@contextmanager
+def _timed_request(mode: str) -> Iterator[None]:
+    """Records the duration of a chat request, labelled with how it ended."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        # The client went away before the answer was complete.
+        outcome = "cancelled"
+        raise
+    finally:
+        RAG_REQUEST_SECONDS.labels(mode, outcome).observe(time.perf_counter() - start)
+
+
+def _timed_rewrite_llm() -> Runnable:
+    """The chat model wrapped so the query rewriting call is timed."""
+
+    def rewrite(prompt: PromptValue, config: RunnableConfig) -> BaseMessage:
+        with RAG_STAGE_SECONDS.labels("rewrite").time():
+            return get_llm().invoke(prompt, config)
+
+    async def arewrite(prompt: PromptValue, config: RunnableConfig) -> BaseMessage:
+        with RAG_STAGE_SECONDS.labels("rewrite").time():
+            return await get_llm().ainvoke(prompt, config)
+
+    return RunnableLambda(rewrite, afunc=arewrite, name="rewrite_query")
+
+
+def pack_context(
+    docs: list[Document], budget: int, score_floor: float | None = None
+) -> list[Document]:
+    """
+    Keeps the highest-scoring chunks that fit in 'budget' tokens, skipping chunks
+    below 'score_floor'. A chunk that does not fit is skipped so a smaller,
+    lower-ranked one can still use the remaining budget.
+    """
+    count_tokens = get_token_counter()
+    ranked = sorted(docs, key=lambda doc: doc.metadata.get("score", 0.0), reverse=True)
+    packed = []
+    remaining = budget
+    for doc in ranked:
+        if score_floor is not None and doc.metadata.get("score", 0.0) < score_floor:
+            continue
+        tokens = count_tokens(doc.page_content)
+        if tokens <= remaining:
+            packed.append(doc)
+            remaining -= tokens
+    return packed
+
+
+def trim_history(
+    history: list[BaseMessage], budget: int
+) -> tuple[list[BaseMessage], int]:
+    """
+    Keeps the most recent messages that fit in 'budget' tokens.
+    Returns the trimmed history and its token count.
+    """
+    count_tokens = get_token_counter()
+    kept: list[BaseMessage] = []
+    used = 0
+    for message in reversed(history):
+        tokens = count_tokens(str(message.content))
+        if used + tokens > budget:
+            break
+        kept.append(message)
+        used += tokens
+    kept.reverse()
+    return kept, used
+
+
+def sanitize_chat_history(history: list[BaseMessage]) -> list[BaseMessage]:
     """
     Sanitizes chat history to remove potential prompt injection instructions.
     """
@@ -55,10 +234,52 @@ def sanitize_chat_history(history: List[BaseMessage]) -> List[BaseMessage]:
     return sanitized_history
 
 
-def get_rag_chain(k_value: int = 4) -> Runnable:
-    """Creates the RAG chain with a configurable 'k' for the retriever."""
+def get_rag_chain(k_value: int = RETRIEVAL_CANDIDATES) -> Runnable:
+    """Returns the cached RAG chain for 'k', building it on first use."""
+    key = (k_value, CHAT_MODEL, COLLECTION_NAME)
+    chain = _rag_chains.get(key)
+    if chain is None:
+        with _rag_chains_lock:
+            chain = _rag_chains.get(key)
+            if chain is None:
+                chain = _build_rag_chain(k_value)
+                _rag_chains[key] = chain
+    return chain
+
+
+async def aget_rag_chain(k_value: int = RETRIEVAL_CANDIDATES) -> Runnable:
+    """
+    get_rag_chain() for async callers. Building a chain first makes sure the
+    collection exists, which calls Qdrant and possibly the embedding model, so
+    an uncached chain is built in a worker thread instead of on the event loop.
+    """
+    chain = _rag_chains.get((k_value, CHAT_MODEL, COLLECTION_NAME))
+    if chain is not None:
+        return chain
+    return await asyncio.to_thread(get_rag_chain, k_value)
+
+
+def clear_rag_chain_cache() -> None:
+    """Drops all cached chains so the next request rebuilds them."""
+    with _rag_chains_lock:
+        _rag_chains.clear()
+
+
+# Cached chains hold the vector store, which is replaced when the collection
+# is dropped or recreated.
+on_collection_invalidated(clear_rag_chain_cache)
+
+
+def _build_rag_chain(k_value: int) -> Runnable:
+    """
+    Creates the RAG chain with a configurable 'k' for the retriever. Retrieved
+    chunks are packed into the per-request 'context_budget' before answering.
+    """
     vector_store = get_vector_store()
-    retriever = vector_store.as_retriever(search_kwargs={"k": k_value})
+    retriever = ScoredRetriever(
+        vector_store=vector_store, k=k_value, search_params=search_params()
+    )
+    score_floor = None if hybrid_enabled() else RETRIEVAL_SCORE_FLOOR
 
     # 1. Contextualize and Enrich question based on history
     contextualize_q_system_prompt = """You are an HR Search Query Optimizer. Given a chat history and the latest user question, \
@@ -78,7 +299,7 @@ def get_rag_chain(k_value: int = 4) -> Runnable:
     )
 
     history_aware_retriever = create_history_aware_retriever(
-        llm, retriever, contextualize_q_prompt
+        _timed_rewrite_llm(), retriever, contextualize_q_prompt
     )
 
     # 2. Answer question
@@ -107,15 +328,26 @@ def get_rag_chain(k_value: int = 4) -> Runnable:
         ]
     )
 
-    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+    question_answer_chain = create_stuff_documents_chain(get_llm(), qa_prompt)
 
-    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+    def pack(inputs: dict[str, Any]) -> list[Document]:
+        budget = inputs.get("context_budget", CONTEXT_TOKEN_BUDGET)
+        return pack_context(inputs["context"], budget, score_floor)
+
+    rag_chain = (
+        RunnablePassthrough.assign(
+            context=history_aware_retriever.with_config(run_name="retrieve_documents")
+        )
+        .assign(context=RunnableLambda(pack).with_config(run_name="pack_context"))
+        .assign(answer=question_answer_chain)
+    ).with_config(run_name="retrieval_chain")
     return rag_chain
 
 
-def _prepare_chat_inputs(history: list[tuple[str, str]]):
+def _prepare_chat_inputs(history: list[tuple[str, str]]) -> dict[str, Any]:
     """
-    Sanitizes history, estimates token count, and determines 'k' for retrieval.
+    Sanitizes and trims history, and computes the token budget left for context.
+    Returns the chain inputs other than the question.
     """
     chat_history: list[BaseMessage] = []
     for role, content in history:
@@ -125,24 +357,34 @@ def _prepare_chat_inputs(history: list[tuple[str, str]]):
             chat_history.append(AIMessage(content=content))
 
     sanitized_history = sanitize_chat_history(chat_history)
-    history_text = " ".join(
-        [str(msg.content) for msg in sanitized_history]
+    trimmed_history, history_tokens = trim_history(
+        sanitized_history, min(HISTORY_TOKEN_BUDGET, CONTEXT_TOKEN_BUDGET)
     )
-    history_tokens = _estimate_tokens(history_text)
-
-    # Agentic chunks are ~1800 chars (~450 tokens). Context window is ~8k.
-    # Reserve ~4k for answer/prompt, leaving ~4k for history+docs.
-    k = 2 if history_tokens > 2000 else 4
-    return sanitized_history, k
+    return {
+        "chat_history": trimmed_history,
+        "context_budget": CONTEXT_TOKEN_BUDGET - history_tokens,
+    }
 
 
 def chat_with_doc(question: str, history: list[tuple[str, str]]) -> str:
     """
-    Handles a blocking chat request with dynamic 'k' adjustment.
+    Handles a blocking chat request with token-budgeted context.
     """
-    sanitized_history, k = _prepare_chat_inputs(history)
-    chain = get_rag_chain(k_value=k)
-    response = chain.invoke({"input": question, "chat_history": sanitized_history})
+    chain = get_rag_chain()
+    with _timed_request("blocking"):
+        response = chain.invoke({"input": question, **_prepare_chat_inputs(history)})
+    return str(response.get("answer", "I could not find an answer."))
+
+
+async def achat_with_doc(question: str, history: list[tuple[str, str]]) -> str:
+    """
+    Async counterpart of chat_with_doc, built on the chain's ainvoke.
+    """
+    chain = await aget_rag_chain()
+    with _timed_request("blocking"):
+        response = await chain.ainvoke(
+            {"input": question, **_prepare_chat_inputs(history)}
+        )
     return str(response.get("answer", "I could not find an answer."))
 
 
@@ -150,10 +392,37 @@ def stream_chat_with_doc(
     question: str, history: list[tuple[str, str]]
 ) -> Generator[str, None, None]:
     """
-    Handles a streaming chat request with dynamic 'k' adjustment.
+    Handles a streaming chat request with token-budgeted context.
+    """
+    chain = get_rag_chain()
+    timer = _StreamTimer()
+    inputs = {"input": question, **_prepare_chat_inputs(history)}
+    with _timed_request("stream"):
+        try:
+            for chunk in chain.stream(inputs):
+                if "answer" in chunk:
+                    timer.token()
+                    yield str(chunk["answer"])
+        finally:
+            timer.finish()
+
+
+async def astream_chat_with_doc(
+    question: str, history: list[tuple[str, str]]
+) -> AsyncGenerator[str, None]:
+    """
+    Async counterpart of stream_chat_with_doc. Tokens come from the async Ollama
+    client and retrieval runs through the vector store's async API, so the
+    event loop stays free while the answer is generated.
     """
-    sanitized_history, k = _prepare_chat_inputs(history)
-    chain = get_rag_chain(k_value=k)
-    for chunk in chain.stream({"input": question, "chat_history": sanitized_history}):
-        if "answer" in chunk:
-            yield str(chunk["answer"])
+    chain = await aget_rag_chain()
+    timer = _StreamTimer()
+    inputs = {"input": question, **_prepare_chat_inputs(history)}
+    with _timed_request("stream"):
+        try:
+            async for chunk in chain.astream(inputs):
+                if "answer" in chunk:
+                    timer.token()
+                    yield str(chunk["answer"])
+        finally:
+            timer.finish()
@@ -0,0 +1,327 @@
+"""
+Load-tests /chat (streaming) and /chat/blocking with concurrent requests.
+
+The question set of run_retrieval_test.py is replayed, either closed-loop
+(--concurrency requests always in flight) or open-loop (Poisson arrivals at
+--rate requests/s, at most --concurrency in flight). In open-loop mode latency
+is measured from each request's scheduled arrival, so time spent waiting for a
+free slot counts against the server. The streaming endpoint also reports
+time-to-first-token and the gap between received chunks (inter-token latency).
+The report is JSON, and --compare prints the change against an earlier report.
+
+With --offline the benchmark starts its own backend on a temporary data
+directory. The backend talks to the stand-in Ollama server of fake_ollama.py
+and uses the embedded Qdrant (VECTOR_BACKEND=qdrant-local), and a synthetic
+handbook is uploaded first, so no model or Qdrant server is needed.
+
+Run from backend/:  python scripts/benchmark_chat.py --offline --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_ollama  # noqa: E402
+from run_retrieval_test import QUESTIONS  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = {"stream": "/chat", "blocking": "/chat/blocking"}
+DEFAULT_API_KEY = "default-secret-key"
+
+
+def percentiles(values: list[float]) -> dict[str, float] | None:
+    """p50/p95/p99 and mean in milliseconds, or None without samples."""
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 2),
+        "p95": round(float(np.percentile(ms, 95)), 2),
+        "p99": round(float(np.percentile(ms, 99)), 2),
+        "mean": round(float(ms.mean()), 2),
+    }
+
+
+async def send_streaming(
+    client: httpx.AsyncClient, payload: dict, start: float
+) -> dict[str, Any]:
+    result: dict[str, Any] = {"ok": False, "chunks": 0, "ttft": None, "itl": []}
+    async with client.stream("POST", ENDPOINTS["stream"], json=payload) as response:
+        result["status"] = response.status_code
+        last = None
+        async for chunk in response.aiter_text():
+            if not chunk:
+                continue
+            now = time.perf_counter()
+            if last is None:
+                result["ttft"] = now - start
+            else:
+                result["itl"].append(now - last)
+            last = now
+            result["chunks"] += 1
+    result["ok"] = result["status"] == 200
+    return result
+
+
+async def send_blocking(
+    client: httpx.AsyncClient, payload: dict, start: float
+) -> dict[str, Any]:
+    response = await client.post(ENDPOINTS["blocking"], json=payload)
+    return {"ok": response.status_code == 200, "status": response.status_code}
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    mode: str,
+    questions: list[str],
+    requests: int,
+    concurrency: int,
+    rate: float = 0.0,
+    seed: int = 7,
+) -> dict[str, Any]:
+    """Sends 'requests' questions to one endpoint and summarizes the results."""
+    send = send_streaming if mode == "stream" else send_blocking
+    slots = asyncio.Semaphore(concurrency)
+    rng = random.Random(seed)
+    results: list[dict[str, Any]] = []
+    began = time.perf_counter()
+
+    async def one(i: int, arrival: float) -> None:
+        if rate > 0:
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        async with slots:
+            start = arrival if rate > 0 else time.perf_counter()
+            payload = {"question": questions[i % len(questions)], "history": []}
+            try:
+                result = await send(client, payload, start)
+            except httpx.HTTPError as e:
+                result = {"ok": False, "error": str(e)}
+            result["latency"] = time.perf_counter() - start
+            results.append(result)
+
+    arrival = began
+    tasks = []
+    for i in range(requests):
+        if rate > 0:
+            arrival += rng.expovariate(rate)
+        tasks.append(one(i, arrival))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - began
+
+    ok = [r for r in results if r["ok"]]
+    summary = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": percentiles([r["latency"] for r in ok]),
+    }
+    if mode == "stream":
+        chunks = sum(r["chunks"] for r in ok)
+        summary.update(
+            ttft_ms=percentiles([r["ttft"] for r in ok if r["ttft"] is not None]),
+            itl_ms=percentiles([gap for r in ok for gap in r["itl"]]),
+            chunks_per_s=round(chunks / elapsed, 2) if elapsed else 0.0,
+        )
+    return summary
+
+
+def synthetic_handbook() -> str:
+    """One policy statement per benchmark question, so retrieval finds matches."""
+    lines = ["# Employee Handbook\n\nThis handbook is effective from 1 January."]
+    for i, question in enumerate(QUESTIONS, start=1):
+        topic = question.rstrip("?")
+        lines.append(f"## Section {i}\n\nPolicy {i} answers: {topic}. See clause {i}.")
+    return "\n\n".join(lines)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(base_url: str, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/metrics", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Backend did not start at {base_url}")
+
+
+def _seed(base_url: str, api_key: str, timeout: float = 300.0) -> None:
+    headers = {"X-API-Key": api_key}
+    response = httpx.post(
+        f"{base_url}/upload",
+        headers=headers,
+        files={"file": ("handbook.txt", synthetic_handbook().encode(), "text/plain")},
+        timeout=30,
+    )
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = httpx.get(f"{base_url}/jobs/{job_id}", headers=headers).json()
+        if job["status"] == "completed":
+            return
+        if job["status"] == "failed":
+            raise RuntimeError(f"Seeding the handbook failed: {job['error']}")
+        time.sleep(0.5)
+    raise RuntimeError("Seeding the handbook timed out")
+
+
+@contextmanager
+def offline_backend(args: argparse.Namespace) -> Iterator[str]:
+    """Starts the stand-in Ollama and a seeded backend; yields the backend URL."""
+    fake = fake_ollama.FakeOllamaServer(fake_ollama.from_arguments(args)).start()
+    port = _free_port()
+    with tempfile.TemporaryDirectory(prefix="chat-bench-") as workdir:
+        env = {
+            **os.environ,
+            "PYTHONPATH": BACKEND_DIR,
+            "OLLAMA_BASE_URL": fake.url,
+            "VECTOR_BACKEND": "qdrant-local",
+            "QDRANT_PATH": os.path.join(workdir, "qdrant"),
+            "SECRET_KEY": args.api_key,
+            "ANSWER_CACHE_ENABLED": "false",
+        }
+        # The backend keeps its SQLite and uploads under the working directory.
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+            cwd=workdir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            _wait_until_up(base_url)
+            print("Seeding the synthetic handbook...")
+            _seed(base_url, args.api_key)
+            yield base_url
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            fake.stop()
+
+
+async def run_benchmark(base_url: str, args: argparse.Namespace) -> dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={"X-API-Key": args.api_key},
+        limits=limits,
+        timeout=args.timeout,
+    ) as client:
+        for mode in args.endpoints.split(","):
+            print(f"Benchmarking {ENDPOINTS[mode]}...")
+            results[mode] = await run_load(
+                client,
+                mode,
+                QUESTIONS,
+                args.requests,
+                args.concurrency,
+                args.rate,
+                args.seed,
+            )
+    return results
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any]) -> None:
+    """Prints the relative change of every percentile against the baseline."""
+    print(f"\n{'metric':<28}{'baseline':>11}{'current':>11}{'change':>9}")
+    for mode, summary in report["results"].items():
+        before = baseline.get("results", {}).get(mode)
+        if not before:
+            continue
+        for metric in ("latency_ms", "ttft_ms", "itl_ms"):
+            for stat in ("p50", "p95", "p99"):
+                old = (before.get(metric) or {}).get(stat)
+                new = (summary.get(metric) or {}).get(stat)
+                if old is None or new is None:
+                    continue
+                change = f"{(new - old) / old:+.0%}" if old else "n/a"
+                name = f"{mode}.{metric}.{stat}"
+                print(f"{name:<28}{old:>11.1f}{new:>11.1f}{change:>9}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--api-key", default=DEFAULT_API_KEY)
+    parser.add_argument("--endpoints", default="stream,blocking")
+    parser.add_argument("--requests", type=int, default=len(QUESTIONS))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="arrivals per second (0 = closed loop)"
+    )
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="start a seeded backend against the stand-in Ollama and embedded Qdrant",
+    )
+    fake_ollama.add_arguments(parser)
+    parser.add_argument("--compare", help="earlier report to compare against")
+    parser.add_argument("--output", default="chat_benchmark.json")
+    args = parser.parse_args()
+
+    config = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("api_key", "compare", "output")
+    }
+    if args.offline:
+        with offline_backend(args) as base_url:
+            results = asyncio.run(run_benchmark(base_url, args))
+    else:
+        results = asyncio.run(run_benchmark(args.base_url, args))
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "config": config,
+        "results": results,
+    }
+
+    for mode, summary in results.items():
+        latency = summary["latency_ms"] or {}
+        print(
+            f"{mode:<9}{summary['requests']} requests, {summary['errors']} errors, "
+            f"{summary['throughput_rps']:.2f} req/s, p50 {latency.get('p50')} ms, "
+            f"p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms"
+        )
+        if summary.get("ttft_ms"):
+            print(f"{'':<9}TTFT p50 {summary['ttft_ms']['p50']} ms")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Measures ingestion throughput on synthetic corpora of increasing size, offline.
+
+Every corpus runs the full process_and_index_file pipeline (MarkItDown parse,
+proposition extraction, titling, embedding, upsert) in a fresh process, against
+the stand-in Ollama server of fake_ollama.py and the in-process NumPy vector
+store, so the numbers only move when the pipeline changes. The LLM latency and
+token rate of the stand-in are configurable, and so is the chunking strategy
+(the synthetic documents have headings, so "structure" makes no LLM calls). Per
+corpus the report has LLM calls per document, chunks/s, the peak RSS of the
+ingesting process and the wall time per stage.
+
+Run from backend/:  python scripts/benchmark_ingest.py --sizes 1,5,20
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_ollama  # noqa: E402
+
+TOPICS = ["annual", "medical", "maternity", "compassionate", "study", "unpaid"]
+SUBJECTS = ["Employees", "Managers", "Interns", "Contract staff", "Executives"]
+RULES = [
+    "{s} in grade {g} are entitled to {n} days of {t} leave per calendar year.",
+    "{s} must apply for {t} leave at least {n} working days in advance.",
+    "Unused {t} leave of up to {n} days may be carried forward by {s}.",
+    "{s} on probation may take {t} leave only after {n} months of service.",
+    "Claims for {t} leave above {n} days require approval from the head of HR.",
+]
+
+
+def synthetic_document(index: int, words: int) -> str:
+    """A Markdown policy with numbered sections, deterministic per index."""
+    rng = random.Random(index)
+    parts = [f"# Policy Handbook {index}"]
+    count = 0
+    section = 0
+    while count < words:
+        section += 1
+        sentences = [
+            rng.choice(RULES).format(
+                s=rng.choice(SUBJECTS),
+                g=rng.randint(1, 9),
+                n=rng.randint(1, 30),
+                t=rng.choice(TOPICS),
+            )
+            for _ in range(rng.randint(4, 8))
+        ]
+        parts.append(f"## Section {section}\n\n" + " ".join(sentences))
+        count += sum(len(s.split()) for s in sentences)
+    return "\n\n".join(parts)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def ingest_corpus(
+    documents: int,
+    words: int,
+    ollama_url: str,
+    llm_concurrency: int,
+    chunking: str = "agentic",
+) -> dict[str, Any]:
+    """
+    Runs in a fresh process, so the backend modules are configured by the
+    environment set here and the peak RSS belongs to this corpus alone.
+    """
+    workdir = tempfile.mkdtemp(prefix="ingest-bench-")
+    os.chdir(workdir)
+    os.environ.update(
+        OLLAMA_BASE_URL=ollama_url,
+        VECTOR_BACKEND="numpy",
+        NUMPY_STORE_PATH=os.path.join(workdir, "vectors"),
+        CHUNKER_MAX_CONCURRENCY=str(llm_concurrency),
+        CHUNKING_STRATEGY=chunking,
+        LLM_CACHE_ENABLED="false",
+        EMBEDDING_CACHE_ENABLED="false",
+    )
+    # Imported only now: ingest reads its configuration at import time.
+    from bulk_ingest import StageTimer
+
+    from ingest import process_and_index_file
+
+    paths = []
+    for i in range(documents):
+        path = os.path.join(workdir, f"policy_{i}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(synthetic_document(i, words))
+        paths.append(path)
+
+    totals: dict[str, float] = defaultdict(float)
+    lock = threading.Lock()
+    chunks = 0
+    start = time.perf_counter()
+    for path in paths:
+        timer = StageTimer(totals, lock)
+        process_and_index_file(path, os.path.basename(path), progress=timer)
+        chunks += timer.chunks
+    elapsed = time.perf_counter() - start
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "chunks": chunks,
+        "peak_rss_mb": peak_rss_mb(),
+        "stage_seconds": {stage: round(s, 3) for stage, s in totals.items()},
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> list[dict[str, Any]]:
+    fake = fake_ollama.from_arguments(args)
+    server = fake_ollama.FakeOllamaServer(fake).start()
+    context = multiprocessing.get_context("spawn")
+    report = []
+    try:
+        for documents in [int(size) for size in args.sizes.split(",")]:
+            print(f"Ingesting {documents} document(s) of ~{args.doc_words} words...")
+            before = dict(fake.calls)
+            with context.Pool(1) as pool:
+                result = pool.apply(
+                    ingest_corpus,
+                    (
+                        documents,
+                        args.doc_words,
+                        server.url,
+                        args.llm_concurrency,
+                        args.chunking,
+                    ),
+                )
+            calls = {
+                kind: fake.calls[kind] - before.get(kind, 0)
+                for kind in ("propositions", "title", "embed")
+            }
+            llm_calls = calls["propositions"] + calls["title"]
+            elapsed = result["elapsed_s"]
+            report.append(
+                {
+                    "documents": documents,
+                    "words_per_document": args.doc_words,
+                    **result,
+                    "docs_per_min": round(documents / elapsed * 60, 2),
+                    "chunks_per_s": round(result["chunks"] / elapsed, 3),
+                    "llm_calls": llm_calls,
+                    "llm_calls_per_doc": round(llm_calls / documents, 2),
+                    "calls": calls,
+                }
+            )
+    finally:
+        server.stop()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", default="1,5,20", help="documents per corpus, comma-separated"
+    )
+    parser.add_argument("--doc-words", type=int, default=1500)
+    parser.add_argument(
+        "--llm-concurrency", type=int, default=4, help="chunker LLM calls in flight"
+    )
+    parser.add_argument(
+        "--chunking", choices=["agentic", "structure"], default="agentic"
+    )
+    fake_ollama.add_arguments(parser)
+    parser.add_argument("--output", default="ingest_benchmark.json")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print(
+        f"\n{'docs':>5}{'chunks':>8}{'LLM/doc':>9}{'chunks/s':>10}"
+        f"{'RSS MB':>8}  stage seconds"
+    )
+    for row in report:
+        stages = ", ".join(f"{k} {v:.1f}" for k, v in row["stage_seconds"].items())
+        print(
+            f"{row['documents']:>5}{row['chunks']:>8}{row['llm_calls_per_doc']:>9.1f}"
+            f"{row['chunks_per_s']:>10.2f}{row['peak_rss_mb']:>8.0f}  {stages}"
+        )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "results": report}, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
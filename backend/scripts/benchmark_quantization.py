@@ -0,0 +1,249 @@
+"""
+Compares float32, scalar (int8) and binary quantized storage on a Qdrant server.
+
+For each mode a temporary collection is filled with the same vectors, using the
+collection and search settings of ingest.py. Recall@k is measured against exact
+float32 search. RAM per vector is measured as the growth of the server's
+allocated memory (memory_allocated_bytes in its /metrics) while the collection
+is built and first searched; an estimate from the stored representation plus
+the HNSW links is reported next to it. Vectors are synthetic (clustered,
+normalized) by default, or copied from the live collection with
+--from-collection.
+
+Run from backend/:  python scripts/benchmark_quantization.py --vectors 50000
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+from qdrant_client.http import models
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import (  # noqa: E402
+    COLLECTION_NAME,
+    QDRANT_HNSW_EF_CONSTRUCT,
+    QDRANT_HNSW_M,
+    QDRANT_URL,
+    client,
+    quantization_config,
+    search_params,
+)
+
+MODES = ["none", "scalar", "binary"]
+BATCH_SIZE = 256
+
+
+def synthetic_vectors(count: int, dim: int, seed: int = 7) -> np.ndarray:
+    """Normalized vectors around a few hundred centroids, like topical chunks."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(max(count // 100, 1), dim))
+    vectors = centroids[rng.integers(len(centroids), size=count)]
+    vectors = vectors + rng.normal(scale=0.6, size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def collection_vectors(limit: int) -> np.ndarray:
+    """Dense vectors of the live collection (the unnamed default vector)."""
+    vectors = []
+    offset = None
+    while len(vectors) < limit:
+        records, offset = client.scroll(
+            collection_name=COLLECTION_NAME,
+            limit=BATCH_SIZE,
+            offset=offset,
+            with_vectors=True,
+        )
+        for record in records:
+            vector = record.vector
+            vectors.append(vector[""] if isinstance(vector, dict) else vector)
+        if offset is None:
+            break
+    return np.asarray(vectors[:limit], dtype=np.float32)
+
+
+def server_memory_bytes() -> int | None:
+    """Memory the Qdrant server has allocated, or None if it does not report it."""
+    try:
+        response = httpx.get(f"{QDRANT_URL}/metrics", timeout=10)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    for line in response.text.splitlines():
+        if line.startswith("memory_allocated_bytes "):
+            return int(float(line.split()[1]))
+    return None
+
+
+def estimated_ram_bytes_per_vector(mode: str, dim: int) -> float:
+    """
+    An estimate, not a measurement: vector storage kept in RAM plus layer-0 HNSW
+    links (2 * m ids of 4 bytes).
+    """
+    links = 2 * QDRANT_HNSW_M * 4
+    if mode == "scalar":
+        return dim + 4 + links  # int8 codes and a per-vector offset
+    if mode == "binary":
+        return math.ceil(dim / 8) + links
+    return dim * 4 + links
+
+
+def build_collection(name: str, mode: str, vectors: np.ndarray) -> None:
+    quantization = quantization_config(mode)
+    if client.collection_exists(collection_name=name):
+        client.delete_collection(collection_name=name)
+    client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(
+            size=vectors.shape[1],
+            distance=models.Distance.COSINE,
+            on_disk=quantization is not None,
+        ),
+        hnsw_config=models.HnswConfigDiff(
+            m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT
+        ),
+        quantization_config=quantization,
+    )
+    for start in range(0, len(vectors), BATCH_SIZE):
+        batch = vectors[start : start + BATCH_SIZE]
+        client.upsert(
+            collection_name=name,
+            points=models.Batch(
+                ids=list(range(start, start + len(batch))), vectors=batch.tolist()
+            ),
+            wait=True,
+        )
+    # Wait for the optimizer so the HNSW index and quantized data are in place.
+    while (
+        client.get_collection(collection_name=name).status
+        != models.CollectionStatus.GREEN
+    ):
+        time.sleep(0.5)
+
+
+def search_ids(
+    name: str, queries: np.ndarray, k: int, params: models.SearchParams
+) -> tuple[list[set], list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = client.query_points(
+            collection_name=name,
+            query=query.tolist(),
+            limit=k,
+            search_params=params,
+            with_payload=False,
+        )
+        latencies.append(time.perf_counter() - start)
+        results.append({point.id for point in response.points})
+    return results, latencies
+
+
+def run_benchmark(args: argparse.Namespace) -> list[dict]:
+    if args.from_collection:
+        vectors = collection_vectors(args.vectors + args.queries)
+    else:
+        vectors = synthetic_vectors(args.vectors + args.queries, args.dim)
+    # Held-out vectors serve as queries so they are not trivially in the index.
+    corpus, queries = vectors[: -args.queries], vectors[-args.queries :]
+    print(f"Benchmarking {len(corpus)} vectors of dim {corpus.shape[1]}, k={args.k}")
+
+    names = {mode: f"{COLLECTION_NAME}_bench_{mode}" for mode in MODES}
+    measured: dict[str, float | None] = {}
+    try:
+        for mode in MODES:
+            print(f"Building {names[mode]}...")
+            before = server_memory_bytes()
+            build_collection(names[mode], mode, corpus)
+            # The first searches load the quantized vectors into memory.
+            search_ids(names[mode], queries, args.k, search_params(mode))
+            after = server_memory_bytes()
+            measured[mode] = (
+                round((after - before) / len(corpus), 1)
+                if before is not None and after is not None
+                else None
+            )
+
+        truth, _ = search_ids(
+            names["none"], queries, args.k, models.SearchParams(exact=True)
+        )
+        dim = corpus.shape[1]
+        report = []
+        for mode in MODES:
+            found, latencies = search_ids(
+                names[mode], queries, args.k, search_params(mode)
+            )
+            recall = sum(
+                len(f & t) / len(t) for f, t in zip(found, truth, strict=True)
+            ) / len(truth)
+            report.append(
+                {
+                    "mode": mode,
+                    "recall_at_k": round(recall, 4),
+                    # None when the server does not expose its memory metrics.
+                    "ram_bytes_per_vector": measured[mode],
+                    "ram_bytes_per_vector_estimate": estimated_ram_bytes_per_vector(
+                        mode, dim
+                    ),
+                    # Quantized modes keep the float32 originals on disk only.
+                    "disk_bytes_per_vector": 0 if mode == "none" else dim * 4,
+                    "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+                    "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2),
+                }
+            )
+        return report
+    finally:
+        if not args.keep:
+            for name in names.values():
+                client.delete_collection(collection_name=name)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument(
+        "--from-collection",
+        action="store_true",
+        help=f"use vectors from the '{COLLECTION_NAME}' collection",
+    )
+    parser.add_argument("--keep", action="store_true", help="keep bench collections")
+    parser.add_argument("--output", default="quantization_benchmark.json")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    # Savings use the measurements, or the estimates if any is missing.
+    key = "ram_bytes_per_vector"
+    if any(row[key] is None for row in report) or report[0][key] <= 0:
+        key = "ram_bytes_per_vector_estimate"
+        print("\nServer memory was not measured; RAM figures are estimates.")
+    baseline = report[0][key]
+    print(
+        f"\n{'mode':<8}{'recall@k':>10}{'RAM B/vec':>12}{'est. B/vec':>12}"
+        f"{'saving':>9}{'p50 ms':>9}"
+    )
+    for row in report:
+        measured = row["ram_bytes_per_vector"]
+        saving = 1 - row[key] / baseline
+        print(
+            f"{row['mode']:<8}{row['recall_at_k']:>10.4f}"
+            f"{'n/a' if measured is None else f'{measured:.0f}':>12}"
+            f"{row['ram_bytes_per_vector_estimate']:>12.0f}"
+            f"{saving:>9.0%}{row['p50_ms']:>9.2f}"
+        )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
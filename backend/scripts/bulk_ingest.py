@@ -0,0 +1,270 @@
+"""
+Bulk-ingests every supported document under a directory.
+
+Files are converted to Markdown in a process pool, then chunked and indexed by
+a few worker threads that share one LLM concurrency budget. File ids are derived
+from the content hash and point ids from the file id, so re-running after a
+failure overwrites instead of duplicating. Each finished file is appended to a
+checkpoint file, and an interrupted run resumes with the files not listed there.
+Files already indexed through the API (same content hash) are skipped.
+
+Run from backend/:  python scripts/bulk_ingest.py /path/to/handbooks --workers 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import (  # noqa: E402
+    add_file_metadata,
+    bump_corpus_version,
+    get_file_metadata,
+    get_file_metadata_by_hash,
+    initialize_db,
+)
+from ingest import (  # noqa: E402
+    CHUNKER_MAX_CONCURRENCY,
+    CHUNKING_STRATEGIES,
+    IngestProgress,
+    index_markdown,
+    parse_to_markdown,
+)
+
+DEFAULT_EXTENSIONS = ".pdf,.docx,.txt"
+DEFAULT_CHECKPOINT = os.path.join("data", "bulk_ingest.checkpoint.jsonl")
+HASH_CHUNK_SIZE = 1024 * 1024
+# Fixed namespace: the same content always maps to the same file_id.
+FILE_ID_NAMESPACE = uuid.UUID("0b7f9a52-3c1e-4d8a-b6f0-5e2d7c9a1f34")
+
+
+class Checkpoint:
+    """Append-only JSON lines log of finished files, keyed by path and hash."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done: set[tuple[str, str]] = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line of an interrupted run
+                    if entry.get("status") in ("indexed", "skipped"):
+                        self._done.add((entry["path"], entry["sha256"]))
+
+    def is_done(self, path: str, sha256: str) -> bool:
+        return (path, sha256) in self._done
+
+    def record(self, entry: dict) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class StageTimer(IngestProgress):
+    """Sums wall time per pipeline stage across all files."""
+
+    def __init__(self, totals: dict[str, float], lock: threading.Lock):
+        self.totals = totals
+        self.lock = lock
+        self.started: dict[str, float] = {}
+        self.chunks = 0
+
+    def start(self, stage: str, total: int) -> None:
+        self.started[stage] = time.perf_counter()
+        if stage == "upsert":
+            self.chunks = total
+
+    def finish(self, stage: str) -> None:
+        elapsed = time.perf_counter() - self.started.pop(stage, time.perf_counter())
+        with self.lock:
+            self.totals[stage] += elapsed
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def discover_files(directory: str, extensions: set[str]) -> list[str]:
+    found = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in extensions:
+                found.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(found)
+
+
+def timed_parse(path: str) -> tuple[str, float]:
+    """Runs in a worker process; returns the Markdown and the parse time."""
+    start = time.perf_counter()
+    return parse_to_markdown(path), time.perf_counter() - start
+
+
+def ingest_file(
+    path: str,
+    sha256: str,
+    parsed: "Future[tuple[str, float]]",
+    llm_concurrency: int,
+    checkpoint: Checkpoint,
+    totals: dict[str, float],
+    lock: threading.Lock,
+    chunking: str | None = None,
+) -> dict:
+    filename = os.path.basename(path)
+    file_id = str(uuid.uuid5(FILE_ID_NAMESPACE, sha256))
+    entry = {"path": path, "sha256": sha256, "file_id": file_id, "chunks": 0}
+    try:
+        markdown, parse_seconds = parsed.result()
+        with lock:
+            totals["parse"] += parse_seconds
+        timer = StageTimer(totals, lock)
+        # replace=True clears points left by an earlier, interrupted attempt.
+        index_markdown(
+            markdown,
+            filename,
+            file_id=file_id,
+            progress=timer,
+            replace=True,
+            max_concurrency=llm_concurrency,
+            chunking=chunking,
+        )
+        if get_file_metadata(file_id) is None:
+            add_file_metadata(file_id, filename, datetime.now().isoformat(), sha256)
+        entry.update(status="indexed", chunks=timer.chunks)
+    except Exception as e:
+        entry.update(status="failed", error=str(e))
+    checkpoint.record(entry)
+    print(f"[{entry['status']}] {filename} ({entry['chunks']} chunks)")
+    return entry
+
+
+def run(args: argparse.Namespace) -> tuple[list[dict], dict[str, float]]:
+    """Ingests the pending files. Returns one entry per file and stage totals."""
+    initialize_db()
+    checkpoint = Checkpoint(args.checkpoint)
+    extensions = {ext.strip().lower() for ext in args.extensions.split(",")}
+    files = discover_files(args.directory, extensions)
+    print(f"Found {len(files)} files under {args.directory}")
+
+    results = []
+    pending = []
+    for path in files:
+        sha256 = file_sha256(path)
+        if checkpoint.is_done(path, sha256):
+            continue
+        if get_file_metadata_by_hash(sha256):
+            entry = {"path": path, "sha256": sha256, "status": "skipped", "chunks": 0}
+            checkpoint.record(entry)
+            results.append(entry)
+        else:
+            pending.append((path, sha256))
+    print(
+        f"{len(files) - len(pending) - len(results)} already done, "
+        f"{len(results)} already indexed, {len(pending)} to ingest"
+    )
+
+    totals: dict[str, float] = defaultdict(float)
+    lock = threading.Lock()
+    # The LLM budget is split between the files chunked at the same time.
+    llm_per_file = max(1, args.llm_concurrency // args.workers)
+    # Bounds parsed Markdown waiting for an indexing worker.
+    window = threading.BoundedSemaphore(args.workers * 2 + args.parse_workers)
+    futures = []
+    with (
+        ProcessPoolExecutor(max_workers=args.parse_workers) as parsers,
+        ThreadPoolExecutor(max_workers=args.workers) as indexers,
+    ):
+        for path, sha256 in pending:
+            window.acquire()
+            parsed = parsers.submit(timed_parse, path)
+            future = indexers.submit(
+                ingest_file,
+                path,
+                sha256,
+                parsed,
+                llm_per_file,
+                checkpoint,
+                totals,
+                lock,
+                args.chunking,
+            )
+            future.add_done_callback(lambda _: window.release())
+            futures.append(future)
+    results.extend(future.result() for future in futures)
+
+    if any(entry["status"] == "indexed" for entry in results):
+        bump_corpus_version()
+    return results, dict(totals)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory")
+    parser.add_argument(
+        "--workers", type=int, default=2, help="files chunked and indexed at once"
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="processes converting files with MarkItDown",
+    )
+    parser.add_argument(
+        "--llm-concurrency",
+        type=int,
+        default=CHUNKER_MAX_CONCURRENCY,
+        help="LLM calls in flight across all workers",
+    )
+    parser.add_argument(
+        "--chunking",
+        choices=CHUNKING_STRATEGIES,
+        help="chunking strategy for every file (default: CHUNKING_STRATEGY and "
+        "CHUNKING_BY_EXTENSION)",
+    )
+    parser.add_argument("--extensions", default=DEFAULT_EXTENSIONS)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results, stage_totals = run(args)
+    elapsed = time.perf_counter() - start
+
+    indexed = [entry for entry in results if entry["status"] == "indexed"]
+    failed = [entry for entry in results if entry["status"] == "failed"]
+    chunks = sum(entry["chunks"] for entry in indexed)
+    print(
+        f"\nIndexed {len(indexed)} files ({chunks} chunks) in {elapsed:.1f}s, "
+        f"{len(failed)} failed"
+    )
+    if elapsed > 0:
+        print(
+            f"Throughput: {len(indexed) / elapsed * 60:.1f} files/min, "
+            f"{chunks / elapsed:.2f} chunks/s"
+        )
+    for stage, seconds in stage_totals.items():
+        print(f"  {stage:<13}{seconds:>9.1f}s (summed over workers)")
+    for entry in failed:
+        print(f"  FAILED {entry['path']}: {entry['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Deterministic stand-in for the Ollama HTTP API, for offline benchmarks.
+
+Serves /api/chat (streamed NDJSON, as ChatOllama always requests it),
+/api/embed, the model loads of /api/generate and /api/ps, with a configurable delay
+before the first token and a fixed token rate afterwards. Replies depend only
+on the prompt:
+- proposition extraction returns one bullet per input sentence,
+- titling returns the first words of the first proposition,
+- query rewriting returns the question unchanged,
+- any other prompt (the answer) returns --answer-tokens words.
+Embeddings are hashed bags of words, so retrieval still favours overlapping
+text. Every call is counted by kind for the benchmark reports, and the last
+request body per endpoint is kept for inspection.
+
+Run from backend/:  python scripts/fake_ollama.py --port 11435 --latency 0.2
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+WORD = re.compile(r"\w+")
+
+
+def classify(messages: list[dict[str, Any]]) -> str:
+    """Which pipeline prompt a chat request comes from."""
+    system = " ".join(m["content"] for m in messages if m.get("role") == "system")
+    if "standalone propositions" in system:
+        return "propositions"
+    if "descriptive title" in system:
+        return "title"
+    if "Search Query Optimizer" in system:
+        return "rewrite"
+    return "answer"
+
+
+def hashed_embedding(text: str, dim: int) -> list[float]:
+    """Normalized bag-of-words vector with one hashed slot and sign per word."""
+    vector = [0.0] * dim
+    for word in WORD.findall(text.lower()):
+        digest = hashlib.md5(word.encode()).digest()
+        slot = int.from_bytes(digest[:4], "little") % dim
+        vector[slot] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeOllama:
+    """Reply generation and call accounting, shared by all handler threads."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        answer_tokens: int = 64,
+        embedding_dim: int = 768,
+        embed_latency: float = 0.0,
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.embedding_dim = embedding_dim
+        self.embed_latency = embed_latency
+        self.calls: Counter[str] = Counter()
+        self.last_request: dict[str, dict[str, Any]] = {}
+        self.loaded: set[str] = set()
+        self._lock = threading.Lock()
+
+    def count(self, kind: str, n: int = 1) -> None:
+        with self._lock:
+            self.calls[kind] += n
+
+    def reply_tokens(self, kind: str, messages: list[dict[str, Any]]) -> list[str]:
+        prompt = messages[-1]["content"] if messages else ""
+        if kind == "propositions":
+            sentences = [s for s in SENTENCE_SPLIT.split(prompt.strip()) if s]
+            text = "\n".join(f"- {s}" for s in sentences)
+        elif kind == "title":
+            text = " ".join(prompt.lstrip("- ").split()[:4]).title()
+        elif kind == "rewrite":
+            text = prompt
+        else:
+            words = WORD.findall(prompt) or ["policy"]
+            text = " ".join(words[i % len(words)] for i in range(self.answer_tokens))
+        # Whitespace-delimited pieces stand in for model tokens.
+        return re.findall(r"\S+\s*", text) or [""]
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeOllamaServer"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _read_json(self) -> dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, payload: dict[str, Any]) -> None:
+        line = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            self._send_json({"models": []})
+        elif self.path == "/api/ps":
+            loaded = sorted(self.server.fake.loaded)
+            self._send_json({"models": [{"name": m, "model": m} for m in loaded]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        fake = self.server.fake
+        request = self._read_json()
+        fake.last_request[self.path] = request
+        if request.get("model"):
+            fake.loaded.add(request["model"])
+        if self.path == "/api/embed":
+            inputs = request.get("input") or []
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            fake.count("embed")
+            time.sleep(fake.embed_latency)
+            self._send_json(
+                {
+                    "model": request.get("model"),
+                    "embeddings": [
+                        hashed_embedding(text, fake.embedding_dim) for text in inputs
+                    ],
+                }
+            )
+        elif self.path == "/api/chat":
+            self._chat(fake, request)
+        elif self.path == "/api/generate" and not request.get("prompt"):
+            # An empty prompt only loads the model, as warm-ups do.
+            fake.count("load")
+            self._send_json(
+                {
+                    "model": request.get("model"),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "response": "",
+                    "done": True,
+                    "done_reason": "load",
+                }
+            )
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _chat(self, fake: FakeOllama, request: dict[str, Any]) -> None:
+        messages = request.get("messages") or []
+        kind = classify(messages)
+        fake.count(kind)
+        tokens = fake.reply_tokens(kind, messages)
+        base = {"model": request.get("model")}
+        started = time.perf_counter()
+        time.sleep(fake.latency)
+
+        if request.get("stream") is False:
+            time.sleep(fake.token_delay() * len(tokens))
+            self._send_json(
+                {
+                    **base,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "done": True,
+                    "done_reason": "stop",
+                    "eval_count": len(tokens),
+                }
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(fake.token_delay())
+            self._send_chunk(
+                {
+                    **base,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": {"role": "assistant", "content": token},
+                    "done": False,
+                }
+            )
+        self._send_chunk(
+            {
+                **base,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - started) * 1e9),
+                "prompt_eval_count": sum(
+                    len(WORD.findall(m.get("content", ""))) for m in messages
+                ),
+                "eval_count": len(tokens),
+            }
+        )
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Threaded server; use start()/stop() to run it in the background."""
+
+    daemon_threads = True
+
+    def __init__(self, fake: FakeOllama, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), Handler)
+        self.fake = fake
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options for the stand-in, shared by the benchmarks that start one."""
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        default=0.2,
+        help="seconds before the first token of every chat call",
+    )
+    parser.add_argument(
+        "--llm-tokens-per-second",
+        type=float,
+        default=40.0,
+        help="token rate after the first token (0 = no delay)",
+    )
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument(
+        "--embed-latency", type=float, default=0.01, help="seconds per embed call"
+    )
+
+
+def from_arguments(args: argparse.Namespace) -> FakeOllama:
+    return FakeOllama(
+        latency=args.llm_latency,
+        tokens_per_second=args.llm_tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        embedding_dim=args.embedding_dim,
+        embed_latency=args.embed_latency,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(from_arguments(args), args.host, args.port)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Calls: {dict(server.fake.calls)}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,92 @@
-from typing import List, Tuple, AsyncGenerator
-from rag import stream_chat_with_doc, chat_with_doc
+import os
+from collections.abc import AsyncGenerator
 
+from starlette.concurrency import run_in_threadpool
 
-async def handle_streaming_chat(question: str, history: List[Tuple[str, str]]) -> AsyncGenerator[str, None]:
+from cache import AnswerCache, replay_chunks
+from database import get_corpus_version
+from llm_scheduler import Priority, scheduler
+from rag import (
+    CHAT_MODEL,
+    CONTEXT_TOKEN_BUDGET,
+    RETRIEVAL_CANDIDATES,
+    achat_with_doc,
+    astream_chat_with_doc,
+)
+
+# Opt-in cache of answers to history-free questions (e.g. repeated FAQs).
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE) if ANSWER_CACHE_ENABLED else None
+
+
+async def _answer_cache_key(
+    question: str, history: list[tuple[str, str]]
+) -> str | None:
+    """Returns the cache key for cacheable requests, or None."""
+    if answer_cache is None or history:
+        return None
+    # A SQLite read; keep it off the event loop.
+    corpus_version = await run_in_threadpool(get_corpus_version)
+    # Without history, every request gets the same candidates and full budget.
+    return AnswerCache.make_key(
+        question,
+        RETRIEVAL_CANDIDATES,
+        f"{CHAT_MODEL}:{CONTEXT_TOKEN_BUDGET}",
+        corpus_version,
+    )
+
+
+async def handle_streaming_chat(
+    question: str, history: list[tuple[str, str]]
+) -> AsyncGenerator[str, None]:
     """
-    Handles a streaming chat request by consuming the sync generator from RAG
-    and yielding chunks asynchronously.
+    Returns the answer stream of a chat request. Cached answers are replayed as
+    a stream. Otherwise the LLM scheduler must have room for the request, or
+    SchedulerSaturated is raised before any response has started; the answer
+    then comes from the async RAG stream, so the event loop can serve other
+    requests while tokens are generated.
     """
-    for chunk in stream_chat_with_doc(question, history):
+    cache_key = await _answer_cache_key(question, history)
+    if cache_key is not None and answer_cache is not None:
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            return _replay(cached)
+    # Reject before the response starts; a 429 can't be sent mid-stream.
+    scheduler.check(Priority.INTERACTIVE)
+    return _stream_answer(question, history, cache_key)
+
+
+async def _replay(answer: str) -> AsyncGenerator[str, None]:
+    for piece in replay_chunks(answer):
+        yield piece
+
+
+async def _stream_answer(
+    question: str, history: list[tuple[str, str]], cache_key: str | None
+) -> AsyncGenerator[str, None]:
+    parts = []
+    async for chunk in astream_chat_with_doc(question, history):
+        parts.append(chunk)
         yield chunk
 
+    answer = "".join(parts)
+    if cache_key is not None and answer_cache is not None and answer:
+        answer_cache.put(cache_key, answer)
+
+
+async def handle_blocking_chat(question: str, history: list[tuple[str, str]]) -> str:
+    """
+    Handles a blocking (non-streaming) chat request without blocking the event
+    loop.
+    """
+    cache_key = await _answer_cache_key(question, history)
+    if cache_key is not None and answer_cache is not None:
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-def handle_blocking_chat(question: str, history: List[Tuple[str, str]]):
-    """Handles a blocking chat request."""
-    return chat_with_doc(question, history)
+    answer = await achat_with_doc(question, history)
+    if cache_key is not None and answer_cache is not None and answer:
+        answer_cache.put(cache_key, answer)
+    return answer
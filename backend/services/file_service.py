@@ -1,48 +1,272 @@
+import hashlib
+import logging
 import os
-import shutil
-from datetime import datetime
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any, BinaryIO
 
-from fastapi import UploadFile
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
 
-from database import add_file_metadata, delete_file_metadata
-from ingest import delete_file_from_index, process_and_index_file
+from database import (
+    bump_corpus_version,
+    delete_file_metadata,
+    get_file_metadata,
+    get_file_metadata_by_hash,
+    get_unfinished_job_by_hash,
+)
+from ingest import delete_file_from_index
+from services.job_service import create_completed_job, create_ingest_job
+
+logger = logging.getLogger("hr_policy_rag")
 
 DATA_DIR = "data"
+UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# Uploads larger than this are rejected while streaming, before hitting disk.
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+# Form field carrying the document.
+UPLOAD_FIELD = "file"
+
+# Serializes the duplicate check with job creation so two identical uploads
+# arriving together are not both ingested.
+_dedupe_lock = threading.Lock()
+
+
+class UploadError(ValueError):
+    """The request body is not a usable multipart upload."""
+
+
+class UploadTooLargeError(UploadError):
+    """The upload exceeds MAX_UPLOAD_BYTES."""
+
+
+@dataclass
+class StagedUpload:
+    """An upload written to UPLOAD_DIR, with the SHA-256 of its content."""
+
+    job_id: str
+    filename: str
+    file_path: str
+    content_hash: str
+    size: int
+
+    def discard(self) -> None:
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
 
 
-def handle_upload_file(file: UploadFile) -> dict:
+def handle_upload_file(upload: StagedUpload, chunking: str | None = None) -> dict:
     """
-    Saves, processes, and indexes an uploaded file, then cleans up.
-    Returns the metadata record of the new file.
+    Queues a staged upload for background ingestion, chunked with 'chunking'
+    (or the configured strategy).
+    Returns the job record; poll it for progress and the resulting file_id.
+
+    Content already indexed (or being indexed) is not processed again: the
+    upload resolves to the existing file_id, or to the in-flight job.
     """
-    file_location = os.path.join(DATA_DIR, str(file.filename))
+    try:
+        with _dedupe_lock:
+            return _resolve_or_queue(
+                upload.job_id,
+                upload.file_path,
+                upload.filename,
+                upload.content_hash,
+                chunking,
+            )
+    except Exception:
+        upload.discard()
+        raise
+
 
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+def handle_update_file(
+    file_id: str, upload: StagedUpload, chunking: str | None = None
+) -> dict | None:
+    """
+    Queues a job that replaces the chunks of an existing file with a staged new
+    version. Unchanged sections are served from the chunker's LLM cache.
+    Returns the job record, or None if file_id doesn't exist.
+    """
+    existing_file = get_file_metadata(file_id)
+    if existing_file is None:
+        upload.discard()
+        return None
 
     try:
-        # Process and Index
-        file_id = process_and_index_file(file_location, str(file.filename))
-
-        # Create record (matches FileRecord Pydantic model)
-        record = {
-            "file_id": file_id,
-            "filename": str(file.filename),
-            "upload_date": datetime.now().isoformat(),
+        if upload.content_hash == existing_file["content_hash"]:
+            upload.discard()
+            logger.info(f"Update of file_id {file_id} has identical content.")
+            return create_completed_job(
+                upload.job_id,
+                upload.filename,
+                file_id,
+                upload.content_hash,
+                operation="update",
+            )
+        return create_ingest_job(
+            upload.job_id,
+            upload.file_path,
+            upload.filename,
+            upload.content_hash,
+            replace_file_id=file_id,
+            chunking=chunking,
+        )
+    except Exception:
+        upload.discard()
+        raise
+
+
+async def stage_upload(request: Request) -> StagedUpload:
+    """
+    Streams the multipart request body straight into a unique file in
+    UPLOAD_DIR, hashing it in the same pass. Nothing is spooled to a temporary
+    file first, and the stream is cut off as soon as it exceeds MAX_UPLOAD_BYTES.
+    Raises UploadError (or UploadTooLargeError) for unusable requests.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadError("Expected a multipart/form-data upload")
+    declared = int(request.headers.get("content-length") or 0)
+    if declared > MAX_UPLOAD_BYTES + 64 * 1024:  # allow for the multipart framing
+        raise UploadTooLargeError(f"Upload exceeds the {MAX_UPLOAD_MB} MB limit")
+
+    writer = _UploadWriter(str(uuid.uuid4()))
+    parser = MultipartParser(options[b"boundary"], writer.callbacks())
+    try:
+        async for chunk in request.stream():
+            # Parsing, hashing and disk writes run off the event loop.
+            await run_in_threadpool(parser.write, chunk)
+        await run_in_threadpool(parser.finalize)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.result()
+
+
+class _UploadWriter:
+    """Multipart parser callbacks that write the UPLOAD_FIELD part to disk."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.filename: str | None = None
+        self.file_path: str | None = None
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._buffer: BinaryIO | None = None
+        self._headers: dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+        self._writing = False
+
+    def callbacks(self) -> dict[str, Any]:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
         }
 
-        # Save metadata to DB
-        add_file_metadata(
-            file_id=record["file_id"],
-            filename=record["filename"],
-            upload_date=record["upload_date"],
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def _on_headers_finished(self) -> None:
+        _, disposition = parse_options_header(
+            self._headers.get(b"content-disposition", b"")
         )
+        name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        filename = disposition.get(b"filename")
+        if name != UPLOAD_FIELD or filename is None or self.file_path is not None:
+            return  # other form fields are ignored
+        self.filename = os.path.basename(filename.decode("utf-8", "replace"))
+        # Keep the extension so MarkItDown can pick the right converter.
+        _, extension = os.path.splitext(self.filename)
+        self.file_path = os.path.join(UPLOAD_DIR, f"{self.job_id}{extension}")
+        # Closed in _on_part_end, or by abort() if the stream fails.
+        self._buffer = open(self.file_path, "wb")  # noqa: SIM115
+        self._writing = True
 
-        return record
-    finally:
-        # Cleanup local file
-        if os.path.exists(file_location):
-            os.remove(file_location)
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._writing:
+            return
+        self.size += end - start
+        if self.size > MAX_UPLOAD_BYTES:
+            raise UploadTooLargeError(f"Upload exceeds the {MAX_UPLOAD_MB} MB limit")
+        chunk = data[start:end]
+        self.digest.update(chunk)
+        assert self._buffer is not None
+        self._buffer.write(chunk)
+
+    def _on_part_end(self) -> None:
+        if self._writing and self._buffer is not None:
+            self._buffer.close()
+            self._writing = False
+
+    def abort(self) -> None:
+        """Closes and removes a partially written file."""
+        if self._buffer is not None:
+            self._buffer.close()
+        if self.file_path and os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def result(self) -> StagedUpload:
+        if self.file_path is None or self._writing:
+            self.abort()
+            raise UploadError(f"No complete '{UPLOAD_FIELD}' file in the upload")
+        return StagedUpload(
+            job_id=self.job_id,
+            filename=str(self.filename),
+            file_path=self.file_path,
+            content_hash=self.digest.hexdigest(),
+            size=self.size,
+        )
+
+
+def _resolve_or_queue(
+    job_id: str,
+    file_location: str,
+    filename: str,
+    content_hash: str,
+    chunking: str | None = None,
+) -> dict:
+    """Returns an existing record for known content, otherwise queues a new job."""
+    existing_file = get_file_metadata_by_hash(content_hash)
+    if existing_file is not None:
+        os.remove(file_location)
+        logger.info(
+            f"Upload of {filename} matches indexed file_id: {existing_file['file_id']}"
+        )
+        return create_completed_job(
+            job_id, filename, existing_file["file_id"], content_hash
+        )
+
+    pending_job = get_unfinished_job_by_hash(content_hash)
+    if pending_job is not None:
+        os.remove(file_location)
+        logger.info(
+            f"Upload of {filename} matches in-flight job: {pending_job['job_id']}"
+        )
+        return pending_job
+
+    return create_ingest_job(
+        job_id, file_location, filename, content_hash, chunking=chunking
+    )
 
 
 def handle_delete_file(file_id: str):
@@ -54,3 +278,6 @@ def handle_delete_file(file_id: str):
 
     # Then, delete from metadata database
     delete_file_metadata(file_id)
+
+    # Invalidate cached answers that may cite the deleted file.
+    bump_corpus_version()
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any
+
+from database import (
+    add_file_metadata,
+    add_job,
+    bump_corpus_version,
+    claim_job,
+    get_file_metadata,
+    get_job,
+    get_unfinished_jobs,
+    release_queued_jobs,
+    renew_job_leases,
+    update_file_metadata,
+    update_job,
+)
+from ingest import IngestProgress, delete_file_from_index, process_and_index_file
+from metrics import INGEST_JOBS_IN_PROGRESS
+
+logger = logging.getLogger("hr_policy_rag")
+
+# Parsing and agentic chunking are CPU/LLM bound and fully synchronous, so ingestion
+# jobs run on their own small pool instead of the event loop or the shared threadpool.
+UPLOAD_MAX_WORKERS = int(os.getenv("UPLOAD_MAX_WORKERS", "2"))
+ingest_executor = ThreadPoolExecutor(
+    max_workers=UPLOAD_MAX_WORKERS, thread_name_prefix="ingest"
+)
+
+# Jobs are claimed by one worker at a time. The owner renews its leases while
+# it is alive; a job whose lease has run out (its worker died) is taken over by
+# the next resume_pending_jobs() of any worker.
+INGEST_JOB_LEASE_SECONDS = float(os.getenv("INGEST_JOB_LEASE_SECONDS", "300"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Minimum interval between progress writes to SQLite while a stage is running.
+PROGRESS_FLUSH_SECONDS = 1.0
+
+
+class JobProgress(IngestProgress):
+    """
+    Records per-stage counts and timings for a job and persists them to the
+    ingest_jobs table. Intermediate updates are throttled; stage boundaries are
+    always written.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.stages: dict[str, dict[str, Any]] = {}
+        self._started: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def start(self, stage: str, total: int) -> None:
+        with self._lock:
+            self._started[stage] = time.perf_counter()
+            self.stages[stage] = {
+                "done": 0,
+                "total": total,
+                "seconds": 0.0,
+                "finished": False,
+            }
+            self._flush(stage, force=True)
+
+    def advance(self, stage: str, count: int = 1) -> None:
+        with self._lock:
+            entry = self.stages[stage]
+            entry["done"] += count
+            entry["seconds"] = self._elapsed(stage)
+            self._flush(stage)
+
+    def finish(self, stage: str) -> None:
+        with self._lock:
+            entry = self.stages[stage]
+            entry["total"] = max(entry["total"], entry["done"])
+            entry["seconds"] = self._elapsed(stage)
+            entry["finished"] = True
+            self._flush(stage, force=True)
+
+    def _elapsed(self, stage: str) -> float:
+        return round(time.perf_counter() - self._started[stage], 3)
+
+    def _flush(self, stage: str, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_flush < PROGRESS_FLUSH_SECONDS:
+            return
+        self._last_flush = now
+        update_job(self.job_id, stage=stage, progress=self.stages)
+
+
+def create_ingest_job(
+    job_id: str,
+    file_path: str,
+    filename: str,
+    content_hash: str | None = None,
+    replace_file_id: str | None = None,
+    chunking: str | None = None,
+) -> dict[str, Any]:
+    """
+    Records a queued job for an already staged file and schedules it.
+    With replace_file_id, the job replaces that file's chunks instead of
+    creating a new file. 'chunking' overrides the configured chunking strategy.
+    """
+    job = add_job(
+        job_id,
+        filename,
+        file_path,
+        content_hash=content_hash,
+        operation="update" if replace_file_id else "create",
+        file_id=replace_file_id,
+        chunking=chunking,
+        owner=WORKER_ID,
+        lease_until=_lease_until(),
+    )
+    submit_ingest_job(job_id)
+    return job
+
+
+def create_completed_job(
+    job_id: str,
+    filename: str,
+    file_id: str,
+    content_hash: str,
+    operation: str = "create",
+) -> dict[str, Any]:
+    """Records a job that needs no work because the content is already indexed."""
+    job = add_job(job_id, filename, "", content_hash=content_hash, operation=operation)
+    update_job(job_id, status="completed", file_id=file_id)
+    job.update(status="completed", file_id=file_id)
+    return job
+
+
+def _lease_until() -> float:
+    return time.time() + INGEST_JOB_LEASE_SECONDS
+
+
+def submit_ingest_job(job_id: str) -> "Future[None]":
+    """Schedules a job on the ingestion worker pool."""
+    return ingest_executor.submit(run_ingest_job, job_id)
+
+
+@INGEST_JOBS_IN_PROGRESS.track_inprogress()
+def run_ingest_job(job_id: str) -> None:
+    """
+    Runs the ingestion pipeline for a job and records the outcome.
+    Update jobs, and create jobs interrupted mid-way (e.g. by a restart), already
+    have a file_id; their existing points are replaced by the new chunks.
+    A job another worker has claimed is left alone.
+    """
+    job = get_job(job_id)
+    if job is None:
+        logger.error(f"Ingestion job {job_id} not found.")
+        return
+    if not claim_job(job_id, WORKER_ID, _lease_until(), time.time()):
+        logger.info(f"Ingestion job {job_id} is claimed by another worker.")
+        return
+
+    updating = job["operation"] == "update"
+    replace = job["file_id"] is not None
+    file_id = job["file_id"] or str(uuid.uuid4())
+    update_job(job_id, status="running", file_id=file_id, error=None, progress={})
+    logger.info(f"Starting ingestion job {job_id} for file: {job['filename']}")
+
+    try:
+        process_and_index_file(
+            job["file_path"],
+            job["filename"],
+            file_id=file_id,
+            progress=JobProgress(job_id),
+            replace=replace,
+            chunking=job.get("chunking"),
+        )
+        # A create job interrupted after recording its file finishes as a replace.
+        exists = updating or get_file_metadata(file_id) is not None
+        record_metadata = update_file_metadata if exists else add_file_metadata
+        record_metadata(
+            file_id=file_id,
+            filename=job["filename"],
+            upload_date=datetime.now().isoformat(),
+            content_hash=job["content_hash"],
+        )
+        # The indexed content changed; invalidate cached answers.
+        bump_corpus_version()
+        update_job(job_id, status="completed", stage=None)
+        logger.info(f"Ingestion job {job_id} completed with file_id: {file_id}")
+    except Exception as e:
+        logger.exception(f"Ingestion job {job_id} failed.", exc_info=e)
+        update_job(job_id, status="failed", error=str(e))
+        # A failed update keeps whatever the file had; a failed create leaves
+        # nothing behind. Points of a file that is already recorded (e.g. by a
+        # racing worker, which shows up as a constraint error) are never removed.
+        if (
+            not updating
+            and not isinstance(e, sqlite3.IntegrityError)
+            and get_file_metadata(file_id) is None
+        ):
+            try:
+                delete_file_from_index(file_id)
+            except Exception:
+                logger.warning(f"Could not remove partial index for job {job_id}.")
+    finally:
+        # Cleanup staged file
+        if os.path.exists(job["file_path"]):
+            os.remove(job["file_path"])
+
+
+def resume_pending_jobs() -> int:
+    """
+    Claims and re-queues jobs left queued or running by a worker that is gone:
+    jobs without a lease, or whose lease ran out. Returns the number scheduled.
+    """
+    resumed = 0
+    for job in get_unfinished_jobs():
+        if job["owner"] == WORKER_ID:
+            continue
+        if not os.path.exists(job["file_path"]):
+            if claim_job(job["job_id"], WORKER_ID, _lease_until(), time.time()):
+                update_job(
+                    job["job_id"],
+                    status="failed",
+                    error="Staged upload is missing; please upload the file again.",
+                )
+            continue
+        if claim_job(job["job_id"], WORKER_ID, _lease_until(), time.time()):
+            submit_ingest_job(job["job_id"])
+            resumed += 1
+    if resumed:
+        logger.info(f"Resumed {resumed} pending ingestion job(s).")
+    return resumed
+
+
+async def keep_job_leases(interval: float = INGEST_JOB_LEASE_SECONDS / 3) -> None:
+    """
+    Renews the leases of this worker's jobs every 'interval' seconds, and takes
+    over jobs whose worker has gone, until cancelled.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(renew_job_leases, WORKER_ID, _lease_until())
+        await asyncio.to_thread(resume_pending_jobs)
+
+
+def release_jobs() -> int:
+    """Lets any worker resume this worker's jobs that have not started yet."""
+    return release_queued_jobs(WORKER_ID)
+
+
+def get_job_status(job_id: str) -> dict[str, Any] | None:
+    """Returns the job record, or None if the job doesn't exist."""
+    return get_job(job_id)
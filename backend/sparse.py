@@ -0,0 +1,65 @@
+import re
+import zlib
+from collections import Counter
+
+from langchain_qdrant import SparseEmbeddings, SparseVector
+
+# Common English function words carry no lexical signal for policy lookups.
+STOPWORDS = frozenset(
+    [
+        "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does",
+        "for", "from", "has", "have", "how", "i", "if", "in", "into", "is", "it", "its",
+        "my", "no", "not", "of", "on", "or", "our", "should", "so", "than", "that",
+        "the", "their", "them", "then", "there", "these", "they", "this", "to", "was",
+        "we", "what", "when", "where", "which", "who", "will", "with", "you", "your",
+    ]
+)  # fmt: skip
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased alphanumeric tokens without stopwords."""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS
+    ]
+
+
+class BM25SparseEmbeddings(SparseEmbeddings):
+    """
+    Local BM25 sparse encoder for Qdrant hybrid search.
+
+    Documents get the BM25 term-frequency component; queries get a weight of 1
+    per distinct term. The IDF component is applied by Qdrant at query time
+    (the sparse vector is created with Modifier.IDF), so no corpus statistics
+    are kept here. Terms are mapped to indices with CRC32, which is stable
+    across processes and needs no vocabulary.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_doc_len: float = 256.0):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_len = avg_doc_len
+
+    @staticmethod
+    def _index(token: str) -> int:
+        return zlib.crc32(token.encode("utf-8"))
+
+    def _term_counts(self, text: str) -> tuple[Counter[int], int]:
+        tokens = tokenize(text)
+        return Counter(self._index(token) for token in tokens), len(tokens)
+
+    def embed_documents(self, texts: list[str]) -> list[SparseVector]:
+        vectors = []
+        for text in texts:
+            counts, doc_len = self._term_counts(text)
+            norm = self.k1 * (1 - self.b + self.b * doc_len / self.avg_doc_len)
+            indices = sorted(counts)
+            values = [counts[i] * (self.k1 + 1) / (counts[i] + norm) for i in indices]
+            vectors.append(SparseVector(indices=indices, values=values))
+        return vectors
+
+    def embed_query(self, text: str) -> SparseVector:
+        counts, _ = self._term_counts(text)
+        indices = sorted(counts)
+        return SparseVector(indices=indices, values=[1.0] * len(indices))
@@ -20,13 +20,9 @@ def test_agentic_chunker_deduplication():
     chunker._get_propositions = MagicMock(side_effect=mock_get_propositions)
     chunker._get_title = MagicMock(return_value="Summary Title")
 
-    with patch("ingest.RecursiveCharacterTextSplitter") as mock_splitter:
-        mock_instance = mock_splitter.return_value
-        # Simulate two overlapping chunks from the splitter
-        mock_instance.split_documents.return_value = [
-            Document(page_content="Chunk 1 content", metadata={"source": "test"}),
-            Document(page_content="Chunk 2 content", metadata={"source": "test"}),
-        ]
+    # Simulate two slices with overlapping propositions
+    slices = ["Chunk 1 content", "Chunk 2 content"]
+    with patch.object(chunker, "_slices", return_value=slices):
 
         doc = Document(page_content="Full content", metadata={"source": "test"})
         chunks = chunker.split_documents([doc])
@@ -60,11 +56,7 @@ def test_agentic_chunker_grouping():
     chunker._get_propositions = MagicMock(return_value=propositions)
     chunker._get_title = MagicMock(return_value="Group Title")
 
-    with patch("ingest.RecursiveCharacterTextSplitter") as mock_splitter:
-        mock_instance = mock_splitter.return_value
-        mock_instance.split_documents.return_value = [
-            Document(page_content="Initial Chunk", metadata={})
-        ]
+    with patch.object(chunker, "_slices", return_value=["Initial Chunk"]):
 
         doc = Document(page_content="Full content", metadata={})
         chunks = chunker.split_documents([doc])
@@ -75,3 +67,137 @@ def test_agentic_chunker_grouping():
         assert len(chunks) == 2
         assert chunks[0].metadata["section_title"] == "Group Title"
         assert chunks[1].metadata["section_title"] == "Group Title"
+
+
+def test_agentic_chunker_concurrent_extraction_keeps_order():
+    import threading
+    import time
+
+    chunker = AgenticChunker(MagicMock(), max_concurrency=3)
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow_get_propositions(text):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        # Later slices finish first to prove results are re-ordered.
+        time.sleep(0.05 / (int(text.split()[1]) + 1))
+        with lock:
+            in_flight -= 1
+        if text == "Slice 2":
+            return [text]  # per-slice fallback passes the raw text through
+        return [f"{text} fact"]
+
+    chunker._get_propositions = MagicMock(side_effect=slow_get_propositions)
+    chunker._get_title = MagicMock(return_value="Title")
+
+    slices = [f"Slice {i}" for i in range(6)]
+    with patch.object(chunker, "_slices", return_value=slices):
+        chunks = chunker.split_documents([Document(page_content="Full", metadata={})])
+
+    assert chunks[0].page_content == (
+        "Section: Title\n"
+        "Slice 0 fact Slice 1 fact Slice 2 Slice 3 fact Slice 4 fact Slice 5 fact"
+    )
+    assert chunker._get_propositions.call_count == 6
+    assert 1 < peak <= 3
+
+
+def test_agentic_chunker_titles_generated_concurrently():
+    import threading
+
+    chunker = AgenticChunker(MagicMock(), max_concurrency=4)
+    propositions = [f"Proposition {i} " + "x" * 880 for i in range(6)]
+    chunker._get_propositions = MagicMock(return_value=propositions)
+
+    # Every titling call waits until all three groups are in flight, which
+    # only succeeds if titles are requested together rather than one by one.
+    barrier = threading.Barrier(3, timeout=5)
+
+    def get_title(group):
+        barrier.wait()
+        if group[0].startswith("Proposition 2"):
+            return "Untitled Section"
+        return f"Title for {group[0].split()[1]}"
+
+    chunker._get_title = MagicMock(side_effect=get_title)
+
+    with patch.object(chunker, "_slices", return_value=["Initial Chunk"]):
+        chunks = chunker.split_documents([Document(page_content="Full", metadata={})])
+
+    assert [c.metadata["section_title"] for c in chunks] == [
+        "Title for 0",
+        "Untitled Section",
+        "Title for 4",
+    ]
+    assert chunks[1].page_content.startswith("Section: Untitled Section\nProposition 2")
+
+
+def test_agentic_chunker_reuses_cached_llm_results(tmp_path):
+    from cache import LLMResultCache
+
+    cache = LLMResultCache(str(tmp_path / "cache.db"))
+    mock_llm = MagicMock()
+    mock_llm.model = "llama3"
+    chunker = AgenticChunker(mock_llm, cache=cache)
+
+    responses = iter(["- Fact one\n- Fact two", "Leave Policy"])
+    fake_chain = MagicMock()
+    fake_chain.invoke.side_effect = lambda _: MagicMock(content=next(responses))
+    chunker.extraction_prompt = MagicMock(__or__=lambda self, other: fake_chain)
+    chunker.titling_prompt = MagicMock(__or__=lambda self, other: fake_chain)
+
+    assert chunker._get_propositions("Slice text") == ["Fact one", "Fact two"]
+    assert chunker._get_title(["Fact one", "Fact two"]) == "Leave Policy"
+    assert fake_chain.invoke.call_count == 2
+
+    # A fresh chunker (e.g. a re-ingest) answers from the cache without the LLM.
+    rerun = AgenticChunker(mock_llm, cache=cache)
+    rerun.extraction_prompt = chunker.extraction_prompt
+    rerun.titling_prompt = chunker.titling_prompt
+    assert rerun._get_propositions("Slice text") == ["Fact one", "Fact two"]
+    assert rerun._get_title(["Fact one", "Fact two"]) == "Leave Policy"
+    assert fake_chain.invoke.call_count == 2
+
+    # A different model is a cache miss.
+    assert cache.get("propositions", "mistral", "1", "Slice text") is None
+
+
+def test_slices_survive_an_edit_in_the_middle(tmp_path):
+    from cache import LLMResultCache
+
+    mock_llm = MagicMock()
+    mock_llm.model = "llama3"
+    cache = LLMResultCache(str(tmp_path / "cache.db"))
+    extracted = []
+
+    def ingest_text(text):
+        chunker = AgenticChunker(mock_llm, max_concurrency=1, cache=cache)
+        fake_chain = MagicMock()
+        fake_chain.invoke.side_effect = lambda inputs: (
+            extracted.append(inputs["input"]) or MagicMock(content="- A fact")
+        )
+        chunker.extraction_prompt = MagicMock(__or__=lambda self, other: fake_chain)
+        chunker._get_title = MagicMock(return_value="Title")
+        chunker.split_documents([Document(page_content=text, metadata={})])
+        return chunker._slices(text)
+
+    clauses = [
+        f"{i}. Employees in grade {i} accrue {i % 7 + 10} days of leave a year, "
+        f"subject to manager approval and the notice rules in clause {i + 1}."
+        for i in range(300)
+    ]
+    slices = ingest_text("\n\n".join(clauses))
+    assert len(slices) >= 10
+    assert all(len(s) <= AgenticChunker.SLICE_MAX_CHARS for s in slices)
+
+    extracted.clear()
+    clauses[150] += " Part-time staff accrue leave pro rata."
+    edited = ingest_text("\n\n".join(clauses))
+
+    # Only the slices around the edit go back to the LLM.
+    assert len(extracted) <= 3
+    assert len(edited) - len(extracted) >= 0.8 * len(edited)
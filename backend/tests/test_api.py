@@ -1,5 +1,6 @@
 import os
 import sys
+import threading
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -9,15 +10,22 @@ from fastapi.testclient import TestClient
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app
+from services import file_service
 
 client = TestClient(app)
 API_KEY = "default-secret-key"
 HEADERS = {"X-API-Key": API_KEY}
 
 
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_service, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
 @pytest.fixture
 def mock_db():
-    with patch("main.get_all_files_metadata") as mock_get:
+    with patch("main.list_files_metadata") as mock_get:
         yield mock_get
 
 
@@ -28,9 +36,16 @@ def mock_file_service():
         patch("main.handle_delete_file") as mock_delete,
     ):
         mock_upload.return_value = {
-            "file_id": "test-file-id",
+            "job_id": "test-job-id",
             "filename": "test.txt",
-            "upload_date": "2023-01-01T00:00:00",
+            "file_path": "data/uploads/test-job-id.txt",
+            "status": "queued",
+            "stage": None,
+            "progress": {},
+            "file_id": None,
+            "error": None,
+            "created_at": "2023-01-01T00:00:00",
+            "updated_at": "2023-01-01T00:00:00",
         }
         mock_delete.return_value = None
         yield mock_upload, mock_delete
@@ -53,10 +68,28 @@ def mock_chat_service():
 
 
 def test_list_files_empty(mock_db):
-    mock_db.return_value = []
+    mock_db.return_value = ([], None)
     response = client.get("/files", headers=HEADERS)
     assert response.status_code == 200
-    assert response.json() == []
+    assert response.json() == {"items": [], "next_cursor": None}
+    mock_db.assert_called_once_with(100, None, None)
+
+
+def test_list_files_passes_paging_params(mock_db):
+    record = {"file_id": "f1", "filename": "leave.pdf", "upload_date": "2024-01-01"}
+    mock_db.return_value = ([record], "next")
+    response = client.get(
+        "/files?limit=1&cursor=abc&filename_prefix=lea", headers=HEADERS
+    )
+    assert response.status_code == 200
+    assert response.json() == {"items": [record], "next_cursor": "next"}
+    mock_db.assert_called_once_with(1, "abc", "lea")
+
+
+def test_list_files_rejects_bad_cursor(mock_db):
+    mock_db.side_effect = ValueError("Invalid cursor")
+    response = client.get("/files?cursor=zzz", headers=HEADERS)
+    assert response.status_code == 400
 
 
 def test_list_files_unauthorized():
@@ -70,13 +103,118 @@ def test_upload_file(mock_file_service):
     files = {"file": ("test.txt", b"test content", "text/plain")}
     response = client.post("/upload", files=files, headers=HEADERS)
 
-    assert response.status_code == 200
+    assert response.status_code == 202
     data = response.json()
     assert data["filename"] == "test.txt"
-    assert data["file_id"] == "test-file-id"
-    assert "upload_date" in data
+    assert data["job_id"] == "test-job-id"
+    assert data["status"] == "queued"
+    assert "file_path" not in data
 
     mock_upload.assert_called_once()
+    staged = mock_upload.call_args.args[0]
+    assert staged.filename == "test.txt"
+    assert staged.size == len(b"test content")
+    with open(staged.file_path, "rb") as f:
+        assert f.read() == b"test content"
+
+
+def test_upload_file_with_chunking_strategy(mock_file_service):
+    mock_upload, _ = mock_file_service
+    files = {"file": ("test.docx", b"# Leave", "application/octet-stream")}
+
+    response = client.post(
+        "/upload", params={"chunking": "structure"}, files=files, headers=HEADERS
+    )
+    rejected = client.post(
+        "/upload", params={"chunking": "semantic"}, files=files, headers=HEADERS
+    )
+
+    assert response.status_code == 202
+    assert mock_upload.call_args.args[1] == "structure"
+    assert rejected.status_code == 422
+
+
+def test_upload_file_too_large(mock_file_service, upload_dir, monkeypatch):
+    mock_upload, _ = mock_file_service
+    monkeypatch.setattr(file_service, "MAX_UPLOAD_BYTES", 4)
+
+    files = {"file": ("test.txt", b"test content", "text/plain")}
+    response = client.post("/upload", files=files, headers=HEADERS)
+
+    assert response.status_code == 413
+    mock_upload.assert_not_called()
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_upload_without_file_is_rejected(mock_file_service):
+    response = client.post("/upload", data={"note": "x"}, headers=HEADERS)
+    assert response.status_code == 400
+
+
+def test_update_file():
+    job = {
+        "job_id": "update-job-id",
+        "filename": "v2.pdf",
+        "status": "queued",
+        "file_id": "test-file-id",
+        "created_at": "2023-01-01T00:00:00",
+        "updated_at": "2023-01-01T00:00:00",
+    }
+    with patch("main.handle_update_file", return_value=job) as mock_update:
+        files = {"file": ("v2.pdf", b"new content", "application/pdf")}
+        response = client.put("/files/test-file-id", files=files, headers=HEADERS)
+
+    assert response.status_code == 202
+    assert response.json()["file_id"] == "test-file-id"
+    assert mock_update.call_args.args[0] == "test-file-id"
+
+
+def test_update_file_not_found():
+    with patch("main.handle_update_file", return_value=None):
+        files = {"file": ("v2.pdf", b"new content", "application/pdf")}
+        response = client.put("/files/missing", files=files, headers=HEADERS)
+    assert response.status_code == 404
+
+
+def test_get_job():
+    with patch("main.get_job_status") as mock_get_job:
+        mock_get_job.return_value = {
+            "job_id": "test-job-id",
+            "filename": "test.txt",
+            "status": "running",
+            "stage": "propositions",
+            "progress": {
+                "parse": {"done": 1, "total": 1, "seconds": 0.2, "finished": True},
+                "propositions": {
+                    "done": 3,
+                    "total": 8,
+                    "seconds": 4.1,
+                    "finished": False,
+                },
+            },
+            "file_id": "test-file-id",
+            "error": None,
+            "created_at": "2023-01-01T00:00:00",
+            "updated_at": "2023-01-01T00:00:05",
+        }
+        response = client.get("/jobs/test-job-id", headers=HEADERS)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["stage"] == "propositions"
+    assert data["progress"]["propositions"]["done"] == 3
+    mock_get_job.assert_called_once_with("test-job-id")
+
+
+def test_get_job_not_found():
+    with patch("main.get_job_status", return_value=None):
+        response = client.get("/jobs/missing", headers=HEADERS)
+    assert response.status_code == 404
+
+
+def test_get_job_unauthorized():
+    response = client.get("/jobs/test-job-id")
+    assert response.status_code == 403
 
 
 def test_upload_file_unauthorized():
@@ -150,3 +288,41 @@ def test_chat_unauthorized():
     payload = {"question": "Hello?", "history": []}
     response = client.post("/chat", json=payload)
     assert response.status_code == 403
+
+
+def test_healthz_needs_no_key():
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_readyz_reports_failing_checks():
+    warm = {"ollama": True, "models_warm": True}
+    cold = {"ollama": True, "models_warm": False}
+    with (
+        patch("main.vector_store_ready", return_value=True),
+        patch("main.ollama_status", side_effect=[warm, cold]),
+    ):
+        ready = client.get("/readyz")
+        not_ready = client.get("/readyz")
+
+    assert ready.status_code == 200
+    assert ready.json()["status"] == "ready"
+    assert not_ready.status_code == 503
+    assert not_ready.json()["checks"]["models_warm"] is False
+
+
+def test_startup_does_not_wait_for_model_warm_up():
+    loaded = threading.Event()
+
+    def slow_warm_up():
+        loaded.wait(5)
+
+    with (
+        patch("ollama_clients.warm_up_models", side_effect=slow_warm_up),
+        patch("main.resume_pending_jobs"),
+        TestClient(app) as live,
+    ):
+        # Liveness answers while the models are still loading.
+        assert live.get("/healthz").status_code == 200
+        loaded.set()
@@ -0,0 +1,83 @@
+import importlib.util
+import os
+import sys
+from unittest.mock import patch
+
+import httpx
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+
+from main import app
+
+SCRIPTS = os.path.join(os.path.dirname(__file__), "..", "scripts")
+
+
+def load_script(name):
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(SCRIPTS, f"{name}.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+fake_ollama = load_script("fake_ollama")
+benchmark_chat = load_script("benchmark_chat")
+
+
+def test_fake_ollama_serves_chat_and_embeddings():
+    fake = fake_ollama.FakeOllama(answer_tokens=5, embedding_dim=16)
+    server = fake_ollama.FakeOllamaServer(fake).start()
+    try:
+        llm = ChatOllama(base_url=server.url, model="fake")
+        streamed = [chunk.content for chunk in llm.stream("annual leave days")]
+        propositions = llm.invoke(
+            [
+                ("system", "Decompose the text into standalone propositions."),
+                ("human", "Leave is 14 days. Claims need receipts."),
+            ]
+        )
+        vectors = OllamaEmbeddings(base_url=server.url, model="fake").embed_documents(
+            ["annual leave", "annual leave"]
+        )
+    finally:
+        server.stop()
+
+    assert "".join(streamed) == "annual leave days annual leave"
+    assert propositions.content == "- Leave is 14 days.\n- Claims need receipts."
+    assert len(vectors[0]) == 16 and vectors[0] == vectors[1]
+    assert fake.calls == {"answer": 1, "propositions": 1, "embed": 1}
+
+
+async def test_run_load_reports_streaming_percentiles():
+    async def fake_stream(question, history):
+        yield "Fourteen "
+        yield "days."
+
+    transport = httpx.ASGITransport(app=app)
+    with patch("main.handle_streaming_chat", side_effect=fake_stream):
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://test",
+            headers={"X-API-Key": "default-secret-key"},
+        ) as client:
+            summary = await benchmark_chat.run_load(
+                client, "stream", ["Leave?", "Notice?"], requests=6, concurrency=3
+            )
+
+    assert summary["requests"] == 6 and summary["errors"] == 0
+    assert set(summary["latency_ms"]) == {"p50", "p95", "p99", "mean"}
+    assert summary["ttft_ms"]["p50"] <= summary["latency_ms"]["p50"]
+    assert summary["chunks_per_s"] > 0
+
+
+async def test_run_load_counts_errors_in_open_loop():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        summary = await benchmark_chat.run_load(
+            client, "blocking", ["Leave?"], requests=3, concurrency=2, rate=100.0
+        )
+
+    # Without an API key every request is rejected.
+    assert summary["errors"] == 3
+    assert summary["latency_ms"] is None
@@ -0,0 +1,60 @@
+import argparse
+import importlib.util
+import os
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "..", "scripts", "benchmark_ingest.py")
+spec = importlib.util.spec_from_file_location("benchmark_ingest", SCRIPT)
+benchmark_ingest = importlib.util.module_from_spec(spec)
+sys.modules["benchmark_ingest"] = benchmark_ingest  # the corpus process imports it
+spec.loader.exec_module(benchmark_ingest)
+
+
+def test_synthetic_documents_are_deterministic():
+    first = benchmark_ingest.synthetic_document(3, words=200)
+
+    assert first == benchmark_ingest.synthetic_document(3, words=200)
+    assert first != benchmark_ingest.synthetic_document(4, words=200)
+    assert first.startswith("# Policy Handbook 3\n\n## Section 1")
+    assert len(first.split()) >= 200
+
+
+def make_args(chunking="agentic"):
+    return argparse.Namespace(
+        sizes="1",
+        doc_words=120,
+        llm_concurrency=2,
+        chunking=chunking,
+        llm_latency=0.0,
+        llm_tokens_per_second=0.0,
+        answer_tokens=8,
+        embedding_dim=16,
+        embed_latency=0.0,
+    )
+
+
+def test_benchmark_runs_pipeline_offline():
+    (row,) = benchmark_ingest.run_benchmark(make_args())
+
+    assert row["documents"] == 1 and row["chunks"] >= 1
+    # One extraction call per slice plus one title per chunk.
+    assert row["calls"]["propositions"] == 1
+    assert row["calls"]["title"] == row["chunks"]
+    assert row["llm_calls_per_doc"] == 1 + row["chunks"]
+    assert set(row["stage_seconds"]) == {
+        "parse",
+        "propositions",
+        "titles",
+        "embed",
+        "upsert",
+    }
+    assert row["peak_rss_mb"] > 0
+
+
+def test_structure_chunking_makes_no_llm_calls():
+    (row,) = benchmark_ingest.run_benchmark(make_args("structure"))
+
+    assert row["chunks"] >= 2
+    assert row["llm_calls"] == 0
+    assert row["calls"]["embed"] >= 1
+    assert set(row["stage_seconds"]) == {"parse", "embed", "upsert"}
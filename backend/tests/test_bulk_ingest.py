@@ -0,0 +1,73 @@
+import argparse
+import importlib.util
+import os
+import sys
+
+import pytest
+
+import database
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "..", "scripts", "bulk_ingest.py")
+spec = importlib.util.spec_from_file_location("bulk_ingest", SCRIPT)
+bulk_ingest = importlib.util.module_from_spec(spec)
+sys.modules["bulk_ingest"] = bulk_ingest  # lets the parse pool pickle its function
+spec.loader.exec_module(bulk_ingest)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "metadata.db"))
+    docs = tmp_path / "docs"
+    (docs / "finance").mkdir(parents=True)
+    (docs / "leave.txt").write_text("Annual leave is 14 days.")
+    (docs / "finance" / "claims.txt").write_text("Claims need receipts.")
+    (docs / "notes.bin").write_bytes(b"\x00")
+    return tmp_path
+
+
+def make_args(corpus):
+    return argparse.Namespace(
+        directory=str(corpus / "docs"),
+        workers=2,
+        parse_workers=1,
+        llm_concurrency=4,
+        extensions=".txt",
+        checkpoint=str(corpus / "checkpoint.jsonl"),
+        chunking=None,
+    )
+
+
+def test_bulk_ingest_resumes_from_checkpoint(corpus, monkeypatch):
+    calls = []
+
+    def fake_index(
+        markdown, filename, file_id, progress, replace, max_concurrency, chunking
+    ):
+        calls.append(filename)
+        if filename == "claims.txt" and calls.count(filename) == 1:
+            raise RuntimeError("Ollama unavailable")
+        progress.start("upsert", 3)
+        progress.finish("upsert")
+        assert replace and max_concurrency == 2 and chunking is None
+        return file_id
+
+    monkeypatch.setattr(bulk_ingest, "index_markdown", fake_index)
+
+    results, _ = bulk_ingest.run(make_args(corpus))
+    assert sorted(entry["status"] for entry in results) == ["failed", "indexed"]
+    assert len(database.list_files_metadata()[0]) == 1
+
+    # The second run only retries the failed file.
+    results, stages = bulk_ingest.run(make_args(corpus))
+    assert [(entry["status"], entry["chunks"]) for entry in results] == [("indexed", 3)]
+    assert sorted(calls) == ["claims.txt", "claims.txt", "leave.txt"]
+    assert set(stages) >= {"parse", "upsert"}
+
+    files = database.list_files_metadata()[0]
+    assert sorted(f["filename"] for f in files) == ["claims.txt", "leave.txt"]
+    leave = next(f for f in files if f["filename"] == "leave.txt")
+    sha256 = bulk_ingest.file_sha256(str(corpus / "docs" / "leave.txt"))
+    assert leave["file_id"] == str(
+        bulk_ingest.uuid.uuid5(bulk_ingest.FILE_ID_NAMESPACE, sha256)
+    )
+    assert database.get_corpus_version() == 2
@@ -0,0 +1,107 @@
+import itertools
+from unittest.mock import MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+import cache
+from cache import CachedEmbeddings
+
+
+@pytest.fixture
+def underlying():
+    mock = MagicMock()
+    mock.embed_documents.side_effect = lambda texts: [
+        [float(len(t)), 0.5] for t in texts
+    ]
+    mock.embed_query.side_effect = lambda text: [float(len(text)), 1.0]
+    return mock
+
+
+def test_embed_documents_persists_across_instances(tmp_path, underlying):
+    db_path = str(tmp_path / "cache.db")
+    cached = CachedEmbeddings(underlying, "nomic-embed-text", db_path=db_path)
+
+    assert cached.embed_documents(["ab", "abc", "ab"]) == [
+        [2.0, 0.5],
+        [3.0, 0.5],
+        [2.0, 0.5],
+    ]
+    underlying.embed_documents.assert_called_once_with(["ab", "abc"])
+
+    # A new process (fresh instance) reuses the stored vectors.
+    reopened = CachedEmbeddings(underlying, "nomic-embed-text", db_path=db_path)
+    assert reopened.embed_documents(["abc", "abcd"]) == [[3.0, 0.5], [4.0, 0.5]]
+    underlying.embed_documents.assert_called_with(["abcd"])
+    assert reopened.stats()["document_hits"] == 1
+    assert reopened.stats()["document_misses"] == 1
+
+
+def test_embed_documents_keyed_by_model(tmp_path, underlying):
+    db_path = str(tmp_path / "cache.db")
+    CachedEmbeddings(underlying, "model-a", db_path=db_path).embed_documents(["x"])
+    CachedEmbeddings(underlying, "model-b", db_path=db_path).embed_documents(["x"])
+
+    assert underlying.embed_documents.call_count == 2
+
+
+def test_document_tier_evicts_least_recently_used(tmp_path, underlying, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(cache.time, "time", lambda: next(clock))
+    cached = CachedEmbeddings(
+        underlying, "nomic", db_path=str(tmp_path / "cache.db"), document_cache_size=2
+    )
+
+    cached.embed_documents(["a", "bb"])
+    cached.embed_documents(["a"])  # "bb" is now the least recently used
+    cached.embed_documents(["ccc"])
+    underlying.embed_documents.reset_mock()
+    cached.embed_documents(["a", "bb", "ccc"])
+
+    underlying.embed_documents.assert_called_once_with(["bb"])
+
+
+def test_cache_lookups_are_exported_as_metrics(tmp_path, underlying):
+    def count(tier, result):
+        labels = {"tier": tier, "result": result}
+        return REGISTRY.get_sample_value("embedding_cache_requests_total", labels) or 0
+
+    before = {key: count(*key) for key in [("query", "hit"), ("document", "miss")]}
+    cached = CachedEmbeddings(underlying, "nomic", db_path=str(tmp_path / "cache.db"))
+    cached.embed_query("q")
+    cached.embed_query("q")
+    cached.embed_documents(["x", "y"])
+
+    assert count("query", "hit") == before[("query", "hit")] + 1
+    assert count("document", "miss") == before[("document", "miss")] + 2
+
+
+def test_embed_query_uses_lru(tmp_path, underlying):
+    cached = CachedEmbeddings(
+        underlying, "nomic", db_path=str(tmp_path / "cache.db"), query_cache_size=2
+    )
+
+    cached.embed_query("a")
+    cached.embed_query("a")
+    cached.embed_query("bb")
+    cached.embed_query("ccc")  # evicts "a"
+    cached.embed_query("a")
+
+    assert underlying.embed_query.call_count == 4
+    assert cached.stats()["query_hits"] == 1
+    assert cached.stats()["query_misses"] == 4
+
+
+async def test_aembed_query_uses_lru(tmp_path, underlying):
+    async def aembed_query(text):
+        return [9.0]
+
+    underlying.aembed_query.side_effect = aembed_query
+    cached = CachedEmbeddings(underlying, "nomic", db_path=str(tmp_path / "cache.db"))
+
+    assert await cached.aembed_query("q") == [9.0]
+    assert await cached.aembed_query("q") == [9.0]
+    assert cached.embed_query("q") == [9.0]
+
+    underlying.aembed_query.assert_called_once_with("q")
+    underlying.embed_query.assert_not_called()
@@ -0,0 +1,109 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from cache import AnswerCache
+from llm_scheduler import Priority, SchedulerSaturated
+from services import chat_service
+
+
+@pytest.fixture
+def answer_cache(monkeypatch):
+    cache = AnswerCache(max_size=8)
+    monkeypatch.setattr(chat_service, "answer_cache", cache)
+    with patch("services.chat_service.get_corpus_version", return_value=1) as version:
+        yield cache, version
+
+
+@pytest.fixture
+def fake_rag():
+    calls = {"stream": 0, "blocking": 0}
+
+    async def astream(question, history):
+        calls["stream"] += 1
+        yield "You get "
+        yield "14 days."
+
+    async def achat(question, history):
+        calls["blocking"] += 1
+        return "You get 14 days."
+
+    with (
+        patch("services.chat_service.astream_chat_with_doc", side_effect=astream),
+        patch("services.chat_service.achat_with_doc", side_effect=achat),
+    ):
+        yield calls
+
+
+async def _collect(question, history=()):
+    stream = await chat_service.handle_streaming_chat(question, list(history))
+    return [chunk async for chunk in stream]
+
+
+async def test_streaming_answer_is_cached_and_replayed(answer_cache, fake_rag):
+    first = await _collect("Annual leave?")
+    second = await _collect("  annual LEAVE ")
+
+    assert "".join(first) == "You get 14 days."
+    assert "".join(second) == "You get 14 days."
+    assert len(second) > 1
+    assert fake_rag["stream"] == 1
+
+
+async def test_blocking_and_streaming_share_cache(answer_cache, fake_rag):
+    assert await chat_service.handle_blocking_chat("Annual leave?", []) == (
+        "You get 14 days."
+    )
+    streamed = await _collect("Annual leave?")
+
+    assert "".join(streamed) == "You get 14 days."
+    assert fake_rag == {"stream": 0, "blocking": 1}
+
+
+async def test_requests_with_history_bypass_cache(answer_cache, fake_rag):
+    history = [("user", "Hi"), ("assistant", "Hello")]
+    await chat_service.handle_blocking_chat("Annual leave?", history)
+    await chat_service.handle_blocking_chat("Annual leave?", history)
+
+    assert fake_rag["blocking"] == 2
+    assert answer_cache[0].stats() == {"hits": 0, "misses": 0}
+
+
+async def test_corpus_change_invalidates_answers(answer_cache, fake_rag):
+    _, version = answer_cache
+    await chat_service.handle_blocking_chat("Annual leave?", [])
+    version.return_value = 2
+    await chat_service.handle_blocking_chat("Annual leave?", [])
+
+    assert fake_rag["blocking"] == 2
+
+
+async def test_disabled_cache_always_calls_rag(monkeypatch, fake_rag):
+    monkeypatch.setattr(chat_service, "answer_cache", None)
+    await chat_service.handle_blocking_chat("Annual leave?", [])
+    await chat_service.handle_blocking_chat("Annual leave?", [])
+
+    assert fake_rag["blocking"] == 2
+
+
+async def test_cached_answer_skips_the_scheduler(answer_cache, fake_rag):
+    await _collect("Annual leave?")
+    busy = SchedulerSaturated(Priority.INTERACTIVE, retry_after=3)
+
+    with patch.object(chat_service.scheduler, "check", side_effect=busy):
+        assert "".join(await _collect("Annual leave?")) == "You get 14 days."
+        with pytest.raises(SchedulerSaturated):
+            await _collect("Notice period?")
+
+    assert fake_rag["stream"] == 1
+
+
+async def test_corpus_version_is_read_off_the_event_loop(answer_cache, fake_rag):
+    _, version = answer_cache
+    threads = []
+    version.side_effect = lambda: threads.append(threading.current_thread()) or 1
+
+    await chat_service.handle_blocking_chat("Annual leave?", [])
+
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "metadata.db"))
+    database.initialize_db()
+    for i, name in enumerate(
+        ["leave.pdf", "leave_2024.pdf", "travel.docx", "lea%.txt"]
+    ):
+        database.add_file_metadata(f"f{i}", name, f"2024-01-0{i + 1}T00:00:00")
+    return tmp_path
+
+
+def test_connection_uses_wal_and_is_reused_per_thread(db):
+    conn = database.get_db_connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert database.get_db_connection() is conn
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(database.get_db_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_close_rolls_back_open_transaction(db):
+    conn = database.get_db_connection()
+    conn.execute("DELETE FROM file_metadata")
+    conn.close()
+
+    assert len(database.list_files_metadata()[0]) == 4
+
+
+def test_list_files_paginates_newest_first(db):
+    page, cursor = database.list_files_metadata(limit=3)
+    assert [f["file_id"] for f in page] == ["f3", "f2", "f1"]
+
+    # A file added after the first page does not shift the next one.
+    database.add_file_metadata("f9", "new.pdf", "2024-02-01T00:00:00")
+    page, cursor = database.list_files_metadata(limit=3, cursor=cursor)
+    assert [f["file_id"] for f in page] == ["f0"]
+    assert cursor is None
+
+
+def test_list_files_filters_by_literal_prefix(db):
+    page, _ = database.list_files_metadata(filename_prefix="leave_")
+    assert [f["filename"] for f in page] == ["leave_2024.pdf"]
+
+    page, _ = database.list_files_metadata(filename_prefix="lea%")
+    assert [f["filename"] for f in page] == ["lea%.txt"]
+
+
+def test_list_files_rejects_malformed_cursor(db):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        database.list_files_metadata(cursor="not-a-cursor")
@@ -0,0 +1,148 @@
+import hashlib
+from unittest.mock import patch
+
+import pytest
+from starlette.requests import Request
+
+import database
+from services import file_service
+
+
+@pytest.fixture
+def upload_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "metadata.db"))
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    monkeypatch.setattr(file_service, "UPLOAD_DIR", str(uploads))
+    database.initialize_db()
+    with patch("services.job_service.submit_ingest_job") as mock_submit:
+        yield uploads, mock_submit
+
+
+BOUNDARY = "policy-boundary"
+
+
+def _multipart_request(content: bytes, filename: str, chunk_size: int = 7) -> Request:
+    body = (
+        (
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="note"\r\n\r\n'
+            f"ignored\r\n--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        + content
+        + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+    # Small chunks split the multipart framing across reads.
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def receive():
+        return {
+            "type": "http.request",
+            "body": chunks.pop(0) if chunks else b"",
+            "more_body": bool(chunks),
+        }
+
+    headers = [
+        (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+async def _upload(content: bytes, filename: str = "handbook.pdf"):
+    return await file_service.stage_upload(_multipart_request(content, filename))
+
+
+async def test_upload_queues_job_with_content_hash(upload_env):
+    tmp_path, mock_submit = upload_env
+
+    job = file_service.handle_upload_file(await _upload(b"leave policy"))
+
+    assert job["status"] == "queued"
+    assert len(job["content_hash"]) == 64
+    assert job["file_path"].endswith(".pdf")
+    with open(job["file_path"], "rb") as staged:
+        assert staged.read() == b"leave policy"
+    mock_submit.assert_called_once_with(job["job_id"])
+
+
+async def test_duplicate_upload_while_queued_returns_pending_job(upload_env):
+    tmp_path, mock_submit = upload_env
+
+    first = file_service.handle_upload_file(await _upload(b"leave policy"))
+    second = file_service.handle_upload_file(await _upload(b"leave policy", "copy.pdf"))
+
+    assert second["job_id"] == first["job_id"]
+    mock_submit.assert_called_once()
+    assert [p.name for p in tmp_path.iterdir()] == [f"{first['job_id']}.pdf"]
+
+
+async def test_duplicate_upload_of_indexed_file_skips_ingestion(upload_env):
+    tmp_path, mock_submit = upload_env
+    first = file_service.handle_upload_file(await _upload(b"leave policy"))
+    database.add_file_metadata(
+        "file-1", "handbook.pdf", "2024-01-01T00:00:00", first["content_hash"]
+    )
+    database.update_job(first["job_id"], status="completed", file_id="file-1")
+    mock_submit.reset_mock()
+
+    job = file_service.handle_upload_file(await _upload(b"leave policy", "resent.pdf"))
+
+    assert job["status"] == "completed"
+    assert job["file_id"] == "file-1"
+    assert database.get_job(job["job_id"])["status"] == "completed"
+    mock_submit.assert_not_called()
+    assert len(database.list_files_metadata()[0]) == 1
+
+
+async def test_different_content_is_ingested(upload_env):
+    _, mock_submit = upload_env
+
+    file_service.handle_upload_file(await _upload(b"leave policy"))
+    file_service.handle_upload_file(await _upload(b"travel policy"))
+
+    assert mock_submit.call_count == 2
+
+
+async def test_stage_upload_streams_and_hashes(upload_env):
+    tmp_path, _ = upload_env
+    content = b"%PDF-1.7 " + bytes(range(256)) * 40
+
+    upload = await _upload(content, "../../etc/handbook.pdf")
+
+    assert upload.filename == "handbook.pdf"
+    assert upload.file_path == str(tmp_path / f"{upload.job_id}.pdf")
+    assert upload.size == len(content)
+    assert upload.content_hash == hashlib.sha256(content).hexdigest()
+    with open(upload.file_path, "rb") as staged:
+        assert staged.read() == content
+
+
+async def test_stage_upload_enforces_size_limit(upload_env, monkeypatch):
+    tmp_path, _ = upload_env
+    monkeypatch.setattr(file_service, "MAX_UPLOAD_BYTES", 100)
+
+    with pytest.raises(file_service.UploadTooLargeError):
+        await _upload(b"x" * 101)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_stage_upload_requires_file_field(upload_env):
+    request = _multipart_request(b"", "handbook.pdf")
+    request.scope["headers"][0] = (b"content-type", b"application/json")
+
+    with pytest.raises(file_service.UploadError):
+        await file_service.stage_upload(request)
+
+
+async def test_update_of_unknown_file_discards_upload(upload_env):
+    tmp_path, mock_submit = upload_env
+
+    job = file_service.handle_update_file("missing", await _upload(b"v2"))
+
+    assert job is None
+    mock_submit.assert_not_called()
+    assert list(tmp_path.iterdir()) == []
@@ -1,17 +1,51 @@
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
 
-from ingest import ensure_collection_exists, process_and_index_file
+import ingest
+from ingest import (
+    IngestProgress,
+    StructureChunker,
+    chunking_strategy,
+    drop_collection,
+    ensure_collection_exists,
+    get_vector_store,
+    invalidate_collection_cache,
+    process_and_index_file,
+)
+
+
+def collection_info(size=768, m=16, ef_construct=100, indexed=True):
+    keyword = models.PayloadIndexInfo(
+        data_type=models.PayloadSchemaType.KEYWORD, points=0
+    )
+    return SimpleNamespace(
+        config=SimpleNamespace(
+            params=SimpleNamespace(
+                vectors=models.VectorParams(size=size, distance=models.Distance.COSINE),
+                sparse_vectors=None,
+            ),
+            hnsw_config=SimpleNamespace(m=m, ef_construct=ef_construct),
+            quantization_config=None,
+        ),
+        payload_schema=(
+            dict.fromkeys(ingest.PAYLOAD_INDEX_FIELDS, keyword) if indexed else {}
+        ),
+    )
 
 
 @pytest.fixture
 def mock_langchain():
+    invalidate_collection_cache()
     with (
         patch("ingest.MarkItDown") as mock_markitdown,
         patch("ingest.AgenticChunker") as mock_chunker,
         patch("ingest.QdrantVectorStore") as mock_qdrant,
         patch("ingest.client") as mock_client,
+        patch("ingest.embeddings") as mock_embeddings,
     ):
         # Mock MarkItDown
         mock_result = MagicMock()
@@ -24,6 +58,14 @@ def mock_langchain():
         mock_chunk.metadata = {}
         mock_chunker.return_value.split_documents.return_value = [mock_chunk]
 
+        mock_client.get_collection.return_value = collection_info()
+
+        # Mock Embeddings
+        mock_embeddings.embed_query.return_value = [0.0] * 768
+        mock_embeddings.embed_documents.side_effect = lambda texts: [
+            [0.1, 0.2, 0.3] for _ in texts
+        ]
+
         # Mock Qdrant Vector Store
         mock_vector_store = MagicMock()
         mock_qdrant.return_value = mock_vector_store
@@ -33,9 +75,11 @@ def mock_langchain():
             "chunker": mock_chunker,
             "qdrant": mock_qdrant,
             "client": mock_client,
+            "embeddings": mock_embeddings,
             "vector_store": mock_vector_store,
             "chunk": mock_chunk,
         }
+    invalidate_collection_cache()
 
 
 def test_process_and_index_file_logic(mock_langchain):
@@ -57,13 +101,101 @@ def test_process_and_index_file_logic(mock_langchain):
     assert mocks["chunk"].metadata["filename"] == filename
     assert "upload_date" in mocks["chunk"].metadata
 
-    # Check if documents were added to vector store
-    mocks["vector_store"].add_documents.assert_called_once_with([mocks["chunk"]])
+    # Check if chunks were embedded and upserted with the vector store payload layout
+    mocks["embeddings"].embed_documents.assert_called_once_with(
+        ["This is a test document content."]
+    )
+    mocks["client"].upsert.assert_called_once()
+    points = mocks["client"].upsert.call_args.kwargs["points"]
+    assert len(points) == 1
+    assert points[0].vector == [0.1, 0.2, 0.3]
+    assert points[0].payload["page_content"] == "This is a test document content."
+    assert points[0].payload["metadata"]["file_id"] == file_id
 
     assert isinstance(file_id, str)
     assert len(file_id) > 0
 
 
+HANDBOOK = """Issued by HR.
+
+# Leave
+## Annual Leave
+1. Employees get 14 days.
+2. Up to 5 days carry forward.
+
+```
+# not a heading
+```
+
+## Medical Leave ##
+| Grade | Days |
+|---|---|
+| 1 | 14 |
+"""
+
+
+def test_structure_chunker_uses_heading_paths():
+    chunker = StructureChunker(max_chars=40)
+    doc = ingest.Document(page_content=HANDBOOK, metadata={"source": "hb.docx"})
+
+    chunks = chunker.split_documents([doc])
+
+    titles = [chunk.metadata["section_title"] for chunk in chunks]
+    assert titles[0] == "hb"
+    assert titles[1:] == ["Leave > Annual Leave"] * (len(titles) - 2) + [
+        "Leave > Medical Leave"
+    ]
+    # The long section is split on lines, so clauses stay whole.
+    assert chunks[1].page_content == (
+        "Section: Leave > Annual Leave\n1. Employees get 14 days."
+    )
+    assert any("# not a heading" in chunk.page_content for chunk in chunks)
+    assert all(chunk.metadata["source"] == "hb.docx" for chunk in chunks)
+    assert not chunker.has_structure("Plain text.\n\nNo headings here.")
+
+
+def test_structure_chunking_makes_no_llm_calls(mock_langchain):
+    mocks = mock_langchain
+    mocks["markitdown"].return_value.convert.return_value.text_content = HANDBOOK
+
+    file_id = process_and_index_file("dummy.docx", "hb.docx", chunking="structure")
+
+    mocks["chunker"].assert_not_called()
+    points = mocks["client"].upsert.call_args.kwargs["points"]
+    assert len(points) == 3
+    metadata = points[1].payload["metadata"]
+    assert set(metadata) == {
+        "source",
+        "section_title",
+        "file_id",
+        "filename",
+        "upload_date",
+    }
+    assert metadata["section_title"] == "Leave > Annual Leave"
+    assert metadata["file_id"] == file_id
+    assert (
+        points[1].payload["page_content"].startswith("Section: Leave > Annual Leave\n")
+    )
+
+
+def test_structure_chunking_falls_back_without_headings(mock_langchain):
+    mocks = mock_langchain
+
+    process_and_index_file("dummy.pdf", "test.pdf", chunking="structure")
+
+    mocks["chunker"].return_value.split_documents.assert_called_once()
+
+
+def test_chunking_strategy_per_upload_and_extension(monkeypatch):
+    monkeypatch.setattr(ingest, "_chunking_by_extension", {".docx": "structure"})
+
+    assert chunking_strategy("hb.docx") == "structure"
+    assert chunking_strategy("hb.pdf") == ingest.CHUNKING_STRATEGY
+    assert chunking_strategy("hb.docx", "agentic") == "agentic"
+    with pytest.raises(ValueError):
+        chunking_strategy("hb.pdf", "semantic")
+
+
 def test_ensure_collection_exists_creation(mock_langchain):
     mocks = mock_langchain
     mocks["client"].collection_exists.return_value = False
@@ -80,3 +212,186 @@ def test_ensure_collection_exists_skips_if_exists(mock_langchain):
     ensure_collection_exists()
 
     mocks["client"].create_collection.assert_not_called()
+
+
+def test_ensure_collection_exists_is_memoized(mock_langchain):
+    mocks = mock_langchain
+    mocks["client"].collection_exists.return_value = True
+
+    ensure_collection_exists()
+    ensure_collection_exists()
+    get_vector_store()
+
+    mocks["client"].collection_exists.assert_called_once()
+
+
+def test_get_vector_store_is_shared(mock_langchain):
+    mocks = mock_langchain
+    mocks["client"].collection_exists.return_value = True
+
+    assert get_vector_store() is get_vector_store()
+    mocks["qdrant"].assert_called_once()
+
+
+def test_drop_collection_invalidates_memo(mock_langchain):
+    mocks = mock_langchain
+    mocks["client"].collection_exists.return_value = True
+
+    ensure_collection_exists()
+    drop_collection()
+    mocks["client"].delete_collection.assert_called_once()
+
+    mocks["client"].collection_exists.return_value = False
+    ensure_collection_exists()
+
+    assert mocks["client"].collection_exists.call_count == 2
+    mocks["client"].create_collection.assert_called_once()
+
+
+def test_process_and_index_file_reports_progress(mock_langchain):
+    mocks = mock_langchain
+    progress = MagicMock(spec=IngestProgress)
+
+    file_id = process_and_index_file(
+        "dummy.pdf", "test.pdf", file_id="fixed-id", progress=progress
+    )
+
+    assert file_id == "fixed-id"
+    mocks["chunker"].return_value.split_documents.assert_called_once()
+    assert (
+        mocks["chunker"].return_value.split_documents.call_args.kwargs["progress"]
+        is progress
+    )
+    started = [c.args[0] for c in progress.start.call_args_list]
+    assert started == ["parse", "embed", "upsert"]
+    progress.advance.assert_any_call("embed", 1)
+    progress.advance.assert_any_call("upsert", 1)
+
+
+def test_collection_is_created_from_config(mock_langchain):
+    mocks = mock_langchain
+    mocks["client"].collection_exists.return_value = False
+    mocks["embeddings"].embed_query.return_value = [0.0] * 1024
+
+    ensure_collection_exists()
+
+    kwargs = mocks["client"].create_collection.call_args.kwargs
+    assert kwargs["vectors_config"].size == 1024
+    assert kwargs["hnsw_config"].m == ingest.QDRANT_HNSW_M
+    assert kwargs["hnsw_config"].ef_construct == ingest.QDRANT_HNSW_EF_CONSTRUCT
+    indexed = [
+        c.kwargs["field_name"]
+        for c in mocks["client"].create_payload_index.call_args_list
+    ]
+    assert indexed == ["metadata.file_id", "metadata.filename"]
+
+
+def test_existing_collection_is_migrated_in_place(mock_langchain):
+    mocks = mock_langchain
+    mocks["client"].collection_exists.side_effect = lambda collection_name: (
+        collection_name == "hr_docs"
+    )
+    mocks["client"].get_collection.return_value = collection_info(
+        m=8, ef_construct=64, indexed=False
+    )
+
+    ensure_collection_exists()
+
+    mocks["client"].create_collection.assert_not_called()
+    hnsw = mocks["client"].update_collection.call_args.kwargs["hnsw_config"]
+    assert (hnsw.m, hnsw.ef_construct) == (
+        ingest.QDRANT_HNSW_M,
+        ingest.QDRANT_HNSW_EF_CONSTRUCT,
+    )
+    assert mocks["client"].create_payload_index.call_count == 2
+
+
+def test_scalar_quantization_keeps_originals_on_disk(mock_langchain, monkeypatch):
+    mocks = mock_langchain
+    mocks["client"].collection_exists.return_value = False
+    monkeypatch.setattr(ingest, "QDRANT_QUANTIZATION", "scalar")
+
+    ensure_collection_exists()
+
+    kwargs = mocks["client"].create_collection.call_args.kwargs
+    assert kwargs["vectors_config"].on_disk is True
+    assert kwargs["quantization_config"].scalar.type == models.ScalarType.INT8
+    params = ingest.search_params()
+    assert params.quantization.rescore is True
+    assert params.quantization.oversampling == ingest.QDRANT_OVERSAMPLING
+
+
+def test_quantization_is_enabled_on_existing_collection(mock_langchain, monkeypatch):
+    mocks = mock_langchain
+    mocks["client"].collection_exists.side_effect = lambda collection_name: (
+        collection_name == "hr_docs"
+    )
+    monkeypatch.setattr(ingest, "QDRANT_QUANTIZATION", "binary")
+
+    ensure_collection_exists()
+
+    kwargs = mocks["client"].update_collection.call_args.kwargs
+    assert isinstance(kwargs["quantization_config"], models.BinaryQuantization)
+    assert kwargs["vectors_config"][""].on_disk is True
+
+
+def test_dimension_mismatch_requires_migration(mock_langchain, monkeypatch):
+    monkeypatch.setattr(ingest, "EMBEDDING_DIM", 768)
+    mocks = mock_langchain
+    mocks["client"].collection_exists.side_effect = lambda collection_name: (
+        collection_name == "hr_docs"
+    )
+    mocks["client"].get_collection.return_value = collection_info(size=384)
+
+    with pytest.raises(RuntimeError, match="vector size 384"):
+        ensure_collection_exists()
+
+
+def test_existing_collection_size_is_used_without_a_probe(mock_langchain):
+    mocks = mock_langchain
+    mocks["client"].collection_exists.side_effect = lambda collection_name: (
+        collection_name == "hr_docs"
+    )
+    mocks["client"].get_collection.return_value = collection_info(size=384)
+
+    ensure_collection_exists()
+
+    assert ingest.embedding_dimension() == 384
+    mocks["embeddings"].embed_query.assert_not_called()
+
+
+def test_auto_migrate_rebuilds_with_reembedded_points(monkeypatch):
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        collection_name="hr_docs",
+        vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE),
+    )
+    client.upsert(
+        collection_name="hr_docs",
+        points=[
+            models.PointStruct(
+                id=1,
+                vector=[0.1, 0.2, 0.3, 0.4],
+                payload={"page_content": "Leave policy", "metadata": {"file_id": "f1"}},
+            )
+        ],
+    )
+    fake_embeddings = MagicMock()
+    fake_embeddings.embed_query.return_value = [0.5] * 8
+    fake_embeddings.embed_documents.side_effect = lambda texts: [[0.5] * 8] * len(texts)
+    monkeypatch.setattr(ingest, "client", client)
+    monkeypatch.setattr(ingest, "embeddings", fake_embeddings)
+    monkeypatch.setattr(ingest, "QDRANT_AUTO_MIGRATE", True)
+    invalidate_collection_cache()
+    try:
+        ensure_collection_exists()
+
+        info = client.get_collection("hr_docs")
+        assert info.config.params.vectors.size == 8
+        assert not client.collection_exists(ingest.REBUILD_COLLECTION_NAME)
+        (point,) = client.retrieve("hr_docs", ids=[1], with_vectors=True)
+        assert point.payload["metadata"]["file_id"] == "f1"
+        assert len(point.vector) == 8
+        fake_embeddings.embed_documents.assert_called_once_with(["Leave policy"])
+    finally:
+        invalidate_collection_cache()
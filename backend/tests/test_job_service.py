@@ -0,0 +1,210 @@
+import os
+import sqlite3
+import time
+from unittest.mock import patch
+
+import pytest
+
+import database
+from services import job_service
+
+
+@pytest.fixture
+def job_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "metadata.db"))
+    database.initialize_db()
+    return tmp_path
+
+
+def _stage_file(directory, name="job-1.txt"):
+    path = directory / name
+    path.write_text("Annual leave is 14 days.")
+    return str(path)
+
+
+def test_run_ingest_job_completes(job_db):
+    file_path = _stage_file(job_db)
+    database.add_job("job-1", "handbook.txt", file_path, chunking="structure")
+
+    def fake_process(
+        path, filename, file_id=None, progress=None, replace=False, chunking=None
+    ):
+        assert chunking == "structure"
+        progress.start("parse", 1)
+        progress.advance("parse")
+        progress.finish("parse")
+        return file_id
+
+    with patch("services.job_service.process_and_index_file", side_effect=fake_process):
+        job_service.run_ingest_job("job-1")
+
+    job = database.get_job("job-1")
+    assert job["status"] == "completed"
+    assert job["progress"]["parse"]["done"] == 1
+    assert job["progress"]["parse"]["finished"] is True
+    files = database.list_files_metadata()[0]
+    assert [f["file_id"] for f in files] == [job["file_id"]]
+    assert not os.path.exists(file_path)
+
+
+def test_run_ingest_job_records_failure(job_db):
+    file_path = _stage_file(job_db)
+    database.add_job("job-1", "handbook.txt", file_path)
+
+    with (
+        patch(
+            "services.job_service.process_and_index_file",
+            side_effect=RuntimeError("Ollama unreachable"),
+        ),
+        patch("services.job_service.delete_file_from_index") as mock_delete,
+    ):
+        job_service.run_ingest_job("job-1")
+
+    job = database.get_job("job-1")
+    assert job["status"] == "failed"
+    assert job["error"] == "Ollama unreachable"
+    mock_delete.assert_called_once_with(job["file_id"])
+    assert database.list_files_metadata()[0] == []
+
+
+def test_resume_pending_jobs(job_db):
+    database.add_job("job-1", "handbook.txt", _stage_file(job_db))
+    database.add_job("job-2", "gone.txt", str(job_db / "missing.txt"))
+    database.update_job("job-1", status="running", file_id="file-1")
+
+    with patch("services.job_service.submit_ingest_job") as mock_submit:
+        assert job_service.resume_pending_jobs() == 1
+
+    mock_submit.assert_called_once_with("job-1")
+    assert database.get_job("job-2")["status"] == "failed"
+
+
+def test_resumed_job_clears_partial_index(job_db):
+    database.add_job("job-1", "handbook.txt", _stage_file(job_db))
+    database.update_job("job-1", status="running", file_id="file-1")
+
+    with patch("services.job_service.process_and_index_file") as mock_process:
+        job_service.run_ingest_job("job-1")
+
+    assert mock_process.call_args.kwargs["file_id"] == "file-1"
+    assert mock_process.call_args.kwargs["replace"] is True
+    assert database.get_job("job-1")["status"] == "completed"
+
+
+def test_update_job_replaces_chunks_and_metadata(job_db):
+    database.add_file_metadata("file-1", "v1.pdf", "2024-01-01T00:00:00", "old-hash")
+    database.add_job(
+        "job-1",
+        "v2.pdf",
+        _stage_file(job_db),
+        content_hash="new-hash",
+        operation="update",
+        file_id="file-1",
+    )
+
+    with patch("services.job_service.process_and_index_file") as mock_process:
+        job_service.run_ingest_job("job-1")
+
+    assert mock_process.call_args.kwargs["replace"] is True
+    record = database.get_file_metadata("file-1")
+    assert record["filename"] == "v2.pdf"
+    assert record["content_hash"] == "new-hash"
+    assert len(database.list_files_metadata()[0]) == 1
+
+
+def test_failed_update_keeps_existing_index(job_db):
+    database.add_file_metadata("file-1", "v1.pdf", "2024-01-01T00:00:00", "old-hash")
+    database.add_job(
+        "job-1", "v2.pdf", _stage_file(job_db), operation="update", file_id="file-1"
+    )
+
+    with (
+        patch(
+            "services.job_service.process_and_index_file",
+            side_effect=RuntimeError("boom"),
+        ),
+        patch("services.job_service.delete_file_from_index") as mock_delete,
+    ):
+        job_service.run_ingest_job("job-1")
+
+    assert database.get_job("job-1")["status"] == "failed"
+    mock_delete.assert_not_called()
+    assert database.get_file_metadata("file-1")["filename"] == "v1.pdf"
+
+
+def test_completed_job_bumps_corpus_version(job_db):
+    database.add_job("job-1", "handbook.txt", _stage_file(job_db))
+    before = database.get_corpus_version()
+
+    with patch("services.job_service.process_and_index_file"):
+        job_service.run_ingest_job("job-1")
+
+    assert database.get_corpus_version() == before + 1
+
+
+def test_resume_skips_jobs_leased_by_a_live_worker(job_db):
+    database.add_job(
+        "job-1", "handbook.txt", _stage_file(job_db),
+        owner="other", lease_until=time.time() + 60,
+    )
+    database.add_job(
+        "job-2", "policy.txt", _stage_file(job_db, "job-2.txt"),
+        owner="dead", lease_until=time.time() - 1,
+    )
+
+    with patch("services.job_service.submit_ingest_job") as mock_submit:
+        assert job_service.resume_pending_jobs() == 1
+        # A second sweep finds nothing left to adopt.
+        assert job_service.resume_pending_jobs() == 0
+
+    mock_submit.assert_called_once_with("job-2")
+    assert database.get_job("job-1")["owner"] == "other"
+    assert database.get_job("job-2")["owner"] == job_service.WORKER_ID
+
+
+def test_job_claimed_by_another_worker_is_not_run(job_db):
+    file_path = _stage_file(job_db)
+    database.add_job(
+        "job-1", "handbook.txt", file_path, owner="other", lease_until=time.time() + 60
+    )
+
+    with patch("services.job_service.process_and_index_file") as mock_process:
+        job_service.run_ingest_job("job-1")
+
+    mock_process.assert_not_called()
+    assert database.get_job("job-1")["status"] == "queued"
+    assert os.path.exists(file_path)
+
+
+def test_resumed_job_with_recorded_file_finishes_as_replace(job_db):
+    # Interrupted after the file was recorded but before the job completed.
+    database.add_file_metadata("file-1", "handbook.txt", "2024-01-01T00:00:00")
+    database.add_job("job-1", "handbook.txt", _stage_file(job_db), content_hash="h")
+    database.update_job("job-1", status="running", file_id="file-1")
+
+    with (
+        patch("services.job_service.process_and_index_file"),
+        patch("services.job_service.delete_file_from_index") as mock_delete,
+    ):
+        job_service.run_ingest_job("job-1")
+
+    assert database.get_job("job-1")["status"] == "completed"
+    assert database.get_file_metadata("file-1")["content_hash"] == "h"
+    mock_delete.assert_not_called()
+
+
+def test_constraint_failure_keeps_the_index(job_db):
+    database.add_job("job-1", "handbook.txt", _stage_file(job_db))
+
+    with (
+        patch("services.job_service.process_and_index_file"),
+        patch(
+            "services.job_service.add_file_metadata",
+            side_effect=sqlite3.IntegrityError("UNIQUE constraint failed"),
+        ),
+        patch("services.job_service.delete_file_from_index") as mock_delete,
+    ):
+        job_service.run_ingest_job("job-1")
+
+    assert database.get_job("job-1")["status"] == "failed"
+    mock_delete.assert_not_called()
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from llm_scheduler import LLMScheduler, Priority, SchedulerSaturated
+from main import app
+
+HEADERS = {"X-API-Key": "default-secret-key"}
+
+
+def queued(scheduler, priority):
+    return len(scheduler._queues[priority])
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_freed_slot_goes_to_interactive_before_ingest():
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserved=0)
+    order = []
+
+    def call(priority):
+        with scheduler.slot(priority):
+            order.append(priority)
+
+    scheduler.acquire(Priority.INGEST)
+    ingest = threading.Thread(target=call, args=(Priority.INGEST,))
+    ingest.start()
+    wait_for(lambda: queued(scheduler, Priority.INGEST) == 1)
+    chat = threading.Thread(target=call, args=(Priority.INTERACTIVE,))
+    chat.start()
+    wait_for(lambda: queued(scheduler, Priority.INTERACTIVE) == 1)
+
+    scheduler.release(Priority.INGEST)
+    ingest.join(5)
+    chat.join(5)
+
+    assert order == [Priority.INTERACTIVE, Priority.INGEST]
+
+
+def test_ingest_never_takes_reserved_slots():
+    scheduler = LLMScheduler(max_concurrency=2, interactive_reserved=1)
+    scheduler.acquire(Priority.INGEST)
+    blocked = threading.Thread(target=scheduler.acquire, args=(Priority.INGEST,))
+    blocked.start()
+    wait_for(lambda: queued(scheduler, Priority.INGEST) == 1)
+
+    # The reserved slot is still free for chat.
+    scheduler.acquire(Priority.INTERACTIVE)
+    scheduler.release(Priority.INTERACTIVE)
+    assert queued(scheduler, Priority.INGEST) == 1
+
+    scheduler.release(Priority.INGEST)
+    blocked.join(5)
+    assert not blocked.is_alive()
+
+
+@pytest.mark.parametrize("max_concurrency, reserved", [(0, 0), (2, 2), (1, -1)])
+def test_configurations_without_an_ingest_slot_are_rejected(max_concurrency, reserved):
+    with pytest.raises(ValueError, match="LLM_"):
+        LLMScheduler(max_concurrency=max_concurrency, interactive_reserved=reserved)
+
+
+async def test_full_queue_rejects_with_retry_after():
+    scheduler = LLMScheduler(
+        max_concurrency=1,
+        interactive_reserved=0,
+        queue_limits={Priority.INTERACTIVE: 1, Priority.INGEST: 0},
+    )
+    await scheduler.aacquire(Priority.INTERACTIVE)
+    waiting = asyncio.create_task(scheduler.aacquire(Priority.INTERACTIVE))
+    await asyncio.sleep(0)
+
+    with pytest.raises(SchedulerSaturated) as rejected:
+        await scheduler.aacquire(Priority.INTERACTIVE)
+    with pytest.raises(SchedulerSaturated):
+        scheduler.check(Priority.INTERACTIVE)
+
+    assert rejected.value.retry_after >= 1
+    scheduler.release(Priority.INTERACTIVE)
+    await asyncio.wait_for(waiting, 5)
+    scheduler.release(Priority.INTERACTIVE)
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserved=0)
+    await scheduler.aacquire(Priority.INTERACTIVE)
+    waiting = asyncio.create_task(scheduler.aacquire(Priority.INTERACTIVE))
+    await asyncio.sleep(0)
+    assert queued(scheduler, Priority.INTERACTIVE) == 1
+
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    scheduler.release(Priority.INTERACTIVE)
+
+    assert queued(scheduler, Priority.INTERACTIVE) == 0
+    # The slot is free again rather than handed to the cancelled caller.
+    await asyncio.wait_for(scheduler.aacquire(Priority.INTERACTIVE), 1)
+
+
+def test_saturated_chat_returns_429_with_retry_after():
+    client = TestClient(app)
+    busy = SchedulerSaturated(Priority.INTERACTIVE, retry_after=7)
+    payload = {"question": "Leave?", "history": []}
+
+    with patch("services.chat_service.scheduler.check", side_effect=busy):
+        streaming = client.post("/chat", json=payload, headers=HEADERS)
+    with patch("main.handle_blocking_chat", side_effect=busy):
+        blocking = client.post("/chat/blocking", json=payload, headers=HEADERS)
+
+    for response in (streaming, blocking):
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "7"
@@ -0,0 +1,142 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from prometheus_client import REGISTRY
+
+import ingest
+import rag
+from main import app
+from numpy_store import NumpyVectorStore
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def stage_count(stage, metric="rag_stage_seconds"):
+    return sample(f"{metric}_count", stage=stage)
+
+
+async def test_stream_records_ttft_generation_and_tokens_per_second():
+    async def fake_astream(inputs):
+        yield {"context": []}
+        yield {"answer": "You get "}
+        yield {"answer": "14 days."}
+
+    chain = MagicMock()
+    chain.astream.side_effect = fake_astream
+    before = {stage: stage_count(stage) for stage in ("ttft", "generation")}
+    tokens_before = sample("rag_generation_tokens_per_second_count")
+
+    rag.clear_rag_chain_cache()
+    with patch("rag._build_rag_chain", return_value=chain):
+        [t async for t in rag.astream_chat_with_doc("Leave?", [])]
+    rag.clear_rag_chain_cache()
+
+    assert stage_count("ttft") == before["ttft"] + 1
+    assert stage_count("generation") == before["generation"] + 1
+    assert sample("rag_generation_tokens_per_second_count") == tokens_before + 1
+    assert sample("rag_request_seconds_count", mode="stream", outcome="ok") >= 1
+
+
+async def test_stream_closed_early_is_still_recorded():
+    async def fake_astream(inputs):
+        yield {"answer": "You get "}
+        yield {"answer": "14 days."}
+
+    chain = MagicMock()
+    chain.astream.side_effect = fake_astream
+    cancelled = sample("rag_request_seconds_count", mode="stream", outcome="cancelled")
+    generation = stage_count("generation")
+
+    rag.clear_rag_chain_cache()
+    with patch("rag._build_rag_chain", return_value=chain):
+        stream = rag.astream_chat_with_doc("Leave?", [])
+        assert await anext(stream) == "You get "
+        # The client disconnects after the first token.
+        await stream.aclose()
+    rag.clear_rag_chain_cache()
+
+    assert stage_count("generation") == generation + 1
+    assert (
+        sample("rag_request_seconds_count", mode="stream", outcome="cancelled")
+        == cancelled + 1
+    )
+
+
+def test_failed_stream_is_recorded_as_error():
+    chain = MagicMock()
+    chain.stream.side_effect = RuntimeError("Ollama unreachable")
+    errors = sample("rag_request_seconds_count", mode="stream", outcome="error")
+
+    rag.clear_rag_chain_cache()
+    with (
+        patch("rag._build_rag_chain", return_value=chain),
+        pytest.raises(RuntimeError),
+    ):
+        list(rag.stream_chat_with_doc("Leave?", []))
+    rag.clear_rag_chain_cache()
+
+    assert (
+        sample("rag_request_seconds_count", mode="stream", outcome="error")
+        == errors + 1
+    )
+
+
+def test_chain_times_query_rewrite_and_retrieval(tmp_path, monkeypatch):
+    store = NumpyVectorStore(str(tmp_path), DeterministicFakeEmbedding(size=8))
+    store.add_texts(["Annual leave is 14 days."], metadatas=[{"file_id": "f1"}])
+    monkeypatch.setattr(rag, "get_vector_store", lambda: store)
+    monkeypatch.setattr(rag, "hybrid_enabled", lambda: False)
+    monkeypatch.setattr(
+        rag, "llm", FakeListChatModel(responses=["annual leave days", "14 days."])
+    )
+    before = {stage: stage_count(stage) for stage in ("rewrite", "retrieval")}
+
+    rag.clear_rag_chain_cache()
+    answer = rag.chat_with_doc("And annual?", [("user", "How much sick leave?")])
+    rag.clear_rag_chain_cache()
+
+    assert answer == "14 days."
+    assert stage_count("rewrite") == before["rewrite"] + 1
+    assert stage_count("retrieval") == before["retrieval"] + 1
+
+
+def test_index_chunks_times_embed_and_upsert(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(ingest, "NUMPY_STORE_PATH", str(tmp_path))
+    monkeypatch.setattr(ingest, "embeddings", DeterministicFakeEmbedding(size=8))
+    ingest.invalidate_collection_cache()
+    before = {
+        stage: stage_count(stage, "ingest_stage_seconds")
+        for stage in ("embed", "upsert")
+    }
+    try:
+        ingest.index_chunks([Document(page_content="Notice period is one month.")])
+    finally:
+        ingest.invalidate_collection_cache()
+
+    assert stage_count("embed", "ingest_stage_seconds") == before["embed"] + 1
+    assert stage_count("upsert", "ingest_stage_seconds") == before["upsert"] + 1
+
+
+def test_metrics_endpoint_reports_requests_by_route():
+    client = TestClient(app)
+    client.get("/jobs/unknown-job", headers={"X-API-Key": "default-secret-key"})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/jobs/{job_id}",status="404"}'
+    ) in response.text
+    assert 'http_requests_in_progress{method="GET",route="/metrics"} 1.0' in (
+        response.text
+    )
+    assert "rag_stage_seconds" in response.text
@@ -0,0 +1,157 @@
+import os
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import ingest
+from numpy_store import NumpyVectorStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NumpyVectorStore(
+        str(tmp_path / "vectors"), DeterministicFakeEmbedding(size=16)
+    )
+
+
+def test_search_ranks_by_cosine_similarity(store):
+    store.upsert(
+        ["a", "b", "c"],
+        [[1.0, 0.0], [0.6, 0.8], [0.0, 1.0]],
+        ["A", "B", "C"],
+        [{"file_id": "f1"}, {"file_id": "f1"}, {"file_id": "f2"}],
+    )
+
+    results = store.similarity_search_with_score_by_vector([2.0, 0.0], k=2)
+
+    assert [doc.page_content for doc, _ in results] == ["A", "B"]
+    assert results[0][1] == pytest.approx(1.0)
+    assert results[1][1] == pytest.approx(0.6)
+    assert results[0][0].metadata == {"file_id": "f1"}
+
+
+def test_upsert_replaces_points_with_the_same_id(store):
+    store.upsert(["a"], [[1.0, 0.0]], ["old"], [{}])
+    store.upsert(["a"], [[0.0, 1.0]], ["new"], [{}])
+
+    ((doc, score),) = store.similarity_search_with_score_by_vector([0.0, 1.0], k=5)
+
+    assert store.count() == 1
+    assert doc.page_content == "new"
+    assert score == pytest.approx(1.0)
+
+
+def test_delete_by_metadata_and_compaction(store):
+    store.upsert(
+        ["a", "b", "c"],
+        [[1.0, 0.0], [0.6, 0.8], [0.0, 1.0]],
+        ["A", "B", "C"],
+        [{"file_id": "f1"}, {"file_id": "f1"}, {"file_id": "f2"}],
+    )
+
+    assert store.delete_by_metadata("file_id", "f1") == 2
+
+    # Two of three rows are dead, so the vector file was rewritten.
+    files = [name for name in os.listdir(store.path) if name.endswith(".f32")]
+    assert files == ["vectors.1.f32"]
+    results = store.similarity_search_with_score_by_vector([1.0, 0.0], k=5)
+    assert [doc.page_content for doc, _ in results] == ["C"]
+
+
+def test_search_survives_a_concurrent_compaction(store, monkeypatch):
+    store.upsert(
+        ["a", "b", "c"],
+        [[1.0, 0.0], [0.6, 0.8], [0.0, 1.0]],
+        ["A", "B", "C"],
+        [{"file_id": "f1"}, {"file_id": "f1"}, {"file_id": "f2"}],
+    )
+    top = NumpyVectorStore._top
+    calls = []
+
+    def compact_after_scoring(*args):
+        result = top(*args)
+        if not calls:
+            # Renumbers "C" from row 2 to row 0 while the search is scoring.
+            store.delete_by_metadata("file_id", "f1")
+        calls.append(result)
+        return result
+
+    monkeypatch.setattr(NumpyVectorStore, "_top", staticmethod(compact_after_scoring))
+    results = store.similarity_search_with_score_by_vector([0.0, 1.0], k=3)
+
+    assert [doc.page_content for doc, _ in results] == ["C"]
+    assert results[0][1] == pytest.approx(1.0)
+
+
+def test_upserts_append_without_rereading_the_store(store, monkeypatch):
+    store.upsert(["a", "b"], [[1.0, 0.0], [0.0, 1.0]], ["A", "B"], [{}, {}])
+    monkeypatch.setattr(store, "_load", lambda: pytest.fail("store was reloaded"))
+
+    store.upsert(
+        ["c", "a", "c"],
+        [[1.0, 1.0], [0.0, 1.0], [1.0, 0.0]],
+        ["C", "A2", "C2"],
+        [{}, {}, {}],
+    )
+
+    assert store.count() == 3
+    ((doc, _),) = store.similarity_search_with_score_by_vector([1.0, 0.0], k=1)
+    assert doc.page_content == "C2"
+
+
+def test_delete_by_file_id_uses_the_index(store):
+    plan = store._conn.execute(
+        "EXPLAIN QUERY PLAN DELETE FROM points "
+        "WHERE json_extract(metadata, '$.file_id') = ?",
+        ("f1",),
+    ).fetchall()
+
+    assert "idx_points_file_id" in " ".join(str(row) for row in plan)
+    with pytest.raises(ValueError, match="Invalid metadata key"):
+        store.delete_by_metadata("file_id') OR 1=1 --", "f1")
+
+
+def test_store_reopens_from_disk(tmp_path):
+    path = str(tmp_path / "vectors")
+    first = NumpyVectorStore(path, DeterministicFakeEmbedding(size=16))
+    first.add_texts(["leave policy", "travel policy"], ids=["a", "b"])
+
+    reopened = NumpyVectorStore(path, DeterministicFakeEmbedding(size=16))
+
+    assert reopened.count() == 2
+    assert reopened.similarity_search("travel policy", k=1)[0].page_content == (
+        "travel policy"
+    )
+
+
+def test_dimension_mismatch_is_rejected(store):
+    store.upsert(["a"], [[1.0, 0.0]], ["A"], [{}])
+
+    with pytest.raises(ValueError, match="Vector size 3"):
+        store.upsert(["b"], [[1.0, 0.0, 0.0]], ["B"], [{}])
+
+
+def test_ingest_uses_numpy_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(ingest, "NUMPY_STORE_PATH", str(tmp_path / "vectors"))
+    monkeypatch.setattr(ingest, "embeddings", DeterministicFakeEmbedding(size=32))
+    ingest.invalidate_collection_cache()
+    try:
+        ingest.index_chunks(
+            [
+                Document(page_content="Annual leave", metadata={"file_id": "f1"}),
+                Document(page_content="Notice period", metadata={"file_id": "f2"}),
+            ]
+        )
+        store = ingest.get_vector_store()
+        assert isinstance(store, NumpyVectorStore)
+        assert not ingest.hybrid_enabled()
+        results = store.similarity_search("Notice period", k=1)
+        assert results[0].metadata["file_id"] == "f2"
+
+        ingest.delete_file_from_index("f2")
+
+        assert store.count() == 1
+    finally:
+        ingest.invalidate_collection_cache()
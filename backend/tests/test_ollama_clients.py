@@ -0,0 +1,100 @@
+import asyncio
+import os
+import socket
+import sys
+import time
+
+import pytest
+from ollama import Client
+
+import ollama_clients
+from llm_scheduler import Priority
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import fake_ollama  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    server = fake_ollama.FakeOllamaServer(
+        fake_ollama.FakeOllama(answer_tokens=3, embedding_dim=8)
+    ).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def shared_client(monkeypatch, server):
+    client = Client(host=server.url)
+    monkeypatch.setattr(ollama_clients, "_probe_client", lambda timeout: client)
+
+
+def test_models_share_one_client_and_send_keep_alive(server):
+    chat = ollama_clients.get_chat_model(Priority.INTERACTIVE)
+    ingest = ollama_clients.get_chat_model(Priority.INGEST)
+    embeddings = ollama_clients.get_embeddings()
+
+    assert chat._client is ingest._client is embeddings._client
+    assert chat._async_client is embeddings._async_client
+    assert chat.keep_alive == ollama_clients.KEEP_ALIVE
+    assert chat.num_ctx == ollama_clients.OLLAMA_NUM_CTX
+    assert ingest.priority is Priority.INGEST
+
+    pooled = ollama_clients.PooledOllamaEmbeddings(
+        base_url=server.url, model="fake", keep_alive="5m"
+    )
+    assert len(pooled.embed_query("annual leave")) == 8
+    assert server.fake.last_request["/api/embed"]["keep_alive"] == "5m"
+
+
+def test_warm_up_loads_both_models(server, shared_client):
+    assert ollama_clients.ollama_status() == {"ollama": True, "models_warm": False}
+    timings = ollama_clients.warm_up_models()
+
+    load = server.fake.last_request["/api/generate"]
+    assert load["model"] == ollama_clients.CHAT_MODEL
+    assert load["keep_alive"] == ollama_clients.KEEP_ALIVE
+    assert load["options"]["num_ctx"] == ollama_clients.OLLAMA_NUM_CTX
+    assert server.fake.calls == {"load": 1, "embed": 1}
+    assert all(seconds is not None for seconds in timings.values())
+    assert ollama_clients.ollama_status() == {"ollama": True, "models_warm": True}
+
+
+def test_unreachable_ollama_is_not_ready(monkeypatch):
+    # Nothing listens on port 1.
+    client = Client(host="http://127.0.0.1:1")
+    monkeypatch.setattr(ollama_clients, "_probe_client", lambda timeout: client)
+    timings = ollama_clients.warm_up_models()
+
+    assert timings[ollama_clients.CHAT_MODEL] is None
+    assert ollama_clients.ollama_status() == {"ollama": False, "models_warm": False}
+
+
+def test_probe_gives_up_on_a_wedged_ollama(monkeypatch):
+    # Accepts connections but never answers.
+    wedged = socket.create_server(("127.0.0.1", 0))
+    host, port = wedged.getsockname()
+    monkeypatch.setattr(ollama_clients, "OLLAMA_BASE_URL", f"http://{host}:{port}")
+    monkeypatch.setattr(ollama_clients, "OLLAMA_PROBE_TIMEOUT", 0.2)
+    monkeypatch.setattr(ollama_clients, "_probe_clients", {})
+    try:
+        start = time.monotonic()
+        status = ollama_clients.ollama_status()
+    finally:
+        wedged.close()
+
+    assert status == {"ollama": False, "models_warm": False}
+    assert time.monotonic() - start < 5
+
+
+async def test_keep_warm_repeats_until_cancelled(monkeypatch):
+    pings = []
+    monkeypatch.setattr(ollama_clients, "warm_up_models", lambda: pings.append(1))
+
+    task = asyncio.create_task(ollama_clients.keep_models_warm(interval=0.01))
+    while len(pings) < 2:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
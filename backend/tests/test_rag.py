@@ -0,0 +1,220 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+
+import ingest
+import rag
+import tokens
+
+
+@pytest.fixture(autouse=True)
+def clear_chains():
+    rag.clear_rag_chain_cache()
+    yield
+    rag.clear_rag_chain_cache()
+
+
+def test_get_rag_chain_is_cached_per_k():
+    with patch("rag._build_rag_chain", side_effect=lambda k: MagicMock(k=k)) as build:
+        first = rag.get_rag_chain(k_value=4)
+        second = rag.get_rag_chain(k_value=4)
+        other = rag.get_rag_chain(k_value=2)
+
+    assert first is second
+    assert other is not first
+    assert build.call_count == 2
+
+
+def test_dropping_the_collection_clears_cached_chains(monkeypatch):
+    monkeypatch.setattr(ingest, "VECTOR_BACKEND", "qdrant-local")
+    monkeypatch.setattr(ingest, "client", MagicMock())
+    with patch("rag._build_rag_chain", side_effect=lambda k: MagicMock(k=k)) as build:
+        first = rag.get_rag_chain(k_value=4)
+        ingest.drop_collection()
+        second = rag.get_rag_chain(k_value=4)
+        ingest.invalidate_collection_cache()
+        third = rag.get_rag_chain(k_value=4)
+
+    assert first is not second
+    assert second is not third
+    assert build.call_count == 3
+
+
+def test_chat_with_doc_reuses_chain():
+    chain = MagicMock()
+    chain.invoke.return_value = {"answer": "Ten days."}
+    with patch("rag._build_rag_chain", return_value=chain) as build:
+        assert rag.chat_with_doc("Leave?", []) == "Ten days."
+        assert rag.chat_with_doc("Leave?", []) == "Ten days."
+
+    build.assert_called_once_with(rag.RETRIEVAL_CANDIDATES)
+
+
+async def test_astream_chat_with_doc_uses_async_stream():
+    async def fake_astream(inputs):
+        yield {"input": inputs["input"]}
+        yield {"context": []}
+        yield {"answer": "You get "}
+        yield {"answer": "14 days."}
+
+    chain = MagicMock()
+    chain.astream.side_effect = fake_astream
+    with patch("rag._build_rag_chain", return_value=chain):
+        tokens = [t async for t in rag.astream_chat_with_doc("Leave?", [])]
+
+    assert tokens == ["You get ", "14 days."]
+    chain.stream.assert_not_called()
+
+
+async def test_achat_with_doc_uses_ainvoke():
+    chain = MagicMock()
+
+    async def fake_ainvoke(inputs):
+        return {"answer": "Submit it 7 days ahead."}
+
+    chain.ainvoke.side_effect = fake_ainvoke
+    with patch("rag._build_rag_chain", return_value=chain):
+        answer = await rag.achat_with_doc("Leave notice?", [])
+
+    assert answer == "Submit it 7 days ahead."
+    chain.invoke.assert_not_called()
+
+
+async def test_async_paths_build_the_chain_off_the_event_loop():
+    built_on = []
+    chain = MagicMock()
+
+    async def fake_ainvoke(inputs):
+        return {"answer": "Ten days."}
+
+    def build(k):
+        built_on.append(threading.current_thread())
+        return chain
+
+    chain.ainvoke.side_effect = fake_ainvoke
+    with patch("rag._build_rag_chain", side_effect=build):
+        await rag.achat_with_doc("Leave?", [])
+        await rag.achat_with_doc("Leave?", [])
+
+    assert len(built_on) == 1
+    assert built_on[0] is not threading.main_thread()
+
+
+@pytest.fixture
+def word_counter(monkeypatch):
+    """Counts one token per whitespace-separated word."""
+    counter = lambda text: len(text.split())  # noqa: E731
+    monkeypatch.setattr(rag, "get_token_counter", lambda: counter)
+    return counter
+
+
+def _doc(text, score):
+    return Document(page_content=text, metadata={"score": score})
+
+
+def test_pack_context_fills_budget_by_score(word_counter):
+    docs = [
+        _doc("low score chunk", 0.5),
+        _doc("best chunk with five words", 0.9),
+        _doc("second best chunk is long here", 0.8),
+        _doc("tiny", 0.6),
+    ]
+
+    packed = rag.pack_context(docs, budget=9)
+
+    # The 6-word chunk does not fit after the 5-word one; smaller ones still do.
+    assert [d.page_content for d in packed] == [
+        "best chunk with five words",
+        "tiny",
+        "low score chunk",
+    ]
+
+
+def test_pack_context_applies_score_floor(word_counter):
+    docs = [_doc("relevant", 0.7), _doc("noise", 0.1)]
+
+    packed = rag.pack_context(docs, budget=100, score_floor=0.3)
+
+    assert [d.page_content for d in packed] == ["relevant"]
+
+
+def test_trim_history_keeps_most_recent(word_counter):
+    history = [
+        HumanMessage(content="one two three"),
+        AIMessage(content="four five"),
+        HumanMessage(content="six"),
+    ]
+
+    trimmed, used = rag.trim_history(history, budget=3)
+
+    assert [m.content for m in trimmed] == ["four five", "six"]
+    assert used == 3
+
+
+def test_prepare_chat_inputs_gives_remaining_budget_to_context(
+    word_counter, monkeypatch
+):
+    monkeypatch.setattr(rag, "CONTEXT_TOKEN_BUDGET", 100)
+    monkeypatch.setattr(rag, "HISTORY_TOKEN_BUDGET", 4)
+
+    inputs = rag._prepare_chat_inputs(
+        [("user", "an old long question"), ("assistant", "short answer")]
+    )
+
+    assert [m.content for m in inputs["chat_history"]] == ["short answer"]
+    assert inputs["context_budget"] == 98
+
+
+def test_token_counter_uses_configured_tokenizer(tmp_path, monkeypatch):
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+
+    tokenizer = Tokenizer(WordLevel({"annual": 0, "leave": 1, "[UNK]": 2}, "[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    path = tmp_path / "tokenizer.json"
+    tokenizer.save(str(path))
+
+    monkeypatch.setattr(tokens, "CHAT_TOKENIZER_PATH", str(path))
+    tokens.get_token_counter.cache_clear()
+    try:
+        assert tokens.get_token_counter()("annual leave, please") == 4
+    finally:
+        tokens.get_token_counter.cache_clear()
+
+
+def test_token_counter_finds_the_chat_models_tokenizer(tmp_path, monkeypatch):
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+
+    snapshot = (
+        tmp_path / "models--meta-llama--Meta-Llama-3-8B-Instruct" / "snapshots" / "abc"
+    )
+    snapshot.mkdir(parents=True)
+    tokenizer = Tokenizer(WordLevel({"leave": 0, "[UNK]": 1}, "[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    tokenizer.save(str(snapshot / "tokenizer.json"))
+
+    monkeypatch.setenv("HF_HUB_CACHE", str(tmp_path))
+    monkeypatch.setattr(tokens, "CHAT_TOKENIZER_PATH", "")
+    monkeypatch.setattr(tokens, "CHAT_MODEL", "llama3:8b")
+    tokens.get_token_counter.cache_clear()
+    try:
+        assert tokens.get_token_counter()("annual leave") == 2
+    finally:
+        tokens.get_token_counter.cache_clear()
+
+
+def test_token_counter_falls_back_to_estimate(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv("HF_HUB_CACHE", str(tmp_path))
+    monkeypatch.setattr(tokens, "CHAT_TOKENIZER_PATH", "")
+    tokens.get_token_counter.cache_clear()
+    try:
+        assert tokens.get_token_counter()("x" * 40) == 10
+        assert "No tokenizer found" in caplog.text
+    finally:
+        tokens.get_token_counter.cache_clear()
@@ -0,0 +1,75 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from qdrant_client import QdrantClient
+
+import ingest
+from sparse import BM25SparseEmbeddings, tokenize
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What is the Cooling-Period?") == ["cooling", "period"]
+
+
+def test_document_weights_saturate_and_normalize_by_length():
+    encoder = BM25SparseEmbeddings(avg_doc_len=4)
+    once, repeated, long_doc = encoder.embed_documents(
+        ["leave", "leave leave leave", "leave " + "policy " * 20]
+    )
+    idx = once.indices[0]
+
+    assert repeated.indices == [idx]
+    assert once.values[0] < repeated.values[0] < 1.2 + 1
+    # The same single occurrence weighs less in a much longer document.
+    assert long_doc.values[long_doc.indices.index(idx)] < once.values[0]
+
+
+def test_query_terms_are_binary_and_match_document_indices():
+    encoder = BM25SparseEmbeddings()
+    query = encoder.embed_query("headcount requisition headcount")
+    doc = encoder.embed_documents(["All headcount requisitions need approval."])[0]
+
+    assert query.values == [1.0, 1.0]
+    assert set(query.indices) & set(doc.indices)
+
+
+def test_hybrid_collection_round_trip(monkeypatch):
+    monkeypatch.setattr(ingest, "RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr(ingest, "client", QdrantClient(":memory:"))
+    monkeypatch.setattr(ingest, "embeddings", DeterministicFakeEmbedding(size=768))
+    ingest.invalidate_collection_cache()
+    try:
+        assert ingest.hybrid_enabled()
+        chunks = [
+            Document(
+                page_content="The cooling period before re-employment is 12 months.",
+                metadata={"file_id": "f1"},
+            ),
+            Document(
+                page_content="Annual leave carries forward up to five days.",
+                metadata={"file_id": "f1"},
+            ),
+        ]
+        ingest.index_chunks(chunks)
+
+        store = ingest.get_vector_store()
+        results = store.similarity_search("cooling period", k=2)
+
+        assert results[0].page_content.startswith("The cooling period")
+        assert results[0].metadata["file_id"] == "f1"
+    finally:
+        ingest.invalidate_collection_cache()
+
+
+def test_hybrid_falls_back_to_dense_for_old_collections(monkeypatch):
+    client = QdrantClient(":memory:")
+    monkeypatch.setattr(ingest, "client", client)
+    monkeypatch.setattr(ingest, "embeddings", DeterministicFakeEmbedding(size=768))
+    ingest.invalidate_collection_cache()
+    try:
+        ingest.ensure_collection_exists()  # dense-only collection
+        ingest.invalidate_collection_cache()
+        monkeypatch.setattr(ingest, "RETRIEVAL_MODE", "hybrid")
+
+        assert not ingest.hybrid_enabled()
+    finally:
+        ingest.invalidate_collection_cache()
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds a fresh interpreter may spend importing main. Laziness is asserted
+# directly; this only catches gross regressions, so it is generous enough for
+# slow or busy runners.
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "10"))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+import ingest
+import rag
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "markitdown": "markitdown" in sys.modules,
+    "clients": [
+        name
+        for name in ("client", "embeddings", "llm_cache")
+        if name in vars(ingest)
+    ] + [name for name in ("llm",) if name in vars(rag)],
+}))
+"""
+
+
+def test_importing_main_is_lazy(tmp_path):
+    env = {**os.environ, "PYTHONPATH": BACKEND, "VECTOR_BACKEND": "qdrant"}
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=True,
+    )
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert not probe["markitdown"]
+    assert probe["clients"] == []
+    assert not (tmp_path / "data" / "cache.db").exists()
+    assert probe["seconds"] < IMPORT_BUDGET_SECONDS
@@ -0,0 +1,83 @@
+import glob
+import logging
+import os
+from collections.abc import Callable
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+from ollama_clients import CHAT_MODEL
+
+load_dotenv()
+logger = logging.getLogger("hr_policy_rag")
+
+# Path to the chat model's Hugging Face tokenizer.json (e.g. the one shipped
+# with Meta-Llama-3-8B-Instruct for llama3). Read from disk, never downloaded.
+CHAT_TOKENIZER_PATH = os.getenv("CHAT_TOKENIZER_PATH", "")
+
+# Hugging Face repos with the tokenizer of an Ollama model family. Without
+# CHAT_TOKENIZER_PATH, the tokenizer of CHAT_MODEL is taken from the local
+# Hugging Face cache (e.g. after `huggingface-cli download <repo> tokenizer.json`).
+DEFAULT_TOKENIZER_REPOS = {
+    "llama3": "meta-llama/Meta-Llama-3-8B-Instruct",
+    "llama3.1": "meta-llama/Llama-3.1-8B-Instruct",
+    "llama3.2": "meta-llama/Llama-3.2-3B-Instruct",
+    "mistral": "mistralai/Mistral-7B-Instruct-v0.3",
+    "qwen2.5": "Qwen/Qwen2.5-7B-Instruct",
+}
+
+TokenCounter = Callable[[str], int]
+
+
+def _estimate_tokens(text: str) -> int:
+    """A very rough approximation of token count."""
+    return len(text) // 4
+
+
+def _cached_tokenizer_path(model: str) -> str:
+    """tokenizer.json of 'model' in the Hugging Face cache, or '' if absent."""
+    repo = DEFAULT_TOKENIZER_REPOS.get(model.split(":")[0])
+    if repo is None:
+        return ""
+    hub = os.getenv("HF_HUB_CACHE") or os.path.join(
+        os.getenv("HF_HOME", os.path.expanduser("~/.cache/huggingface")), "hub"
+    )
+    pattern = os.path.join(
+        hub, "models--" + repo.replace("/", "--"), "snapshots", "*", "tokenizer.json"
+    )
+    matches = sorted(glob.glob(pattern), key=os.path.getmtime)
+    return matches[-1] if matches else ""
+
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> TokenCounter:
+    """
+    Returns a function counting tokens with the chat model's tokenizer: the one
+    at CHAT_TOKENIZER_PATH, or else CHAT_MODEL's in the Hugging Face cache.
+    Falls back to a character-based estimate when there is neither, or the
+    optional 'tokenizers' package is not installed.
+    """
+    path = CHAT_TOKENIZER_PATH or _cached_tokenizer_path(CHAT_MODEL)
+    if not path:
+        logger.warning(
+            f"No tokenizer found for chat model '{CHAT_MODEL}'; estimating tokens "
+            "as characters / 4, so context packing may overflow. Set "
+            "CHAT_TOKENIZER_PATH to the model's tokenizer.json."
+        )
+        return _estimate_tokens
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        logger.warning(
+            "The 'tokenizers' package is not installed; estimating tokens as "
+            "characters / 4."
+        )
+        return _estimate_tokens
+
+    tokenizer = Tokenizer.from_file(path)
+    logger.info(f"Counting tokens with {path}")
+
+    def count_tokens(text: str) -> int:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+    return count_tokens
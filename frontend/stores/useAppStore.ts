@@ -6,10 +6,56 @@ interface FileRecord {
   upload_date: string
 }
 
+interface FilePage {
+  items: FileRecord[]
+  next_cursor: string | null
+}
+
+interface JobRecord {
+  job_id: string
+  filename: string
+  status: 'queued' | 'running' | 'completed' | 'failed'
+  stage: string | null
+  file_id: string | null
+  error: string | null
+}
+
+interface WaitForJobOptions {
+  signal?: AbortSignal
+  intervalMs?: number
+  maxIntervalMs?: number
+  timeoutMs?: number
+}
+
+export class JobTimeoutError extends Error {
+  job: JobRecord
+
+  constructor(job: JobRecord) {
+    super(`Timed out waiting for ingestion job ${job.job_id}`)
+    this.name = 'JobTimeoutError'
+    this.job = job
+  }
+}
+
+const sleep = (ms: number, signal?: AbortSignal) =>
+  new Promise<void>((resolve, reject) => {
+    if (signal?.aborted) return reject(signal.reason)
+    const timer = setTimeout(() => {
+      signal?.removeEventListener('abort', onAbort)
+      resolve()
+    }, ms)
+    const onAbort = () => {
+      clearTimeout(timer)
+      reject(signal?.reason)
+    }
+    signal?.addEventListener('abort', onAbort, { once: true })
+  })
+
 export const useAppStore = defineStore('app', {
   state: () => ({
     apiKey: 'default-secret-key', // In a real app, this would be set via login
     files: [] as FileRecord[],
+    nextCursor: null as string | null,
     isLoadingFiles: false
   }),
   
@@ -21,14 +67,16 @@ export const useAppStore = defineStore('app', {
   },
   
   actions: {
-    async fetchFiles() {
+    async fetchFiles(more = false) {
       const config = useRuntimeConfig()
       this.isLoadingFiles = true
       try {
-        const data = await $fetch<FileRecord[]>(`${config.public.apiBase}/files`, {
-          headers: { 'X-API-Key': this.apiKey }
+        const page = await $fetch<FilePage>(`${config.public.apiBase}/files`, {
+          headers: { 'X-API-Key': this.apiKey },
+          query: more && this.nextCursor ? { cursor: this.nextCursor } : {}
         })
-        this.files = data
+        this.files = more ? [...this.files, ...page.items] : page.items
+        this.nextCursor = page.next_cursor
       } catch (error) {
         console.error('Failed to fetch files:', error)
       } finally {
@@ -36,6 +84,31 @@ export const useAppStore = defineStore('app', {
       }
     },
     
+    async waitForJob(jobId: string, options: WaitForJobOptions = {}): Promise<JobRecord> {
+      // Polls with a growing interval until the job finishes. Rejects with an
+      // AbortError when 'signal' is aborted, and with a JobTimeoutError once
+      // timeoutMs has passed; the job itself keeps running on the server.
+      const { signal, intervalMs = 2000, maxIntervalMs = 15000, timeoutMs = 15 * 60 * 1000 } = options
+      const config = useRuntimeConfig()
+      const deadline = Date.now() + timeoutMs
+      let delay = intervalMs
+      while (true) {
+        signal?.throwIfAborted()
+        const job = await $fetch<JobRecord>(`${config.public.apiBase}/jobs/${jobId}`, {
+          headers: { 'X-API-Key': this.apiKey },
+          signal
+        })
+        if (job.status === 'completed' || job.status === 'failed') {
+          return job
+        }
+        if (Date.now() + delay > deadline) {
+          throw new JobTimeoutError(job)
+        }
+        await sleep(delay, signal)
+        delay = Math.min(delay * 1.5, maxIntervalMs)
+      }
+    },
+
     async deleteFile(fileId: string) {
       const config = useRuntimeConfig()
       try {